@@ -1,4 +1,9 @@
 import json
+import sys
+from typing import Iterable, Iterator
+
+import profiling
+from json_stream import read_issues, write_issues
 
 def add_id(issue: str, issue_id: str) -> str:
     comment_id = 0
@@ -14,6 +19,20 @@ def add_id(issue: str, issue_id: str) -> str:
         comment["id"] = f"{issue_id}_{comment_id}"
         comment_id += 1
 
+def stream(node_data: Iterable[dict]) -> Iterator[dict]:
+    for issue_id, issue in enumerate(node_data):
+        add_id(issue, issue_id)
+        yield issue
+
+def main_stream(
+    in_path: str = "data/processed/issues_data_10k_processed.jsonl",
+    out_path: str = "data/processed/issues_data_10k_processed_id.jsonl",
+) -> None:
+    with profiling.stage("add_id", [in_path], [out_path]) as record:
+        count = write_issues(out_path, stream(profiling.counted(read_issues(in_path), record)))
+        record.rows_out = count
+    print(f"Added ids to {count} issues. Output: {out_path}")
+
 def main(node_data: dict) -> None:
     issue_id = 0
     for issue in node_data:
@@ -24,7 +43,10 @@ def main(node_data: dict) -> None:
         json.dump(node_data, f, indent=2)
 
 if __name__ == "__main__":
-    with open("data/processed/issues_data_10k_processed.json", "r") as f:
-        node_data = json.load(f)
+    if "--stream" in sys.argv:
+        main_stream()
+    else:
+        with open("data/processed/issues_data_10k_processed.json", "r") as f:
+            node_data = json.load(f)
 
-    main(node_data)
\ No newline at end of file
+        main(node_data)
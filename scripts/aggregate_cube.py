@@ -0,0 +1,200 @@
+import glob
+import json
+import os
+import sys
+from typing import Iterable, Optional, Sequence
+
+import pandas as pd
+
+from fingerprint import sha256_file
+
+CUBE_PATH = "data/processed/aggregate_cube.json"
+DIMS = ["month", "country", "type", "sentiment_label", "emotion_label"]
+MEASURES = ["count", "sentiment_score_sum", "emotion_score_sum"]
+UNSPECIFIED = "unspecified"  # missing author_location, as the notebooks fill it
+NO_LABEL = "none"  # rows scored without that model
+
+
+def aggregate(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Row-level scored frame (created_at, author_location, type, <model>_label/_score) -> one row per
+    (month, country, type, sentiment_label, emotion_label) with the row count and score sums.
+    """
+    created = pd.to_datetime(df["created_at"], utc=True, errors="coerce") if "created_at" in df else pd.Series(pd.NaT, index=df.index)
+    keys = pd.DataFrame({
+        # Calendar month, the bins of pd.Grouper(freq="M"); rows without a date are kept under ""
+        "month": created.dt.strftime("%Y-%m").fillna(""),
+        "country": _column(df, "author_location", UNSPECIFIED),
+        "type": _column(df, "type", ""),
+        "sentiment_label": _column(df, "sentiment_label", NO_LABEL),
+        "emotion_label": _column(df, "emotion_label", NO_LABEL),
+        "count": 1,
+        "sentiment_score_sum": pd.to_numeric(df.get("sentiment_score"), errors="coerce") if "sentiment_score" in df else 0.0,
+        "emotion_score_sum": pd.to_numeric(df.get("emotion_score"), errors="coerce") if "emotion_score" in df else 0.0,
+    }, index=df.index)
+    return keys.groupby(DIMS, sort=True)[MEASURES].sum().reset_index()
+
+
+def _column(df: pd.DataFrame, name: str, missing: str) -> pd.Series:
+    if name not in df:
+        return pd.Series(missing, index=df.index)
+    values = df[name].astype(object)
+    return values.where(values.notna() & (values != ""), missing).astype(str)
+
+
+class AggregateCube:
+    """
+    Counts and score sums keyed by DIMS, kept per source (a scored shard or file) so a source that is rescored
+    replaces its old contribution instead of adding to it. Rollups read only the cube, never row-level data.
+    """
+
+    def __init__(self, parts: Optional[dict[str, dict]] = None):
+        # source -> {"fingerprint": sha256 of the source, "cells": DataFrame of DIMS + MEASURES}
+        self.parts: dict[str, dict] = parts or {}
+        self._total: Optional[pd.DataFrame] = None
+
+    def add(self, source: str, df: pd.DataFrame, fingerprint: Optional[str] = None) -> None:
+        self.parts[source] = {"fingerprint": fingerprint, "cells": aggregate(df)}
+        self._total = None
+
+    def remove(self, source: str) -> None:
+        self.parts.pop(source, None)
+        self._total = None
+
+    def is_current(self, source: str, fingerprint: Optional[str]) -> bool:
+        part = self.parts.get(source)
+        return part is not None and fingerprint is not None and part["fingerprint"] == fingerprint
+
+    @property
+    def cells(self) -> pd.DataFrame:
+        """
+        The combined cube, one row per distinct key.
+        """
+        if self._total is None:
+            frames = [part["cells"] for part in self.parts.values() if len(part["cells"])]
+            if frames:
+                self._total = pd.concat(frames, ignore_index=True).groupby(DIMS, sort=True)[MEASURES].sum().reset_index()
+            else:
+                self._total = pd.DataFrame(columns=DIMS + MEASURES)
+        return self._total
+
+    def rollup(self, dims: Sequence[str], where: Optional[dict] = None) -> pd.DataFrame:
+        """
+        Measures summed over every dimension not in dims, after filtering on where ({dim: value or list}).
+        """
+        cells = self.cells
+        for dim, value in (where or {}).items():
+            cells = cells[cells[dim].isin(value if isinstance(value, (list, tuple, set)) else [value])]
+        return cells.groupby(list(dims), sort=True)[MEASURES].sum()
+
+    def counts(self, index: str, columns: str, where: Optional[dict] = None) -> pd.DataFrame:
+        return self.rollup([index, columns], where)["count"].unstack(fill_value=0)
+
+    def monthly(self, label: str = "sentiment_label", where: Optional[dict] = None) -> pd.DataFrame:
+        """
+        Same table as df.groupby([pd.Grouper(freq="M"), label]).size().unstack(fill_value=0): month-end
+        timestamps, empty months in the range included.
+        """
+        table = self.counts("month", label, where)
+        table = table[table.index != ""]
+        if table.empty:
+            return table
+        months = pd.period_range(table.index.min(), table.index.max(), freq="M")
+        table = table.reindex(months.strftime("%Y-%m"), fill_value=0)
+        table.index = months.to_timestamp(how="end").normalize().tz_localize("UTC").rename("created_at")
+        return table
+
+    def top(self, dim: str = "country", n: int = 15, where: Optional[dict] = None) -> list[str]:
+        return self.rollup([dim], where)["count"].sort_values(ascending=False, kind="stable").head(n).index.tolist()
+
+    def shares(
+        self,
+        label: str = "sentiment_label",
+        by: str = "country",
+        keys: Optional[Iterable[str]] = None,
+        where: Optional[dict] = None,
+    ) -> pd.DataFrame:
+        """
+        Percentage of each label within each `by` value (rows sum to 100), optionally for the given keys only,
+        as the notebooks' country sentiment and emotion charts compute.
+        """
+        table = self.counts(by, label, where)
+        if keys is not None:
+            table = table[table.index.isin(list(keys))]
+        return table.div(table.sum(axis=1), axis=0) * 100
+
+    def score_means(self, label: str = "sentiment_label", where: Optional[dict] = None) -> pd.Series:
+        """
+        Mean model confidence per label, e.g. df.groupby("sentiment_label")["sentiment_score"].mean().
+        """
+        score = label.replace("_label", "_score_sum")
+        totals = self.rollup([label], where)
+        return (totals[score] / totals["count"]).rename(score.replace("_sum", ""))
+
+    def save(self, path: str = CUBE_PATH) -> None:
+        data = {
+            "version": 1,
+            "dims": DIMS,
+            "measures": MEASURES,
+            "parts": {
+                source: {"fingerprint": part["fingerprint"], "cells": part["cells"][DIMS + MEASURES].values.tolist()}
+                for source, part in self.parts.items()
+            },
+        }
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str = CUBE_PATH) -> "AggregateCube":
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("dims") != DIMS or data.get("measures") != MEASURES:
+            print(f"{path} has a different layout; starting a new cube")
+            return cls()
+        return cls({
+            source: {"fingerprint": part["fingerprint"], "cells": pd.DataFrame(part["cells"], columns=DIMS + MEASURES)}
+            for source, part in data["parts"].items()
+        })
+
+
+def read_scored(path: str) -> pd.DataFrame:
+    if path.endswith(".csv"):
+        return pd.read_csv(path)
+    from stream_inference import iter_rows
+    return pd.DataFrame.from_dict(dict(iter_rows(path)), orient="index")
+
+
+def update_from_files(cube: AggregateCube, paths: Iterable[str]) -> int:
+    """
+    Adds scored files (stream_inference shards, or the scored CSV) whose content the cube has not seen;
+    returns how many were (re)aggregated.
+    """
+    updated = 0
+    for path in paths:
+        fingerprint = sha256_file(path)
+        if cube.is_current(path, fingerprint):
+            continue
+        cube.add(path, read_scored(path), fingerprint)
+        updated += 1
+    # Shards that no longer exist (e.g. the shard directory was reset) stop counting
+    for source in [s for s in cube.parts if not os.path.exists(s)]:
+        cube.remove(source)
+    return updated
+
+
+def main(paths: Optional[list[str]] = None, cube_path: str = CUBE_PATH) -> AggregateCube:
+    from stream_inference import SHARD_DIR
+
+    paths = paths or sorted(glob.glob(os.path.join(SHARD_DIR, "shard-*.jsonl")))
+    cube = AggregateCube.load(cube_path)
+    updated = update_from_files(cube, paths)
+    cube.save(cube_path)
+    print(f"Aggregated {updated} new or changed of {len(paths)} sources; cube has {len(cube.cells)} cells. Output: {cube_path}")
+    return cube
+
+
+if __name__ == "__main__":
+    main([a for a in sys.argv[1:] if not a.startswith("--")] or None)
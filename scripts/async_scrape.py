@@ -0,0 +1,412 @@
+import asyncio
+import json
+import os
+import random
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import dotenv
+import requests
+from requests.adapters import HTTPAdapter
+
+from datascrape import ISSUE_FIELDS, fetch_remaining_comments
+from json_stream import iter_jsonl
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+SEARCH_RESULT_CAP = 1000  # GitHub search never returns more than this many results per query
+
+SEARCH_QUERY = """
+query($q: String!, $cursor: String) {
+  rateLimit { cost remaining resetAt }
+  search(query: $q, type: ISSUE, first: 100, after: $cursor) {
+    issueCount
+    nodes { ... on Issue { %s } }
+    pageInfo { endCursor hasNextPage }
+  }
+}
+""" % ISSUE_FIELDS
+
+REPO_CREATED_QUERY = """
+query($owner: String!, $name: String!) {
+  rateLimit { cost remaining resetAt }
+  repository(owner: $owner, name: $name) { createdAt }
+}
+"""
+
+
+def parse_time(s: str) -> datetime:
+    return datetime.strptime(s, TIME_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def format_time(t: datetime) -> str:
+    return t.astimezone(timezone.utc).strftime(TIME_FORMAT)
+
+
+@dataclass
+class Window:
+    since: str  # inclusive
+    until: str  # exclusive
+    cursor: Optional[str] = None
+    done: bool = False
+    fetched: int = 0
+
+    @property
+    def key(self) -> str:
+        return f"{self.since}..{self.until}"
+
+    def search_query(self, owner: str, name: str) -> str:
+        last = format_time(parse_time(self.until) - timedelta(seconds=1))
+        return f"repo:{owner}/{name} is:issue created:{self.since}..{last}"
+
+    def split(self) -> Optional[tuple["Window", "Window"]]:
+        start, end = parse_time(self.since), parse_time(self.until)
+        if end - start <= timedelta(seconds=1):
+            return None
+        mid = format_time(start + (end - start) / 2)
+        return Window(self.since, mid), Window(mid, self.until)
+
+
+def make_windows(since: str, until: str, days: int) -> list[Window]:
+    windows = []
+    start, end = parse_time(since), parse_time(until)
+    while start < end:
+        stop = min(start + timedelta(days=days), end)
+        windows.append(Window(format_time(start), format_time(stop)))
+        start = stop
+    return windows
+
+
+class Checkpoint:
+    """
+    On-disk progress for a fetch: state.json holds every window's cursor, pages.jsonl holds fetched issues
+    (one per line). Pages are flushed before their cursor is recorded, so a crash can only cause a page to be
+    fetched twice, never lost; duplicates are dropped by node id in assemble().
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.state_path = os.path.join(directory, "state.json")
+        self.pages_path = os.path.join(directory, "pages.jsonl")
+        self.windows: dict[str, Window] = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r") as f:
+                self.windows = {w["since"] + ".." + w["until"]: Window(**w) for w in json.load(f)["windows"]}
+        self._pages = open(self.pages_path, "a", encoding="utf-8")
+
+    @property
+    def fetched(self) -> int:
+        return sum(w.fetched for w in self.windows.values())
+
+    def save(self) -> None:
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"windows": [asdict(w) for w in self.windows.values()]}, f, indent=2)
+        os.replace(tmp, self.state_path)
+
+    def add_windows(self, windows: list[Window]) -> None:
+        for w in windows:
+            self.windows.setdefault(w.key, w)
+        self.save()
+
+    def replace_window(self, old: Window, new: list[Window]) -> None:
+        del self.windows[old.key]
+        self.add_windows(new)
+
+    def record_page(self, window: Window, nodes: list[dict], cursor: Optional[str], done: bool) -> None:
+        for node in nodes:
+            self._pages.write(json.dumps(node, ensure_ascii=False) + "\n")
+        self._pages.flush()
+        os.fsync(self._pages.fileno())
+        window.cursor = cursor
+        window.done = done
+        window.fetched += len(nodes)
+        self.save()
+
+    def close(self) -> None:
+        self._pages.close()
+
+
+class RatePacer:
+    """
+    Paces requests from the rateLimit block returned with every response instead of polling check_rate_limit.
+    Spreads the remaining points evenly until the reset time and stops entirely when below `reserve`.
+    """
+
+    def __init__(self, reserve: int = 100):
+        self.reserve = reserve
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        self.cost = 1
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    def update(self, rate_limit: Optional[dict]) -> None:
+        if not rate_limit:
+            return
+        self.remaining = int(rate_limit["remaining"])
+        self.cost = max(1, int(rate_limit.get("cost", 1)))
+        self.reset_at = parse_time(rate_limit["resetAt"]).timestamp()
+
+    async def wait(self) -> None:
+        async with self.lock:
+            now = time.time()
+            if self.remaining is not None and self.reset_at is not None:
+                if self.remaining - self.cost < self.reserve and self.reset_at > now:
+                    sleep_time = self.reset_at - now + 5
+                    print(f"Rate limit nearly exceeded. Sleeping for {sleep_time:.0f} seconds.")
+                    await asyncio.sleep(sleep_time)
+                    self.remaining = None
+                    now = time.time()
+                else:
+                    budget = max(1, (self.remaining - self.reserve) // self.cost)
+                    interval = max(0.0, self.reset_at - now) / budget
+                    self.next_slot = max(self.next_slot, now) + interval
+            delay = self.next_slot - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class GraphQLError(Exception):
+    pass
+
+
+def retry_delay(response: requests.Response) -> Optional[float]:
+    """
+    Seconds the server asked us to wait, from Retry-After or X-RateLimit-Reset (epoch seconds); None if neither is set.
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        return float(retry_after)
+    reset = response.headers.get("X-RateLimit-Reset")
+    if reset:
+        return max(0.0, float(reset) - time.time()) + 1
+    return None
+
+
+class ConcurrentFetcher:
+    def __init__(
+        self,
+        session: requests.Session,
+        github_url: str,
+        owner: str,
+        name: str,
+        checkpoint: Checkpoint,
+        concurrency: int = 4,
+        max_retries: int = 6,
+        max_nodes: Optional[int] = None,
+    ):
+        # A session of our own, so the connection pool sized for `concurrency` is not mounted on the caller's
+        self.session = requests.Session()
+        self.session.headers.update(session.headers)
+        self.session.auth = session.auth
+        self.github_url = github_url
+        self.owner = owner
+        self.name = name
+        self.checkpoint = checkpoint
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.max_nodes = max_nodes
+        self.pacer = RatePacer()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def close(self) -> None:
+        self.session.close()
+
+    async def post(self, query: str, variables: dict) -> dict:
+        for attempt in range(self.max_retries):
+            await self.pacer.wait()
+            try:
+                response = await asyncio.to_thread(
+                    self.session.post, self.github_url, json={"query": query, "variables": variables}, timeout=60
+                )
+            except requests.exceptions.RequestException as e:
+                print(f"Request error: {e}. Retrying...")
+                await self.backoff(attempt)
+                continue
+
+            if response.status_code in (403, 429, 502, 503, 504):
+                print(f"Error: Received status code {response.status_code}. Retrying...")
+                await self.backoff(attempt, retry_delay(response))
+                continue
+            if response.status_code != 200:
+                raise GraphQLError(f"Query failed with status code {response.status_code}: {response.text[:200]}")
+
+            try:
+                body = response.json()
+            except json.JSONDecodeError:
+                print("Error: Invalid JSON response. Retrying...")
+                await self.backoff(attempt)
+                continue
+
+            self.pacer.update((body.get("data") or {}).get("rateLimit"))
+            if "errors" in body:
+                if any(e.get("type") == "RATE_LIMITED" for e in body["errors"]):
+                    # Error bodies usually carry no rateLimit block, so the pacer has no reset time to wait for
+                    print("Error: Rate limited. Retrying...")
+                    self.pacer.remaining = 0
+                    await self.backoff(attempt, retry_delay(response))
+                    continue
+                raise GraphQLError(f"GraphQL errors: {body['errors']}")
+            return body["data"]
+        raise GraphQLError(f"Giving up after {self.max_retries} attempts")
+
+    async def backoff(self, attempt: int, seconds: Optional[float] = None) -> None:
+        await asyncio.sleep(seconds if seconds is not None else min(60.0, 2 ** attempt) + random.random())
+
+    async def repo_created_at(self) -> str:
+        data = await self.post(REPO_CREATED_QUERY, {"owner": self.owner, "name": self.name})
+        return data["repository"]["createdAt"]
+
+    def limit_reached(self) -> bool:
+        return self.max_nodes is not None and self.checkpoint.fetched >= self.max_nodes
+
+    async def fetch_window(self, window: Window, queue: asyncio.Queue) -> None:
+        query = window.search_query(self.owner, self.name)
+        while not window.done and not self.limit_reached():
+            data = (await self.post(SEARCH_QUERY, {"q": query, "cursor": window.cursor}))["search"]
+
+            if window.cursor is None and data["issueCount"] > SEARCH_RESULT_CAP:
+                halves = window.split()
+                if halves:
+                    self.checkpoint.replace_window(window, list(halves))
+                    for half in halves:
+                        queue.put_nowait(half)
+                    return
+                print(f"Window {window.key} has {data['issueCount']} issues in one second; only {SEARCH_RESULT_CAP} reachable")
+
+            nodes = [node for node in data["nodes"] if node]
+            page = data["pageInfo"]
+            self.checkpoint.record_page(window, nodes, page["endCursor"], not page["hasNextPage"])
+            print(f"[{window.key}] fetched {len(nodes)} nodes. Total: {self.checkpoint.fetched}")
+
+    async def worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            window = await queue.get()
+            try:
+                await self.fetch_window(window, queue)
+            finally:
+                queue.task_done()
+
+    async def run(self, since: Optional[str], until: Optional[str], window_days: int) -> None:
+        if not self.checkpoint.windows:
+            since = since or await self.repo_created_at()
+            until = until or format_time(datetime.now(timezone.utc) + timedelta(seconds=1))
+            self.checkpoint.add_windows(make_windows(since, until, window_days))
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for window in self.checkpoint.windows.values():
+            if not window.done:
+                queue.put_nowait(window)
+
+        workers = [asyncio.create_task(self.worker(queue)) for _ in range(self.concurrency)]
+        join = asyncio.create_task(queue.join())
+        done, _ = await asyncio.wait([join, *workers], return_when=asyncio.FIRST_COMPLETED)
+        for task in workers + [join]:
+            task.cancel()
+        for task in done:
+            if task is not join and task.exception():
+                raise task.exception()
+
+
+def assemble(checkpoint_dir: str, out_path: str, max_nodes: Optional[int] = None) -> int:
+    """
+    Writes the fetched issues, deduplicated by node id, as one-issue-per-line JSONL (readable by json_stream).
+    """
+    seen = set()
+    count = 0
+    with open(os.path.join(checkpoint_dir, "pages.jsonl"), "r", encoding="utf-8") as f_in, \
+            open(out_path, "w", encoding="utf-8") as f_out:
+        for line in f_in:
+            if not line.strip():
+                continue
+            node = json.loads(line)
+            node_id = node.get("node_id")
+            if node_id in seen:
+                continue
+            seen.add(node_id)
+            f_out.write(json.dumps(node, ensure_ascii=False) + "\n")
+            count += 1
+            if max_nodes is not None and count >= max_nodes:
+                break
+    return count
+
+
+def fetch_issues_concurrent(
+    session: requests.Session,
+    github_url: str,
+    owner: str = "huggingface",
+    name: str = "transformers",
+    checkpoint_dir: str = "data/raw/fetch_checkpoint",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    window_days: int = 30,
+    concurrency: int = 4,
+    max_nodes: Optional[int] = None,
+) -> None:
+    """
+    Fetches issues created in [since, until) concurrently, one createdAt window per task. Rerunning with the
+    same checkpoint_dir resumes where an interrupted run stopped (since/until are then taken from the checkpoint).
+    """
+    checkpoint = Checkpoint(checkpoint_dir)
+    fetcher = ConcurrentFetcher(session, github_url, owner, name, checkpoint, concurrency, max_nodes=max_nodes)
+    try:
+        asyncio.run(fetcher.run(since, until, window_days))
+    finally:
+        fetcher.close()
+        checkpoint.close()
+
+
+def complete_comments(session: requests.Session, github_url: str, path: str, chunk_size: int = 1000) -> int:
+    """
+    Rewrites the assembled JSONL with every comment of every thread, fetching chunk_size issues' worth at a time.
+    If the comment lookups fail (IncompleteCommentsError, naming the issues left incomplete) the file is left
+    untouched, so rerunning starts over from the first-page comments.
+    """
+    added = 0
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            chunk = []
+            for issue in iter_jsonl(path):
+                chunk.append(issue)
+                if len(chunk) >= chunk_size:
+                    added += fetch_remaining_comments(session, github_url, chunk)
+                    f.writelines(json.dumps(i, ensure_ascii=False) + "\n" for i in chunk)
+                    chunk = []
+            added += fetch_remaining_comments(session, github_url, chunk)
+            f.writelines(json.dumps(i, ensure_ascii=False) + "\n" for i in chunk)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+    return added
+
+
+def main(session: requests.Session, github_url: str, max_nodes: Optional[int] = None) -> None:
+    fetch_issues_concurrent(session, github_url, max_nodes=max_nodes)
+    count = assemble("data/raw/fetch_checkpoint", "data/raw/issues_data.jsonl", max_nodes=max_nodes)
+    added = complete_comments(session, github_url, "data/raw/issues_data.jsonl")
+    print(f"Wrote {count} issues ({added} comments beyond the first page) to data/raw/issues_data.jsonl")
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+    if not GITHUB_TOKEN:
+        raise RuntimeError("GITHUB_TOKEN is not set; create a .env with GITHUB_TOKEN=<token>")
+    github_url = "https://api.github.com/graphql"
+
+    session = requests.Session()
+    session.headers.update(
+        {
+            "Authorization": f"Bearer {GITHUB_TOKEN}",
+            "Content-Type": "application/json"
+        }
+    )
+
+    main(session, github_url, max_nodes=10000)
@@ -0,0 +1,459 @@
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from typing import Callable, Iterator, Optional
+
+from json_stream import read_issues, write_json_array
+
+BENCH_DIR = "data/benchmarks"
+STAGES = [
+    "clean_nodes", "add_id", "extract_text", "clean_text", "clean_text_guarded",
+    "flatten_data_for_nlp", "create_nlp_data", "build_network",
+]
+
+# Files of one run, named after the pipeline outputs they stand in for
+RAW = "issues_raw.json"
+PROCESSED = "issues_processed.jsonl"
+WITH_IDS = "issues_processed_id.jsonl"
+TITLES = "titles_only.jsonl"
+TEXTS = "texts_only_with_ids.jsonl"
+TEXTS_CLEANED = "texts_only_with_ids_cleaned.jsonl"
+FLAT = "flat_nlp_data.jsonl"
+FINAL = "final_nlp_data.jsonl"
+CORPUS = "corpus.json"
+GAZETTEER = "gazetteer.json"
+
+# Stage -> the stage producing each file it reads
+REQUIRES = {
+    "clean_nodes": [],
+    "add_id": ["clean_nodes"],
+    "extract_text": ["add_id"],
+    "clean_text": ["extract_text"],
+    "clean_text_guarded": ["extract_text"],
+    "flatten_data_for_nlp": ["add_id"],
+    "create_nlp_data": ["flatten_data_for_nlp", "clean_text"],
+    "build_network": ["clean_nodes"],
+}
+OUTPUTS = {
+    "clean_nodes": [PROCESSED], "add_id": [WITH_IDS], "extract_text": [TITLES, TEXTS],
+    "clean_text": [TEXTS_CLEANED], "clean_text_guarded": [TEXTS_CLEANED], "flatten_data_for_nlp": [FLAT],
+    "create_nlp_data": [FINAL], "build_network": [],
+}
+
+
+# Synthetic corpus ----------------------------------------------------------------
+
+# Raw profile locations and the country code the synthetic gazetteer resolves them to
+LOCATIONS = {
+    "San Francisco, CA": "US", "New York": "US", "Seattle, WA, USA": "US", "Beijing, China": "CN",
+    "Shanghai": "CN", "Berlin, Germany": "DE", "München": "DE", "Paris": "FR", "London, UK": "GB",
+    "Bangalore, India": "IN", "Tokyo": "JP", "Toronto, Canada": "CA", "São Paulo, Brasil": "BR",
+    "Earth": None, "localhost": None, "🌍": None,
+}
+
+# Just the names LOCATIONS needs, so the benchmark resolves through LocationResolver without building the
+# full gazetteer from pycountry and geonamescache
+COUNTRIES = {
+    "usa": "US", "china": "CN", "germany": "DE", "uk": "GB", "india": "IN", "canada": "CA", "brasil": "BR",
+    "france": "FR", "japan": "JP",
+}
+CITIES = {
+    "new york": "US", "shanghai": "CN", "münchen": "DE", "paris": "FR", "tokyo": "JP", "london": "GB",
+    "berlin": "DE", "bangalore": "IN",
+}
+
+WORDS = (
+    "model tokenizer pipeline training loss gradient batch checkpoint config dataset error warning "
+    "when loading the weights it fails with same issue here thanks for the fix works now please "
+    "could you share a minimal reproduction i tried upgrading but still get this on gpu cpu"
+).split()
+
+
+def _sentence(rng: random.Random, low: int = 4, high: int = 20) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize() + "."
+
+
+def _body(rng: random.Random) -> str:
+    """
+    Issue or comment text mixing prose with what clean_github_text strips: code, URLs, paths,
+    commits, mentions, versions and tqdm/Iteration progress spam.
+    """
+    parts = [_sentence(rng) for _ in range(rng.randint(1, 4))]
+    if rng.random() < 0.3:
+        code = "\n".join(f"    x_{i} = model(inputs[{i}])  # step {i}" for i in range(rng.randint(2, 30)))
+        parts.append(f"```python\n{code}\n```")
+    if rng.random() < 0.3:
+        parts.append(f"See https://github.com/org/repo/blob/main/src/module_{rng.randint(0, 99)}.py#L{rng.randint(1, 999)}")
+    if rng.random() < 0.2:
+        parts.append(f"File /usr/lib/python3.{rng.randint(8, 12)}/site-packages/lib/core.py, fixed in {rng.getrandbits(160):040x}")
+    if rng.random() < 0.2:
+        parts.append(f"@user{rng.randint(0, 999)} using v{rng.randint(1, 4)}.{rng.randint(0, 40)}.{rng.randint(0, 9)} with --fp16")
+    if rng.random() < 0.08:
+        total = rng.randint(100, 5000)
+        parts.append("\n".join(
+            f"Iteration: {p}%|{'█' * (p // 10)}{' ' * (10 - p // 10)}| {p * total // 100}/{total} [00:{p:02d}<00:10, 9.5it/s]"
+            for p in range(0, 101, rng.choice((1, 5, 10)))
+        ))
+    return "\n\n".join(parts)
+
+
+def _author(rng: random.Random, logins: list[str], weights: list[float]) -> Optional[dict]:
+    roll = rng.random()
+    if roll < 0.01:
+        return None  # deleted user
+    if roll < 0.03:
+        return {}  # bot: the query's "... on User" fragment matches nothing
+    location = rng.choice(list(LOCATIONS)) if rng.random() < 0.6 else rng.choice(("", None))
+    return {"login": rng.choices(logins, cum_weights=weights)[0], "location": location}
+
+
+def _timestamp(seconds: int) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(seconds))
+
+
+def generate_issues(
+    n_comments: int,
+    seed: int = 0,
+    mean_thread: int = 8,
+    long_thread_rate: float = 0.01,
+    n_users: Optional[int] = None,
+) -> Iterator[dict]:
+    """
+    Issues shaped like fetch_issues_paginated output (after fetch_remaining_comments), until about n_comments
+    comments exist. Thread lengths are mostly short with a long tail of 200-2000 comment threads; a few
+    heavy users write most of the comments.
+    """
+    rng = random.Random(seed)
+    n_users = n_users or max(100, n_comments // 20)
+    logins = [f"user{i}" for i in range(n_users)]
+    cumulative, total = [], 0.0
+    for rank in range(n_users):
+        total += 1 / (rank + 1)  # Zipf-like activity
+        cumulative.append(total)
+
+    written = 0
+    number = 0
+    start = 1_577_836_800
+    while written < n_comments:
+        if rng.random() < long_thread_rate:
+            length = rng.randint(200, 2000)
+        else:
+            length = rng.randint(0, 2 * mean_thread)
+        length = min(length, n_comments - written)
+        created = start + number * 600
+        comments = [
+            {
+                "node_id": f"IC_{number}_{i}",
+                "bodyText": _body(rng),
+                "createdAt": _timestamp(created + 60 * (i + 1)),
+                "author": _author(rng, logins, cumulative),
+            }
+            for i in range(length)
+        ]
+        yield {
+            "node_id": f"I_{number}",
+            "title": _sentence(rng, 3, 10),
+            "bodyText": _body(rng),
+            "createdAt": _timestamp(created),
+            "updatedAt": _timestamp(created + 60 * (length + 1)),
+            "labels": {"nodes": [{"name": rng.choice(("bug", "feature", "question", "wontfix"))}] if rng.random() < 0.5 else []},
+            "author": _author(rng, logins, cumulative),
+            "comments": {"nodes": comments, "pageInfo": {"endCursor": None, "hasNextPage": False}},
+        }
+        written += length
+        number += 1
+
+
+def synthetic_gazetteer() -> dict:
+    from locations import CA_PROV_CODES, CA_PROV_NAMES, GAZETTEER_VERSION, US_STATE_CODES, US_STATE_NAMES
+
+    regions = {name: "US" for name in US_STATE_CODES | US_STATE_NAMES}
+    regions.update({name: "CA" for name in CA_PROV_CODES | CA_PROV_NAMES})
+    return {
+        "version": GAZETTEER_VERSION,
+        "sources": {"benchmark": None},
+        "countries": COUNTRIES,
+        "regions": regions,
+        "cities": CITIES,
+        "names": {code: name.title() for name, code in COUNTRIES.items()},
+    }
+
+
+def make_corpus(work_dir: str, n_comments: int, seed: int = 0) -> dict:
+    """
+    Writes the raw JSON array into work_dir unless the same corpus is already there, and the gazetteer
+    clean_nodes resolves its locations with.
+    """
+    from locations import save_gazetteer
+
+    os.makedirs(work_dir, exist_ok=True)
+    save_gazetteer(synthetic_gazetteer(), os.path.join(work_dir, GAZETTEER))
+    meta_path = os.path.join(work_dir, CORPUS)
+    params = {"comments": n_comments, "seed": seed}
+    if os.path.exists(meta_path):
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        if meta["params"] == params and os.path.exists(os.path.join(work_dir, RAW)):
+            return meta
+
+    counts = {"issues": 0, "comments": 0}
+
+    def counted(issues: Iterator[dict]) -> Iterator[dict]:
+        for issue in issues:
+            counts["issues"] += 1
+            counts["comments"] += len(issue["comments"]["nodes"])
+            yield issue
+
+    # Outputs of an earlier corpus would otherwise satisfy the stage prerequisites. Only our own files go:
+    # work_dir may be any directory given with --work-dir
+    for name in {RAW, CORPUS}.union(*OUTPUTS.values()):
+        path = os.path.join(work_dir, name)
+        if os.path.isfile(path):
+            os.remove(path)
+
+    start = time.perf_counter()
+    write_json_array(os.path.join(work_dir, RAW), counted(generate_issues(n_comments, seed)))
+    meta = {"params": params, **counts, "bytes": os.path.getsize(os.path.join(work_dir, RAW))}
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + ".tmp", meta_path)
+    print(f"Generated {counts['issues']} issues, {counts['comments']} comments in {time.perf_counter() - start:.1f}s")
+    return meta
+
+
+# Stages --------------------------------------------------------------------------
+# Each takes the work directory and returns {"inputs": [...], "outputs": [...], "rows_in": n, "rows_out": n}
+
+def count_lines(path: str) -> int:
+    with open(path, "rb") as f:
+        return sum(block.count(b"\n") for block in iter(lambda: f.read(1 << 20), b""))
+
+
+def _records(path: str) -> int:
+    # Issues plus comments in an issue-per-line file
+    return sum(1 + len((issue.get("comments") or {}).get("nodes", [])) for issue in read_issues(path))
+
+
+def _stage_clean_nodes(d: str) -> dict:
+    import clean_nodes
+    from locations import LocationResolver, load_gazetteer
+    clean_nodes.main_stream(LocationResolver(load_gazetteer(d + GAZETTEER)), d + RAW, d + PROCESSED)
+    return {"inputs": [RAW, GAZETTEER], "outputs": [PROCESSED], "rows_in": None, "rows_out": _records(d + PROCESSED)}
+
+
+def _stage_add_id(d: str) -> dict:
+    import add_id
+    add_id.main_stream(d + PROCESSED, d + WITH_IDS)
+    return {"inputs": [PROCESSED], "outputs": [WITH_IDS], "rows_in": _records(d + PROCESSED), "rows_out": _records(d + WITH_IDS)}
+
+
+def _stage_extract_text(d: str) -> dict:
+    import extract_text
+    extract_text.main_stream(d + WITH_IDS, d + TITLES, d + TEXTS)
+    return {"inputs": [WITH_IDS], "outputs": [TITLES, TEXTS], "rows_in": _records(d + WITH_IDS), "rows_out": count_lines(d + TEXTS)}
+
+
+def _clean_text(d: str, engine: str) -> dict:
+    import clean_text
+    clean_text.process_jsonl(d + TEXTS, d + TEXTS_CLEANED, engine=engine)
+    return {"inputs": [TEXTS], "outputs": [TEXTS_CLEANED], "rows_in": count_lines(d + TEXTS), "rows_out": count_lines(d + TEXTS_CLEANED)}
+
+
+def _stage_flatten_data_for_nlp(d: str) -> dict:
+    import flatten_data_for_nlp
+    flatten_data_for_nlp.main_stream(d + WITH_IDS, d + FLAT)
+    return {"inputs": [WITH_IDS], "outputs": [FLAT], "rows_in": _records(d + WITH_IDS), "rows_out": count_lines(d + FLAT)}
+
+
+def _stage_create_nlp_data(d: str) -> dict:
+    import create_nlp_data
+    create_nlp_data.main_stream(d + FLAT, d + TEXTS_CLEANED, d + FINAL)
+    return {
+        "inputs": [FLAT, TEXTS_CLEANED], "outputs": [FINAL],
+        "rows_in": count_lines(d + FLAT) + count_lines(d + TEXTS_CLEANED), "rows_out": count_lines(d + FINAL),
+    }
+
+
+def _stage_build_network(d: str) -> dict:
+    import build_network
+    issue_keys, users, _ = build_network.participation_from_issues(read_issues(d + PROCESSED))
+    network = build_network.build_network(issue_keys, users)
+    return {"inputs": [PROCESSED], "outputs": [], "rows_in": len(users), "rows_out": len(network.weights)}
+
+
+STAGE_FUNCTIONS: dict[str, Callable[[str], dict]] = {
+    "clean_nodes": _stage_clean_nodes,
+    "add_id": _stage_add_id,
+    "extract_text": _stage_extract_text,
+    "clean_text": lambda d: _clean_text(d, "reference"),
+    "clean_text_guarded": lambda d: _clean_text(d, "guarded"),
+    "flatten_data_for_nlp": _stage_flatten_data_for_nlp,
+    "create_nlp_data": _stage_create_nlp_data,
+    "build_network": _stage_build_network,
+}
+
+
+def _peak_rss_bytes() -> int:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_stage(name: str, work_dir: str) -> dict:
+    """
+    Runs one stage in the current process (run_stages gives each a fresh one, so peak RSS is the stage's own).
+    Row counts are taken after the clock stops.
+    """
+    d = os.path.join(work_dir, "")
+    baseline = _peak_rss_bytes()
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        counts = STAGE_FUNCTIONS[name](d)
+        seconds = time.perf_counter() - start
+        cpu_seconds = time.process_time() - cpu_start
+    peak = _peak_rss_bytes()
+
+    bytes_in = sum(os.path.getsize(d + p) for p in counts["inputs"])
+    bytes_out = sum(os.path.getsize(d + p) for p in counts["outputs"])
+    return {
+        "stage": name,
+        "seconds": seconds,
+        "cpu_seconds": cpu_seconds,
+        "rows_in": counts["rows_in"],
+        "rows_out": counts["rows_out"],
+        "rows_per_second": counts["rows_in"] / seconds if counts["rows_in"] and seconds else None,
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "mb_per_second": bytes_in / 2**20 / seconds if seconds else None,
+        "peak_rss_bytes": peak,
+        "baseline_rss_bytes": baseline,
+    }
+
+
+def plan(stages: list[str], work_dir: str) -> list[str]:
+    """
+    The requested stages in pipeline order, preceded by any stage whose outputs they need and are missing.
+    """
+    needed: set[str] = set()
+
+    def require(name: str) -> None:
+        for dependency in REQUIRES[name]:
+            if dependency not in needed and not all(os.path.exists(os.path.join(work_dir, p)) for p in OUTPUTS[dependency]):
+                needed.add(dependency)
+                require(dependency)
+
+    for name in stages:
+        needed.add(name)
+        require(name)
+    return [name for name in STAGES if name in needed]
+
+
+def run_stages(work_dir: str, stages: list[str], corpus: dict) -> list[dict]:
+    # spawn, not fork: a forked child would inherit the parent's high-water mark
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for name in plan(stages, work_dir):
+        with ctx.Pool(1) as pool:
+            result = pool.apply(run_stage, (name, work_dir))
+        if name == "clean_nodes":
+            result["rows_in"] = corpus["issues"] + corpus["comments"]
+            result["rows_per_second"] = result["rows_in"] / result["seconds"]
+        result["prerequisite"] = name not in stages
+        results.append(result)
+        print(
+            f"{name:>22}: {result['seconds']:8.2f}s  {result['rows_per_second'] or 0:10.0f} rows/s  "
+            f"{result['mb_per_second'] or 0:7.1f} MB/s  peak RSS {result['peak_rss_bytes'] / 2**20:7.1f} MiB"
+        )
+    return results
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(old: dict, new: dict, tolerance: float = 0.1) -> list[str]:
+    """
+    Stages that got slower or used more peak memory than tolerance allows, between two result files.
+    """
+    if old["corpus"]["params"] != new["corpus"]["params"]:
+        raise ValueError(f"Results are for different corpora: {old['corpus']['params']} vs {new['corpus']['params']}")
+    previous = {r["stage"]: r for r in old["stages"]}
+    regressions = []
+    for result in new["stages"]:
+        before = previous.get(result["stage"])
+        if before is None:
+            continue
+        for metric in ("seconds", "peak_rss_bytes"):
+            if before[metric] and result[metric] > before[metric] * (1 + tolerance):
+                regressions.append(f"{result['stage']}: {metric} {before[metric]:.4g} -> {result[metric]:.4g} ({result[metric] / before[metric] - 1:+.0%})")
+    return regressions
+
+
+def main(
+    n_comments: int = 10_000,
+    seed: int = 0,
+    stages: Optional[list[str]] = None,
+    work_dir: Optional[str] = None,
+    out_path: Optional[str] = None,
+    baseline_path: Optional[str] = None,
+) -> dict:
+    stages = stages or STAGES
+    unknown = set(stages) - set(STAGE_FUNCTIONS)
+    if unknown:
+        raise ValueError(f"Unknown stages: {sorted(unknown)}; choose from {STAGES}")
+    work_dir = work_dir or os.path.join(BENCH_DIR, f"work-{n_comments}-{seed}")
+
+    corpus = make_corpus(work_dir, n_comments, seed)
+    report = {
+        "created": _timestamp(int(time.time())),
+        "environment": environment(),
+        "corpus": corpus,
+        "stages": run_stages(work_dir, stages, corpus),
+    }
+
+    out_path = out_path or os.path.join(BENCH_DIR, "results", f"{time.strftime('%Y%m%d-%H%M%S')}-{n_comments}.json")
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path + ".tmp", "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(out_path + ".tmp", out_path)
+    print(f"Results: {out_path}")
+
+    if baseline_path:
+        with open(baseline_path, "r") as f:
+            regressions = compare(json.load(f), report)
+        print("Regressions against " + baseline_path + ":" if regressions else f"No regressions against {baseline_path}")
+        for line in regressions:
+            print(f"  {line}")
+    return report
+
+
+if __name__ == "__main__":
+    options = dict(arg[2:].split("=", 1) for arg in sys.argv[1:] if arg.startswith("--") and "=" in arg)
+    main(
+        n_comments=int(options.get("comments", 10_000)),
+        seed=int(options.get("seed", 0)),
+        stages=options["stages"].split(",") if "stages" in options else None,
+        work_dir=options.get("work-dir"),
+        out_path=options.get("out"),
+        baseline_path=options.get("compare"),
+    )
@@ -0,0 +1,177 @@
+import sys
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import profiling
+from json_stream import read_issues
+
+PROCESSED = "data/processed/issues_data_10k_processed.jsonl"
+NODES = "data/network/nodes.csv"  # id only
+NODE_LOCATIONS = "data/network/nodes_locations.csv"  # id,country, as written by the location notebook
+EDGES = "data/network/edges.csv"
+
+
+@dataclass
+class CoParticipation:
+    users: np.ndarray        # login per user index, sorted, so sources[i] < targets[i] as strings
+    incidence: sparse.csr_matrix  # issues x users, 1 where the user took part in the issue
+    sources: np.ndarray      # user indices
+    targets: np.ndarray
+    weights: np.ndarray      # number of issues both users took part in
+
+    def connected_users(self) -> np.ndarray:
+        return self.users[np.unique(np.concatenate([self.sources, self.targets]))]
+
+    def edges(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "Source": self.users[self.sources],
+            "Target": self.users[self.targets],
+            "Weight": self.weights,
+            "Type": "Undirected",
+        })
+
+
+def participation_from_issues(issues: Iterable[dict], resolver=None) -> tuple[list, list, dict]:
+    """
+    (issue index, login) pairs for issue authors and commenters, plus each login's first known country code.
+    As in the original edge extraction, issues without an author are skipped entirely.
+    Uses standardised_location when clean_nodes has set it, else the raw location resolved through resolver
+    (a locations.LocationResolver); a location that does not resolve to a code is left out.
+    """
+    issue_keys: list[int] = []
+    users: list[str] = []
+    locations: dict[str, str] = {}
+
+    def add(issue_index: int, author: dict) -> None:
+        login = author["login"]
+        issue_keys.append(issue_index)
+        users.append(login)
+        location = author.get("standardised_location")
+        if not location and resolver is not None:
+            location = resolver.get(author.get("location"))
+        if location and login not in locations:
+            locations[login] = location
+
+    for issue_index, issue in enumerate(issues):
+        if not isinstance(issue, dict) or not issue.get("author"):
+            continue
+        add(issue_index, issue["author"])
+        for comment in (issue.get("comments") or {}).get("nodes", []):
+            author = comment.get("author")
+            if author and "login" in author:
+                add(issue_index, author)
+
+    return issue_keys, users, locations
+
+
+def participation_from_frame(
+    df: pd.DataFrame,
+    issue_col: str = "parent_issue_id",
+    user_col: str = "author",
+    location_col: str = "author_location",
+) -> tuple[pd.Series, pd.Series, dict]:
+    """
+    Same as participation_from_issues for the flattened NLP frame used in networkx.ipynb.
+    """
+    d = df.dropna(subset=[issue_col, user_col])
+    # First non-missing location seen for each user
+    locations = df.dropna(subset=[user_col]).groupby(user_col)[location_col].first().dropna()
+    return d[issue_col], d[user_col], locations.to_dict()
+
+
+def incidence_matrix(issue_keys, users) -> tuple[sparse.csr_matrix, np.ndarray]:
+    """
+    Issues x users matrix with a 1 wherever a user posted in an issue, however many times.
+    """
+    issue_index, _ = pd.factorize(pd.Series(issue_keys), sort=False)
+    user_index, user_labels = pd.factorize(pd.Series(users), sort=True)
+    shape = (int(issue_index.max()) + 1 if len(issue_index) else 0, len(user_labels))
+    incidence = sparse.csr_matrix(
+        (np.ones(len(user_index), dtype=np.int32), (issue_index, user_index)), shape=shape
+    )
+    # Duplicate (issue, user) entries are summed on construction; participation is a set
+    incidence.data[:] = 1
+    return incidence, np.asarray(user_labels, dtype=object)
+
+
+def build_network(issue_keys, users, min_weight: int = 1) -> CoParticipation:
+    """
+    All pairwise co-participation counts from a single sparse product B.T @ B.
+    Only the upper triangle is kept, and pairs below min_weight are dropped.
+    """
+    incidence, labels = incidence_matrix(issue_keys, users)
+    co = sparse.triu(incidence.T @ incidence, k=1).tocoo()
+    keep = co.data >= min_weight
+    order = np.lexsort((co.col[keep], co.row[keep]))
+    return CoParticipation(
+        labels, incidence, co.row[keep][order], co.col[keep][order], co.data[keep][order].astype(np.int64)
+    )
+
+
+def country_names(users: np.ndarray, locations: dict, names: Optional[dict] = None) -> pd.Series:
+    """
+    Country name per user from their location code; users without a known code are left null, as in the notebook.
+    """
+    if names is None:
+        from locations import load_gazetteer
+        names = load_gazetteer()["names"]
+    codes = pd.Series(users, dtype=object).map(locations)
+    return codes.map(names)
+
+
+def nodes_frame(network: CoParticipation, locations: dict, names: Optional[dict] = None, connected_only: bool = False) -> pd.DataFrame:
+    users = network.connected_users() if connected_only else network.users
+    return pd.DataFrame({"id": users, "country": country_names(users, locations, names).values})
+
+
+def to_networkx(network: CoParticipation, locations: Optional[dict] = None, connected_only: bool = False):
+    """
+    nx.Graph with a weight per edge and a location per node, equivalent to G (min_weight=1) or T in networkx.ipynb.
+    """
+    import networkx as nx
+
+    graph = nx.Graph()
+    users = network.connected_users() if connected_only else network.users
+    locations = locations or {}
+    graph.add_nodes_from((u, {"location": locations.get(u)}) for u in users)
+    graph.add_weighted_edges_from(
+        zip(network.users[network.sources], network.users[network.targets], network.weights.tolist())
+    )
+    return graph
+
+
+def main(
+    in_path: str = PROCESSED,
+    nodes_path: str = NODES,
+    edges_path: str = EDGES,
+    min_weight: int = 1,
+    node_locations_path: str = NODE_LOCATIONS,
+) -> None:
+    with profiling.stage("build_network", [in_path], [nodes_path, edges_path, node_locations_path]) as record:
+        from locations import load_location_resolver
+        resolver = load_location_resolver()
+        issue_keys, users, locations = participation_from_issues(read_issues(in_path), resolver)
+        network = build_network(issue_keys, users, min_weight=min_weight)
+
+        nodes = nodes_frame(network, locations, resolver.names, connected_only=min_weight > 1)
+        nodes[["id"]].to_csv(nodes_path, index=False)
+        nodes.to_csv(node_locations_path, index=False)
+        network.edges().to_csv(edges_path, index=False)
+        record.rows_in = len(users)
+        record.rows_out = len(network.weights)
+    print(f"Users={len(network.users)}, Edges={len(network.weights)} (min_weight={min_weight}). Output: {nodes_path}, {node_locations_path}, {edges_path}")
+
+
+if __name__ == "__main__":
+    min_weight = 1
+    in_path = PROCESSED
+    for arg in sys.argv[1:]:
+        if arg.startswith("--min-weight="):
+            min_weight = int(arg.split("=", 1)[1])
+        elif not arg.startswith("--"):
+            in_path = arg
+    main(in_path, min_weight=min_weight)
@@ -0,0 +1,268 @@
+import hashlib
+import json
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+import networkx as nx
+import numpy as np
+
+CACHE_DIR = "data/network/.centrality_cache"
+
+# Set in each pool worker by _init_worker so the graph is pickled once per worker, not once per batch
+_GRAPH: Optional[nx.Graph] = None
+
+
+def graph_fingerprint(G: nx.Graph, weight: Optional[str] = "weight") -> str:
+    """
+    Content hash of the node set and weighted edge set, independent of insertion order.
+    """
+    h = hashlib.sha256()
+    h.update(b"directed" if G.is_directed() else b"undirected")
+    for node in sorted(map(repr, G.nodes())):
+        h.update(node.encode("utf-8", "surrogatepass") + b"\x00")
+    edges = []
+    for u, v, data in G.edges(data=True):
+        a, b = repr(u), repr(v)
+        if not G.is_directed() and b < a:
+            a, b = b, a
+        edges.append(f"{a}\x00{b}\x00{data.get(weight, 1) if weight else 1}")
+    for edge in sorted(edges):
+        h.update(edge.encode("utf-8", "surrogatepass") + b"\x01")
+    return h.hexdigest()
+
+
+def sample_size(n: int, epsilon: float, delta: float) -> int:
+    """
+    Sources needed so every node's estimate is within epsilon (on the normalised scale) with probability
+    1 - delta: Hoeffding's bound with a union bound over the n nodes, k >= ln(2n / delta) / (2 epsilon^2).
+    """
+    if n <= 2:
+        return n
+    return min(n, math.ceil(math.log(2 * n / delta) / (2 * epsilon ** 2)))
+
+
+def _init_worker(G: nx.Graph) -> None:
+    global _GRAPH
+    _GRAPH = G
+
+
+def _betweenness_batch(sources: list, weight: Optional[str]) -> dict:
+    G = _GRAPH
+    return nx.betweenness_centrality_subset(G, sources, list(G), normalized=False, weight=weight)
+
+
+def _distance_batch(pivots: list, weight: Optional[str]) -> tuple[dict, dict]:
+    """
+    Sum of distances from the pivots to every node they reach, and how many pivots reached it.
+    """
+    G = _GRAPH
+    totals: dict = {}
+    counts: dict = {}
+    for pivot in pivots:
+        if weight is None:
+            lengths = nx.single_source_shortest_path_length(G, pivot)
+        else:
+            lengths = nx.single_source_dijkstra_path_length(G, pivot, weight=weight)
+        for node, d in lengths.items():
+            if node != pivot:
+                totals[node] = totals.get(node, 0) + d
+                counts[node] = counts.get(node, 0) + 1
+    return totals, counts
+
+
+class CentralityService:
+    """
+    Centralities for the user graphs in networkx.ipynb.
+
+    Betweenness and closeness are estimated from k sampled sources (exact when k reaches n), with k derived
+    from an (epsilon, delta) error budget and the sources spread over a process pool. Results are cached on
+    disk and in memory by graph fingerprint plus parameters, so re-running a cell or slice is a lookup.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = CACHE_DIR,
+        workers: Optional[int] = None,
+        epsilon: float = 0.05,
+        delta: float = 0.1,
+        seed: int = 42,
+        batches_per_worker: int = 4,
+    ):
+        self.cache_dir = cache_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.epsilon = epsilon
+        self.delta = delta
+        self.seed = seed
+        self.batches_per_worker = batches_per_worker
+        self._memory: dict[str, dict] = {}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    # Caching ----------------------------------------------------------------------
+
+    def fingerprint(self, G: nx.Graph, weight: Optional[str] = "weight") -> str:
+        return graph_fingerprint(G, weight)
+
+    def _cached(self, G: nx.Graph, measure: str, params: dict, compute: Callable[[], dict]) -> dict:
+        key_source = json.dumps({"graph": self.fingerprint(G, params.get("weight")), "measure": measure, **params}, sort_keys=True)
+        key = hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+        if key in self._memory:
+            return dict(self._memory[key])
+
+        path = os.path.join(self.cache_dir, f"{key}.json") if self.cache_dir else None
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            nodes = {repr(n): n for n in G.nodes()}
+            result = {nodes[n]: v for n, v in stored["values"]}
+        else:
+            result = compute()
+            if path:
+                tmp = path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"measure": measure, "params": params, "values": [[repr(n), v] for n, v in result.items()]}, f)
+                os.replace(tmp, path)
+
+        self._memory[key] = result
+        return dict(result)
+
+    # Sampling and the pool --------------------------------------------------------
+
+    def _sources(self, G: nx.Graph, epsilon: Optional[float], k: Optional[int]) -> list:
+        # Sorted so the sample depends only on the graph's content, like the cache key
+        nodes = sorted(G.nodes(), key=repr)
+        if k is None:
+            k = sample_size(len(nodes), epsilon if epsilon is not None else self.epsilon, self.delta)
+        if k >= len(nodes):
+            return nodes
+        return random.Random(self.seed).sample(nodes, k)
+
+    def _map(self, G: nx.Graph, fn: Callable, items: list, *args) -> list:
+        n_batches = max(1, min(len(items), self.workers * self.batches_per_worker))
+        batches = [items[i::n_batches] for i in range(n_batches)]
+        if self.workers <= 1 or len(items) < 2 * self.workers:
+            _init_worker(G)
+            try:
+                return [fn(batch, *args) for batch in batches]
+            finally:
+                _init_worker(None)
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(G,)) as pool:
+            return list(pool.map(fn, batches, *[[a] * len(batches) for a in args]))
+
+    # Measures ---------------------------------------------------------------------
+
+    def betweenness(
+        self,
+        G: nx.Graph,
+        weight: Optional[str] = "weight",
+        normalized: bool = True,
+        epsilon: Optional[float] = None,
+        k: Optional[int] = None,
+    ) -> dict:
+        """
+        Brandes' algorithm from k sampled sources, scaled by n/k; equal to nx.betweenness_centrality when k >= n.
+        """
+        n = G.number_of_nodes()
+        sources = self._sources(G, epsilon, k)
+        params = {"weight": weight, "normalized": normalized, "k": len(sources), "seed": self.seed}
+
+        def compute() -> dict:
+            result = dict.fromkeys(G, 0.0)
+            if not sources:
+                return result
+            for partial in self._map(G, _betweenness_batch, sources, weight):
+                for node, value in partial.items():
+                    result[node] += value
+            scale = n / len(sources)
+            if normalized:
+                if n <= 2:
+                    scale = 0.0
+                else:
+                    scale *= (1 if G.is_directed() else 2) / ((n - 1) * (n - 2))
+            return {node: value * scale for node, value in result.items()}
+
+        return self._cached(G, "betweenness", params, compute)
+
+    def closeness(
+        self,
+        G: nx.Graph,
+        distance: Optional[str] = None,
+        epsilon: Optional[float] = None,
+        k: Optional[int] = None,
+    ) -> dict:
+        """
+        Eppstein-Wang estimate for undirected graphs: each node's average distance is taken over the sampled pivots in its component.
+        Uses the Wasserman-Faust scaling of nx.closeness_centrality (wf_improved=True) and matches it when k >= n.
+        Nodes in components no pivot landed in are computed exactly (those components are small).
+        """
+        n = G.number_of_nodes()
+        pivots = self._sources(G, epsilon, k)
+        params = {"weight": distance, "k": len(pivots), "seed": self.seed}
+
+        def compute() -> dict:
+            totals: dict = {}
+            counts: dict = {}
+            for batch_totals, batch_counts in self._map(G, _distance_batch, pivots, distance):
+                for node, d in batch_totals.items():
+                    totals[node] = totals.get(node, 0) + d
+                    counts[node] = counts.get(node, 0) + batch_counts[node]
+
+            component_size = {}
+            for component in nx.connected_components(G):
+                for node in component:
+                    component_size[node] = len(component)
+
+            result = {}
+            for node in G:
+                reachable = component_size[node]
+                if reachable <= 1 or n <= 1:
+                    result[node] = 0.0
+                elif node in counts and totals[node] > 0:
+                    average = totals[node] / counts[node]
+                    result[node] = (1 / average) * (reachable - 1) / (n - 1)
+                else:
+                    result[node] = nx.closeness_centrality(G, u=node, distance=distance)
+            return result
+
+        return self._cached(G, "closeness", params, compute)
+
+    def eigenvector(self, G: nx.Graph, weight: Optional[str] = "weight", max_iter: int = 500) -> dict:
+        """
+        Power iteration is already O(E) per step, so this is exact; it is only cached.
+        """
+        def compute() -> dict:
+            try:
+                return nx.eigenvector_centrality(G, weight=weight, max_iter=max_iter)
+            except nx.PowerIterationFailedConvergence:
+                return {node: float("nan") for node in G.nodes()}
+
+        return self._cached(G, "eigenvector", {"weight": weight, "max_iter": max_iter}, compute)
+
+    def degree(self, G: nx.Graph) -> dict:
+        return nx.degree_centrality(G) if G.number_of_nodes() else {}
+
+    def compute_centralities(self, G: nx.Graph) -> tuple[dict, dict, dict, dict]:
+        """
+        Drop-in for compute_centralities in networkx.ipynb: (degree, closeness, betweenness, eigenvector).
+        """
+        if G.number_of_nodes() == 0:
+            return {}, {}, {}, {}
+        return self.degree(G), self.closeness(G), self.betweenness(G), self.eigenvector(G)
+
+    def centrality_averages(self, G: nx.Graph) -> dict:
+        deg_c, close_c, betw_c, eig_c = self.compute_centralities(G)
+
+        def mean(d: dict) -> float:
+            values = [v for v in d.values() if not (isinstance(v, float) and math.isnan(v))]
+            return float(np.mean(values)) if values else float("nan")
+
+        return {
+            "degree_centrality_mean": mean(deg_c),
+            "closeness_centrality_mean": mean(close_c),
+            "betweenness_centrality_mean": mean(betw_c),
+            "eigenvector_centrality_mean": mean(eig_c),
+        }
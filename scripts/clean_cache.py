@@ -0,0 +1,95 @@
+import hashlib
+import json
+import sqlite3
+import time
+from dataclasses import asdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from clean_text import CLEANER_VERSION, CleanConfig
+
+
+class CleanCache:
+    """
+    Persistent cache of clean_github_text results, keyed by a hash of (raw text, CleanConfig fields, CLEANER_VERSION).
+    Entries are evicted least-recently-used first once the stored payload exceeds max_bytes.
+    """
+
+    def __init__(self, path: str = "data/processed/.clean_cache.sqlite", max_bytes: int = 1 << 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, cleaned TEXT, meta TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+
+    def __enter__(self) -> "CleanCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def keys(self, texts: List[Optional[str]], cfg: CleanConfig) -> List[str]:
+        prefix = f"{CLEANER_VERSION}\x00{json.dumps(asdict(cfg), sort_keys=True)}\x00"
+        return [
+            hashlib.sha256((prefix + ("\x01None" if text is None else text)).encode("utf-8", "surrogatepass")).hexdigest()
+            for text in texts
+        ]
+
+    def get_many(self, keys: List[str]) -> Dict[str, Tuple[Optional[str], Dict]]:
+        found: Dict[str, Tuple[Optional[str], Dict]] = {}
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.conn.execute(
+                f"SELECT key, cleaned, meta FROM entries WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, cleaned, meta in rows:
+                found[key] = (cleaned, meta)
+            if rows:
+                self.conn.execute(
+                    f"UPDATE entries SET last_used = ? WHERE key IN ({placeholders})", [time.time(), *batch]
+                )
+
+        hits = sum(1 for key in keys if key in found)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        # Meta is decoded per request so callers can mutate it freely
+        return {key: (cleaned, json.loads(meta)) for key, (cleaned, meta) in found.items()}
+
+    def put_many(self, items: Iterable[Tuple[str, Optional[str], Dict]]) -> None:
+        now = time.time()
+        rows = []
+        for key, cleaned, meta in items:
+            meta_json = json.dumps(meta, ensure_ascii=False)
+            size = len(meta_json) + (len(cleaned) if cleaned is not None else 0)
+            rows.append((key, cleaned, meta_json, size, now))
+        self.conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", rows)
+
+    def evict(self) -> int:
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return 0
+
+        doomed = []
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY last_used ASC"):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+        self.conn.commit()
+        return len(doomed)
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.evict()
+        self.conn.commit()
+        self.conn.close()
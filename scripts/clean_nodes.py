@@ -1,8 +1,14 @@
 import json
+import sys
 import pandas as pd
 import time
 import csv
 import os
+from typing import Iterable, Iterator
+
+import profiling
+from json_stream import read_issues, write_issues
+from locations import load_location_resolver
 
 
 def remove_authorless_comments(issue: dict) -> None:
@@ -13,7 +19,7 @@ def remove_authorless_comments(issue: dict) -> None:
         ]
         issue["comments"]["nodes"] = filtered_comments
 
-def standardise_author_locations(issue: dict, location_lookup: pd.DataFrame) -> None:
+def standardise_author_locations(issue: dict, location_lookup: dict) -> None:
     author = issue.get("author")
     if author and "location" in author:
         raw_location = author.get("location", None)
@@ -46,6 +52,30 @@ def standardise_author_locations(issue: dict, location_lookup: pd.DataFrame) ->
     
     pass
 
+def load_location_lookup(path: str = "data/processed/author_locations_processed.csv") -> dict:
+    with open(path, "r") as f:
+        location_lookup = pd.read_csv(f)
+    return location_lookup.set_index("location_raw")["country_code"].to_dict()
+
+def clean_issue(issue: dict, location_lookup: dict) -> dict:
+    remove_authorless_comments(issue)
+    standardise_author_locations(issue, location_lookup)
+    return issue
+
+def stream(node_data: Iterable[dict], location_lookup: dict) -> Iterator[dict]:
+    for issue in node_data:
+        yield clean_issue(issue, location_lookup)
+
+def main_stream(
+    location_lookup: dict,
+    in_path: str = "data/raw/issues_data_10k.json",
+    out_path: str = "data/processed/issues_data_10k_processed.jsonl",
+) -> None:
+    with profiling.stage("clean_nodes", [in_path], [out_path]) as record:
+        count = write_issues(out_path, stream(profiling.counted(read_issues(in_path), record), location_lookup))
+        record.rows_out = count
+    print(f"Cleaned {count} issues. Output: {out_path}")
+
 def main(node_data: list, location_lookup: dict) -> None:
     for issue in node_data:
         remove_authorless_comments(issue)
@@ -56,11 +86,12 @@ def main(node_data: list, location_lookup: dict) -> None:
 
 
 if __name__ == "__main__":
-    with open("data/raw/issues_data_10k.json", "r") as f:
-        node_data = json.load(f)
+    location_lookup = load_location_resolver()
 
-    with open("data/processed/author_locations_processed.csv", "r") as f:
-        location_lookup = pd.read_csv(f)
-        location_lookup = location_lookup.set_index("location_raw")["country_code"].to_dict()
+    if "--stream" in sys.argv:
+        main_stream(location_lookup)
+    else:
+        with open("data/raw/issues_data_10k.json", "r") as f:
+            node_data = json.load(f)
 
-    main(node_data, location_lookup)    
\ No newline at end of file
+        main(node_data, location_lookup)
@@ -1,8 +1,16 @@
+import os
 import re
+import sys
 import json
 import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, Iterable, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import profiling
 
 # Regex patterns
 URL_RE = re.compile(r"\bhttps?://[^\s<>()\]]+|\bwww\.[^\s<>()\]]+", re.IGNORECASE)
@@ -44,6 +52,7 @@ ANSI_ESCAPE_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
 UNICODE_REPLACEMENT_CHAR_RE = re.compile(r"\uFFFD")
 PROGRESS_BAR_RE = re.compile(r"\b(?:\d{1,3}%\|.*?\|\s*\d+/\d+)", re.DOTALL)  # tqdm-like
 ITERATION_SPAM_RE = re.compile(r"(?:^|\n)\s*Iteration:\s*\d+%?\|.*?(?:\n|$)", re.IGNORECASE)
+PROGRESS_COLLAPSE_RE = re.compile(r"(?:\n\[PROGRESS\]\n){3,}")
 
 # Markdown links/images
 MD_LINK_RE = re.compile(r"\[([^\]]+)\]\(([^)]+)\)")
@@ -51,9 +60,26 @@ MD_IMAGE_RE = re.compile(r"!\[([^\]]*)\]\(([^)]+)\)")
 BLOCKQUOTE_RE = re.compile(r"(?m)^\s*>\s?.*$")
 HTML_TAG_RE = re.compile(r"<[^>]+>")
 
+# Tokens the rules above substitute into the text; they say what was removed, not what was written
+PLACEHOLDER_TOKENS = frozenset({
+    "CODEBLOCK", "INLINECODE", "URL", "USER", "ISSUE_REF", "COMMIT", "FILEPATH", "FLAG", "VERSION", "IMAGE", "PROGRESS",
+})
+
 WHITESPACE_RE = re.compile(r"[ \t]+")
 MANY_NEWLINES_RE = re.compile(r"\n{3,}")
 
+# Module-level rules and steps profiling.traced times per call while tracing is on (see process_jsonl)
+TRACED_RULES = [
+    "ANSI_ESCAPE_RE", "EMOJI_RE", "ITERATION_SPAM_RE", "PROGRESS_COLLAPSE_RE", "BLOCKQUOTE_RE", "HTML_TAG_RE",
+    "MD_IMAGE_RE", "MD_LINK_RE", "FENCED_CODE_RE", "INLINE_CODE_RE", "URL_RE", "WWW_RE", "MENTION_RE",
+    "ISSUE_REF_RE", "COMMIT_RE", "FILEPATH_RE", "FLAG_RE", "VERSION_RE", "WHITESPACE_RE", "MANY_NEWLINES_RE",
+    "PROGRESS_BAR_RE", "normalize_text", "normalize_text_fast", "is_mostly_noise", "is_mostly_noise_fast",
+    "score_noise_batch",
+]
+
+# Part of the clean cache key; bump whenever clean_github_text's output changes so cached results are invalidated
+CLEANER_VERSION = "1"
+
 @dataclass
 class CleanConfig:
     replace_codeblocks: bool = True
@@ -85,12 +111,13 @@ def normalize_text(s: str) -> str:
     s = "".join(ch for ch in s if (ch == "\n" or ch == "\t" or (ord(ch) >= 32 and ord(ch) != 127)))
     return s
 
-def is_mostly_noise(s: str) -> Tuple[bool, float, Dict[str, int]]:
+def is_mostly_noise(s: str) -> Tuple[float, Dict[str, int]]:
     """
     Heuristic: if a large portion of the text is made of non-letter tokens, progress bars, or repeated iteration lines.
+    Returns (noise_score, counts).
     """
     if not s:
-        return True, 1.0, {"len": 0}
+        return 1.0, {"len": 0}
 
     length = len(s)
     letters = sum(ch.isalpha() for ch in s)
@@ -116,10 +143,11 @@ def is_mostly_noise(s: str) -> Tuple[bool, float, Dict[str, int]]:
     }
     return noise_score, meta
 
-def clean_github_text(text: str, cfg: CleanConfig) -> Tuple[Optional[str], Dict]:
+def clean_github_text(text: str, cfg: CleanConfig, score_noise: bool = True) -> Tuple[Optional[str], Dict]:
     """
     Returns (cleaned_text or None if dropped, metadata)
     Implements the pipeline steps you described.
+    With score_noise=False the noise check is left to the caller (see score_noise_batch / apply_noise_score).
     """
     meta: Dict = {}
     if text is None:
@@ -133,7 +161,7 @@ def clean_github_text(text: str, cfg: CleanConfig) -> Tuple[Optional[str], Dict]
 
     if cfg.compress_progress_spam:
         text = ITERATION_SPAM_RE.sub("\n[PROGRESS]\n", text)
-        text = re.sub(r"(?:\n\[PROGRESS\]\n){3,}", "\n[PROGRESS]\n", text)
+        text = PROGRESS_COLLAPSE_RE.sub("\n[PROGRESS]\n", text)
 
     if cfg.drop_blockquotes:
         text = BLOCKQUOTE_RE.sub("", text)
@@ -175,12 +203,21 @@ def clean_github_text(text: str, cfg: CleanConfig) -> Tuple[Optional[str], Dict]
 
     text = WHITESPACE_RE.sub(" ", text)
     text = MANY_NEWLINES_RE.sub("\n\n", text)
+    return _finish(text, meta, cfg, is_mostly_noise if score_noise else None)
+
+def _finish(text: str, meta: Dict, cfg: CleanConfig, noise=is_mostly_noise) -> Tuple[Optional[str], Dict]:
     text = text.strip()
 
     if len(text) < 5:
         return None, {"dropped": True, "reason": "too_short"}
 
-    noise_score, noise_meta = is_mostly_noise(text)
+    if noise is None:
+        return text, meta
+    return apply_noise_score(text, meta, cfg, *noise(text))
+
+def apply_noise_score(
+    text: str, meta: Dict, cfg: CleanConfig, noise_score: float, noise_meta: Dict[str, int]
+) -> Tuple[Optional[str], Dict]:
     meta.update({"noise_score": noise_score, **noise_meta})
     if noise_score >= cfg.drop_if_noise_ratio_ge:
         return None, {"dropped": True, "reason": "mostly_noise", **meta}
@@ -188,6 +225,241 @@ def clean_github_text(text: str, cfg: CleanConfig) -> Tuple[Optional[str], Dict]
     meta["dropped"] = False
     return text, meta
 
+# Guarded engine
+# Produces byte-identical output to clean_github_text by running the same rules in the same order: this is not a
+# single combined scan. Each rule is guarded by a substring that any match must contain (checked on the text as it
+# is at that step), so a rule that cannot fire costs one memchr-style scan instead of a regex pass. The gain is
+# therefore largest on plain prose and small on markup-heavy bodies, where every guard fires. The per-character
+# generators in normalize_text and is_mostly_noise are replaced by str.translate / bytes.translate.
+CONTROL_CHARS_TABLE = {i: None for i in [*range(32), 127] if i not in (9, 10)}
+WWW_RE = re.compile(r"www\.", re.IGNORECASE)
+
+def normalize_text_fast(s: str) -> str:
+    s = unicodedata.normalize("NFKC", s)
+    if "\r" in s:
+        s = s.replace("\r\n", "\n").replace("\r", "\n")
+    if "\x1b" in s:
+        s = ANSI_ESCAPE_RE.sub("", s)
+    if not s.isascii():  # the emoji ranges and U+FFFD are all non-ASCII
+        s = s.replace("\uFFFD", "")
+        s = EMOJI_RE.sub(" ", s)
+    return s.translate(CONTROL_CHARS_TABLE)
+
+ASCII_LETTERS = bytes(i for i in range(128) if chr(i).isalpha())
+ASCII_DIGITS = bytes(i for i in range(128) if chr(i).isdigit())
+ASCII_SPACES = bytes(i for i in range(128) if chr(i).isspace())
+
+def is_mostly_noise_fast(s: str) -> Tuple[float, Dict[str, int]]:
+    """
+    Same result as is_mostly_noise; ASCII strings are counted with bytes.translate instead of generators.
+    """
+    if not s:
+        return is_mostly_noise(s)
+
+    length = len(s)
+    if s.isascii():
+        b = s.encode("ascii")
+        letters = length - len(b.translate(None, ASCII_LETTERS))
+        digits = length - len(b.translate(None, ASCII_DIGITS))
+        spaces = length - len(b.translate(None, ASCII_SPACES))
+    else:
+        letters = sum(map(str.isalpha, s))
+        digits = sum(map(str.isdigit, s))
+        spaces = sum(map(str.isspace, s))
+    other = length - letters - digits - spaces
+
+    progress_hits = len(PROGRESS_BAR_RE.findall(s)) if "%|" in s else 0
+    iter_lines = len(ITERATION_SPAM_RE.findall(s)) if ":" in s else 0
+
+    noise_score = (other / max(1, length)) + min(1.0, (progress_hits + iter_lines) / 10.0) * 0.5
+
+    meta = {
+        "len": length,
+        "letters": letters,
+        "digits": digits,
+        "spaces": spaces,
+        "other": other,
+        "progress_hits": progress_hits,
+        "iter_lines": iter_lines,
+    }
+    return noise_score, meta
+
+def clean_github_text_guarded(text: str, cfg: CleanConfig, score_noise: bool = True) -> Tuple[Optional[str], Dict]:
+    meta: Dict = {}
+    if text is None:
+        return None, {"dropped": True, "reason": "None"}
+
+    text = normalize_text_fast(text)
+
+    if cfg.drop_if_too_long and len(text) > cfg.drop_if_too_long:
+        meta["truncated_from"] = len(text)
+        text = text[:cfg.drop_if_too_long]
+
+    if cfg.compress_progress_spam:
+        if ":" in text:
+            text = ITERATION_SPAM_RE.sub("\n[PROGRESS]\n", text)
+        if "\n[PROGRESS]\n" in text:
+            text = PROGRESS_COLLAPSE_RE.sub("\n[PROGRESS]\n", text)
+
+    if cfg.drop_blockquotes and ">" in text:
+        text = BLOCKQUOTE_RE.sub("", text)
+
+    if cfg.drop_html and "<" in text:
+        text = HTML_TAG_RE.sub(" ", text)
+
+    if "](" in text:
+        text = MD_IMAGE_RE.sub(" IMAGE ", text)
+
+        if cfg.keep_md_link_text:
+            text = MD_LINK_RE.sub(r"\1", text)
+
+    if "`" in text:
+        if cfg.replace_codeblocks and "```" in text:
+            text = FENCED_CODE_RE.sub(" CODEBLOCK ", text)
+
+        if cfg.replace_inline_code:
+            text = INLINE_CODE_RE.sub(" INLINECODE ", text)
+
+    if cfg.replace_urls and ("://" in text or ("." in text and WWW_RE.search(text))):
+        text = URL_RE.sub(" URL ", text)
+
+    if cfg.replace_mentions and "@" in text:
+        text = MENTION_RE.sub(" USER ", text)
+
+    if cfg.replace_issue_refs and "#" in text:
+        text = ISSUE_REF_RE.sub(" ISSUE_REF ", text)
+
+    if cfg.replace_commits:
+        text = COMMIT_RE.sub(" COMMIT ", text)
+
+    if cfg.replace_paths and "/" in text:
+        text = FILEPATH_RE.sub(" FILEPATH ", text)
+
+    if cfg.replace_flags and "-" in text:
+        text = FLAG_RE.sub(" FLAG ", text)
+
+    if cfg.replace_versions and "." in text:
+        text = VERSION_RE.sub(" VERSION ", text)
+
+    if "  " in text or "\t" in text:
+        text = WHITESPACE_RE.sub(" ", text)
+    if "\n\n\n" in text:
+        text = MANY_NEWLINES_RE.sub("\n\n", text)
+    return _finish(text, meta, cfg, is_mostly_noise_fast if score_noise else None)
+
+ENGINES = {
+    "reference": clean_github_text,
+    "guarded": clean_github_text_guarded,
+}
+
+# Batch noise scoring
+# Scores many documents at once: all texts are decoded into one codepoint array, each codepoint is mapped to a
+# character class through a lookup table and the classes are counted per document with a single bincount.
+# Results are identical to is_mostly_noise.
+NOISE_FIELDS = ["len", "letters", "digits", "spaces", "other", "progress_hits", "iter_lines"]
+NOISE_DTYPE = np.dtype([("noise_score", np.float64)] + [(name, np.int64) for name in NOISE_FIELDS])
+
+CLASS_OTHER, CLASS_LETTER, CLASS_DIGIT, CLASS_SPACE = 0, 1, 2, 3
+_BMP_CLASSES: Optional[np.ndarray] = None
+
+def _char_class(ch: str) -> int:
+    if ch.isalpha():
+        return CLASS_LETTER
+    if ch.isdigit():
+        return CLASS_DIGIT
+    if ch.isspace():
+        return CLASS_SPACE
+    return CLASS_OTHER
+
+def char_classes(codepoints: np.ndarray) -> np.ndarray:
+    global _BMP_CLASSES
+    if _BMP_CLASSES is None:
+        _BMP_CLASSES = np.array([_char_class(chr(cp)) for cp in range(0x10000)], dtype=np.uint8)
+
+    bmp = codepoints < 0x10000
+    if bmp.all():
+        return _BMP_CLASSES[codepoints]
+
+    classes = np.empty(len(codepoints), dtype=np.uint8)
+    classes[bmp] = _BMP_CLASSES[codepoints[bmp]]
+    astral, inverse = np.unique(codepoints[~bmp], return_inverse=True)
+    classes[~bmp] = np.array([_char_class(chr(cp)) for cp in astral], dtype=np.uint8)[inverse]
+    return classes
+
+def score_noise_batch(texts: Sequence[str], max_chars: int = 1 << 24) -> np.ndarray:
+    """
+    Noise-scores every text, returning a structured array with noise_score and the per-class counts
+    (pd.DataFrame(result) gives a table). Work is split into slices of at most max_chars characters.
+    """
+    out = np.zeros(len(texts), dtype=NOISE_DTYPE)
+    start = 0
+    while start < len(texts):
+        end = start
+        chars = 0
+        while end < len(texts) and (end == start or chars + len(texts[end]) <= max_chars):
+            chars += len(texts[end])
+            end += 1
+        _score_slice(texts[start:end], out[start:end])
+        start = end
+    return out
+
+def _score_slice(texts: Sequence[str], out: np.ndarray) -> None:
+    n = len(texts)
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=n)
+    codepoints = np.frombuffer("".join(texts).encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    doc = np.repeat(np.arange(n, dtype=np.int64), lengths)
+    counts = np.bincount(doc * 4 + char_classes(codepoints), minlength=4 * n).reshape(n, 4)
+
+    progress_hits = np.fromiter(
+        (len(PROGRESS_BAR_RE.findall(t)) if "%|" in t else 0 for t in texts), dtype=np.int64, count=n
+    )
+    iter_lines = np.fromiter(
+        (len(ITERATION_SPAM_RE.findall(t)) if ":" in t else 0 for t in texts), dtype=np.int64, count=n
+    )
+
+    out["len"] = lengths
+    out["letters"] = counts[:, CLASS_LETTER]
+    out["digits"] = counts[:, CLASS_DIGIT]
+    out["spaces"] = counts[:, CLASS_SPACE]
+    out["other"] = lengths - out["letters"] - out["digits"] - out["spaces"]
+    out["progress_hits"] = progress_hits
+    out["iter_lines"] = iter_lines
+    out["noise_score"] = (
+        out["other"] / np.maximum(1, lengths) + np.minimum(1.0, (progress_hits + iter_lines) / 10.0) * 0.5
+    )
+    out["noise_score"][lengths == 0] = 1.0
+
+def noise_meta_from_record(record) -> Tuple[float, Dict[str, int]]:
+    return float(record["noise_score"]), {name: int(record[name]) for name in NOISE_FIELDS}
+
+def clean_texts_batch_noise(texts: List[str], cfg: CleanConfig, engine: str = "reference") -> List[Tuple[Optional[str], Dict]]:
+    """
+    Same results as cleaning each text with the engine, but the survivors are noise-scored in one batch.
+    """
+    clean = ENGINES[engine]
+    results = [clean(text, cfg, score_noise=False) for text in texts]
+    survivors = [i for i, (cleaned, _) in enumerate(results) if cleaned is not None]
+    scores = score_noise_batch([results[i][0] for i in survivors])
+    for i, record in zip(survivors, scores):
+        cleaned, meta = results[i]
+        results[i] = apply_noise_score(cleaned, meta, cfg, *noise_meta_from_record(record))
+    return results
+
+def sweep_noise_thresholds(
+    texts: List[str],
+    thresholds: Sequence[float],
+    cfg: CleanConfig = CleanConfig(),
+    engine: str = "guarded",
+) -> Dict[float, int]:
+    """
+    Number of rows kept for each drop_if_noise_ratio_ge value. Texts are cleaned and scored once;
+    the threshold only decides which scored rows survive.
+    """
+    clean = ENGINES[engine]
+    bodies = [cleaned for cleaned, _ in (clean(text, cfg, score_noise=False) for text in texts) if cleaned is not None]
+    scores = score_noise_batch(bodies)["noise_score"]
+    return {t: int((scores < t).sum()) for t in thresholds}
+
 def read_jsonl(path: str) -> Iterable[dict]:
     with open(path, "r", encoding="utf-8") as f:
         for line in f:
@@ -202,36 +474,145 @@ def write_jsonl(path: str, rows: Iterable[dict]) -> None:
         for r in rows:
             f.write(json.dumps(r, ensure_ascii=False) + "\n")
 
-def process_jsonl(in_path: str, out_path: str, cfg: CleanConfig = CleanConfig()) -> None:
+def chunked(rows: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def clean_texts(
+    texts: List[str], cfg: CleanConfig, engine: str = "reference", batch_noise: bool = True
+) -> List[Tuple[Optional[str], Dict]]:
+    if batch_noise:
+        return clean_texts_batch_noise(texts, cfg, engine)
+    clean = ENGINES[engine]
+    return [clean(text, cfg) for text in texts]
+
+def clean_chunks(
+    chunks: Iterable[List[dict]],
+    cfg: CleanConfig,
+    workers: int = 1,
+    engine: str = "reference",
+    cache=None,
+) -> Iterator[Tuple[List[dict], List[Tuple[Optional[str], Dict]]]]:
+    """
+    Yields (rows, results) per chunk in input order. With workers > 1 chunks are cleaned in a process pool,
+    keeping at most 2 * workers chunks in flight so memory stays bounded. With a CleanCache only rows that
+    miss the cache are cleaned.
+    """
+    def lookup(rows):
+        texts = [row["text"] for row in rows]
+        if cache is None:
+            return None, {}, texts
+        keys = cache.keys(texts, cfg)
+        found = cache.get_many(keys)
+        return keys, found, [text for text, key in zip(texts, keys) if key not in found]
+
+    def merge(keys, found, results):
+        if cache is None:
+            return results
+        cache.put_many((key, *result) for key, result in zip((k for k in keys if k not in found), results))
+        fresh = iter(results)
+        # Copies, as the same cached entry can back several rows and callers annotate meta in place
+        return [(found[key][0], dict(found[key][1])) if key in found else next(fresh) for key in keys]
+
+    if workers <= 1:
+        for rows in chunks:
+            keys, found, todo = lookup(rows)
+            yield rows, merge(keys, found, clean_texts(todo, cfg, engine))
+        return
+
+    def submit(pool, todo):
+        # Workers trace their own rule calls and hand the counts back with the results
+        if profiling.enabled:
+            return pool.submit(profiling.call_traced, __name__, TRACED_RULES, clean_texts, todo, cfg, engine)
+        return pool.submit(clean_texts, todo, cfg, engine)
+
+    def result(future):
+        return profiling.merge_worker(future.result()) if profiling.enabled else future.result()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for rows in chunks:
+            keys, found, todo = lookup(rows)
+            pending.append((rows, keys, found, submit(pool, todo)))
+            if len(pending) >= 2 * workers:
+                rows, keys, found, future = pending.popleft()
+                yield rows, merge(keys, found, result(future))
+        while pending:
+            rows, keys, found, future = pending.popleft()
+            yield rows, merge(keys, found, result(future))
+
+def process_jsonl(
+    in_path: str,
+    out_path: str,
+    cfg: CleanConfig = CleanConfig(),
+    workers: int = 1,
+    chunk_size: int = 1000,
+    engine: str = "reference",
+    cache=None,
+) -> None:
+    """
+    Cleans every row of in_path, streaming kept rows to out_path and per-row metadata to out_path + ".meta.jsonl".
+    workers=0 uses every core. engine="guarded" selects clean_github_text_guarded (identical output).
+    cache is an optional clean_cache.CleanCache; only rows it has not seen are cleaned.
+    """
+    if workers == 0:
+        workers = os.cpu_count() or 1
+
     kept = 0
     dropped = 0
-    out_rows = []
-
-    meta_dict = []
-
-    for row in read_jsonl(in_path):
-        raw = row['text']
-        cleaned, meta = clean_github_text(raw, cfg)
-        if cleaned is None:
-            dropped += 1
-        else:
-            kept += 1
-            out_rows.append({"id": row.get("id", ""), "text": cleaned})
 
-        meta["text"] = row
+    with profiling.stage("clean_text", [in_path], [out_path, out_path + ".meta.jsonl"]) as record, \
+            profiling.traced(globals(), TRACED_RULES), \
+            open(out_path + ".meta.jsonl", "w", encoding="utf-8") as meta_f, open(out_path, "w", encoding="utf-8") as out_f:
+        for rows, results in clean_chunks(chunked(read_jsonl(in_path), chunk_size), cfg, workers, engine, cache):
+            for row, (cleaned, meta) in zip(rows, results):
+                if cleaned is None:
+                    dropped += 1
+                else:
+                    kept += 1
+                    out_f.write(json.dumps({"id": row.get("id", ""), "text": cleaned}, ensure_ascii=False) + "\n")
+
+                meta["text"] = row
+                meta_f.write(json.dumps(meta, ensure_ascii=False) + "\n")
+            if cache is not None:
+                cache.commit()
+        record.rows_in = kept + dropped
+        record.rows_out = kept
 
-        meta_dict.append(meta)
-
-    write_jsonl(out_path + ".meta.jsonl", meta_dict)
-    write_jsonl(out_path, out_rows)
     print(f"Done. Kept={kept}, Dropped={dropped}, Total={kept+dropped}. Output: {out_path}")
-
-
-def main():
-    process_jsonl(
-        "data/processed/texts_only_with_ids.jsonl",
-        "data/processed/texts_only_with_ids_cleaned.jsonl"
-    )
+    if cache is not None:
+        print(f"Cache: hits={cache.hits}, misses={cache.misses}")
+
+
+def main(workers: int = 1, chunk_size: int = 1000, engine: str = "reference", use_cache: bool = True):
+    # Imported here as clean_cache itself imports this module
+    from clean_cache import CleanCache
+
+    cache = CleanCache() if use_cache else None
+    try:
+        process_jsonl(
+            "data/processed/texts_only_with_ids.jsonl",
+            "data/processed/texts_only_with_ids_cleaned.jsonl",
+            workers=workers,
+            chunk_size=chunk_size,
+            engine=engine,
+            cache=cache,
+        )
+    finally:
+        if cache is not None:
+            cache.close()
 
 if __name__ == "__main__":
-    main()
+    options = dict(arg[2:].split("=", 1) for arg in sys.argv[1:] if arg.startswith("--") and "=" in arg)
+    main(
+        workers=int(options.get("workers", 1)),
+        chunk_size=int(options.get("chunk-size", 1000)),
+        engine=options.get("engine", "reference"),
+        use_cache="--no-cache" not in sys.argv,
+    )
@@ -0,0 +1,177 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Optional, Sequence
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from build_network import build_network
+from temporal_graph import events_from_frame
+
+# Per-worker state, set once by _init_worker: event arrays viewed straight out of shared memory
+_EVENTS: dict = {}
+_GRAPHS: dict = {}
+
+
+class SharedEvents:
+    """
+    Time-sorted (time, issue, user) event arrays placed in shared memory once, so pool workers attach to them
+    by name instead of receiving a pickled graph or frame per job.
+    """
+
+    def __init__(self, times: np.ndarray, issues: np.ndarray, users: np.ndarray):
+        order = np.argsort(times, kind="stable")
+        self._blocks = []
+        self.spec = {}
+        for name, array in (("times", times), ("issues", issues), ("users", users)):
+            array = np.ascontiguousarray(np.asarray(array, dtype=np.int64)[order])
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=np.int64, buffer=block.buf)[:] = array
+            self._blocks.append(block)
+            self.spec[name] = (block.name, len(array))
+
+    def __enter__(self) -> "SharedEvents":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+def _init_worker(spec: dict, labels: np.ndarray) -> None:
+    _GRAPHS.clear()
+    _EVENTS.clear()
+    blocks = []
+    for name, (block_name, length) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        _EVENTS[name] = np.ndarray((length,), dtype=np.int64, buffer=block.buf)
+    _EVENTS["blocks"] = blocks  # keeps the mappings alive
+    _EVENTS["labels"] = labels
+
+
+def _window_graph(start: Optional[int], end: Optional[int], min_weight: int) -> nx.Graph:
+    """
+    Co-participation graph of the events in [start, end), built once per worker and window.
+    """
+    key = (start, end, min_weight)
+    if key in _GRAPHS:
+        return _GRAPHS[key]
+
+    times, issues, users, labels = _EVENTS["times"], _EVENTS["issues"], _EVENTS["users"], _EVENTS["labels"]
+    lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+    hi = len(times) if end is None else int(np.searchsorted(times, end, side="left"))
+    window_issues = issues[lo:hi]
+    window_users = labels[users[lo:hi]]
+    with_issue = window_issues >= 0
+
+    network = build_network(window_issues[with_issue], window_users[with_issue], min_weight=min_weight)
+    graph = nx.Graph()
+    if min_weight <= 1:
+        # Everyone active in the window, as in snapshot_user_graph
+        graph.add_nodes_from(pd.unique(window_users))
+    graph.add_weighted_edges_from(
+        zip(network.users[network.sources], network.users[network.targets], network.weights.tolist())
+    )
+    # A few windows per worker at most; keep only the latest to bound memory
+    _GRAPHS.clear()
+    _GRAPHS[key] = graph
+    return graph
+
+
+def _run_job(job: tuple) -> tuple[dict, list]:
+    job_id, start, end, resolution, seed, min_weight, algorithm = job
+    began = time.perf_counter()
+    graph = _window_graph(start, end, min_weight)
+
+    if graph.number_of_edges() == 0:
+        communities = []
+        modularity = None
+    elif algorithm == "greedy":
+        communities = list(nx.algorithms.community.greedy_modularity_communities(graph, weight="weight", resolution=resolution))
+        modularity = nx.algorithms.community.modularity(graph, communities, weight="weight", resolution=resolution)
+    else:
+        communities = nx.algorithms.community.louvain_communities(graph, weight="weight", resolution=resolution, seed=seed)
+        modularity = nx.algorithms.community.modularity(graph, communities, weight="weight", resolution=resolution)
+
+    # Communities are numbered largest first so assignments are comparable across seeds
+    communities = sorted(communities, key=lambda c: (-len(c), min(map(str, c))))
+    assignments = [(job_id, node, index) for index, community in enumerate(communities) for node in community]
+    summary = {
+        "job": job_id,
+        "nodes": graph.number_of_nodes(),
+        "edges": graph.number_of_edges(),
+        "communities": len(communities),
+        "modularity": modularity,
+        "seconds": time.perf_counter() - began,
+    }
+    return summary, assignments
+
+
+def _timestamp_ns(value) -> Optional[int]:
+    if value is None:
+        return None
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return ts.value
+
+
+def run_community_jobs(
+    df: pd.DataFrame,
+    jobs: Sequence[tuple],
+    min_weight: int = 2,
+    algorithm: str = "louvain",
+    workers: Optional[int] = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Runs community detection for each (window, resolution, seed) job, where window is (start, end) or None
+    for all time. min_weight=2 gives the T graphs of networkx.ipynb.
+
+    Returns (summary, assignments): one row per job with modularity and community count, and one row per
+    (job, node) with its community. Modularity is scored at each job's resolution, the one its partition
+    was optimised for.
+    """
+    if algorithm not in ("louvain", "greedy"):
+        raise ValueError(f"Unknown algorithm {algorithm!r}; choose 'louvain' or 'greedy'")
+
+    times, issues, users, labels, _ = events_from_frame(df)
+    expanded = []
+    for job_id, (window, resolution, seed) in enumerate(jobs):
+        start, end = window if window is not None else (None, None)
+        expanded.append((job_id, _timestamp_ns(start), _timestamp_ns(end), resolution, seed, min_weight, algorithm))
+    # Jobs on the same window go to the same worker in a row so its graph is reused
+    expanded.sort(key=lambda j: (j[1] is not None, j[1] or 0, j[2] is not None, j[2] or 0))
+
+    workers = workers or os.cpu_count() or 1
+    with SharedEvents(times, issues, users) as shared:
+        if workers <= 1 or len(expanded) <= 1:
+            _init_worker(shared.spec, labels)
+            try:
+                results = [_run_job(job) for job in expanded]
+            finally:
+                _EVENTS.clear()
+                _GRAPHS.clear()
+        else:
+            chunksize = max(1, len(expanded) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared.spec, labels)) as pool:
+                results = list(pool.map(_run_job, expanded, chunksize=chunksize))
+
+    summaries = {summary["job"]: summary for summary, _ in results}
+    rows = []
+    for job_id, (window, resolution, seed) in enumerate(jobs):
+        start, end = window if window is not None else (None, None)
+        rows.append({"job": job_id, "start": start, "end": end, "resolution": resolution, "seed": seed, **summaries[job_id]})
+    summary = pd.DataFrame(rows)
+    assignments = pd.DataFrame(
+        [row for _, job_rows in results for row in job_rows], columns=["job", "node", "community"]
+    ).sort_values(["job", "community", "node"], kind="stable", ignore_index=True)
+    return summary, assignments
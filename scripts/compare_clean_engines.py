@@ -0,0 +1,115 @@
+import os
+import random
+import sys
+import time
+from dataclasses import fields, replace
+from typing import List
+
+from clean_text import CleanConfig, clean_github_text, clean_github_text_guarded, read_jsonl
+
+# Fragments that exercise every rule (and the interactions between them) in clean_github_text
+FRAGMENTS = [
+    "the", "model", "fails", "when", "loading", "weights", "Thanks!", "same issue here", "+1",
+    "\r\n", "\r", "\n", "\n\n\n\n", "\t", "  ", " ", "\x00", "\x07", "\x7f", "\x1b[31m", "\x1b[0m", "\x1b",
+    "\ufffd", "\U0001F600", "\U0001F680\U0001F680", "\u2705", "\u4e2d\u6587", "\u00e9", "\ufb01", "\u2460", "\uff21",
+    "Iteration: 50%|#####     | 5/10 [00:01<00:01]\n", "\niteration:  7|xx|\n", "Iteration:", "\n[PROGRESS]\n",
+    " 45%|####5     | 45/100 [00:10<00:12]", "> quoted reply\n", "\n  >", ">",
+    "<details>", "</details>", "<b>bold</b>", "<", "a < b", "![screenshot](https://user-images.x/1.png)", "![](x)",
+    "[the docs](https://huggingface.co/docs)", "[x]", "](", "```python\nimport torch\n```", "```", "`pip install -e .`",
+    "`", "https://github.com/huggingface/transformers/issues/123", "http://example.com/a?b=c", "WWW.Example.COM",
+    "www.", "://", "@sgugger", "@", "email@host.com", "#123", "huggingface/transformers#4567", "#", "# heading",
+    "deadbeef", "a1b2c3d4e5f6a7b8", "defaced", "0123456", "src/transformers/models/bert/modeling_bert.py",
+    "C:\\Users\\me/file.txt", "/usr/lib/python3.8", "a/b", "/", "--fp16", "--output_dir=/tmp/out", "-v", "-",
+    "v4.2.1", "1.10.0", "3.8", ".", "0.0.0.0", "_", "__init__", "x" * 40,
+]
+
+
+def random_text(rng: random.Random, max_fragments: int = 120) -> str:
+    parts = []
+    for _ in range(rng.randint(0, max_fragments)):
+        parts.append(rng.choice(FRAGMENTS))
+        parts.append(rng.choice(["", " ", " ", "\n", ", "]))
+    return "".join(parts)
+
+
+def configs() -> List[CleanConfig]:
+    base = CleanConfig()
+    out = [base, replace(base, drop_if_too_long=0), replace(base, drop_if_too_long=300), replace(base, drop_if_noise_ratio_ge=1.5)]
+    for f in fields(CleanConfig):
+        if f.type is bool or f.type == "bool":
+            out.append(replace(base, **{f.name: not getattr(base, f.name)}))
+    return out
+
+
+def compare(texts: List[str], cfgs: List[CleanConfig]) -> int:
+    mismatches = 0
+    for cfg in cfgs:
+        for text in texts:
+            expected = clean_github_text(text, cfg)
+            actual = clean_github_text_guarded(text, cfg)
+            if expected != actual:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"MISMATCH for {cfg}:\n  input:    {text!r}\n  expected: {expected!r}\n  actual:   {actual!r}")
+    return mismatches
+
+
+def benchmark(texts: List[str], cfg: CleanConfig, repeats: int = 3) -> dict:
+    timings = {}
+    for name, clean in [("reference", clean_github_text), ("guarded", clean_github_text_guarded)]:
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for text in texts:
+                clean(text, cfg)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+    timings["speedup"] = timings["reference"] / timings["guarded"]
+    return timings
+
+
+def main(texts_path: str = "data/processed/texts_only_with_ids.jsonl", n_random: int = 3000, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    texts = [random_text(rng) for _ in range(n_random)]
+    texts += [None, "", "    ", "abcd", "hello world"]
+
+    real = []
+    if os.path.exists(texts_path):
+        real = [row["text"] for row in read_jsonl(texts_path)]
+        texts += real
+        print(f"Loaded {len(real)} real texts from {texts_path}")
+
+    cfgs = configs()
+    mismatches = compare(texts, cfgs)
+    print(f"Differential check: {len(texts)} texts x {len(cfgs)} configs, mismatches={mismatches}")
+
+    cfg = CleanConfig()
+    long_sets = {"fuzz (every rule fires)": []}
+    while len(long_sets["fuzz (every rule fires)"]) < 200:
+        text = random_text(rng, max_fragments=4000)
+        if len(text) >= 5000:
+            long_sets["fuzz (every rule fires)"].append(text[: cfg.drop_if_too_long])
+    real = [t for t in real if t]
+    if real:
+        # Long threads are mostly made of ordinary comments, so long bodies are stitched together from real ones
+        stitched = [t for t in real if len(t) >= 5000]
+        while len(stitched) < 200:
+            parts = []
+            while sum(map(len, parts)) < cfg.drop_if_too_long:
+                parts.append(rng.choice(real))
+            stitched.append("\n\n".join(parts)[: cfg.drop_if_too_long])
+        long_sets["real comments"] = stitched
+
+    for label, long_texts in long_sets.items():
+        timings = benchmark(long_texts, cfg)
+        print(
+            f"Long bodies, {label} ({len(long_texts)} texts, >=5000 chars): reference={timings['reference']:.3f}s "
+            f"guarded={timings['guarded']:.3f}s speedup={timings['speedup']:.2f}x"
+        )
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
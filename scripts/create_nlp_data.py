@@ -1,4 +1,12 @@
+import heapq
 import json
+import os
+import sys
+import tempfile
+from typing import Callable, Iterator, Optional
+
+import profiling
+from record_table import RecordTable, parse_id
 
 def main(node_data: dict[str, dict], text_data: list[dict]) -> dict[str, dict]:
     cleaned_ids = {item.get("id") for item in text_data if item.get("id")}
@@ -13,20 +21,181 @@ def main(node_data: dict[str, dict], text_data: list[dict]) -> dict[str, dict]:
 
     return node_data
 
-if __name__ == "__main__":
-    node_data = {}
-    with open("data/processed/flat_nlp_data.jsonl", "r") as f:
-        for line in f:
-            node_data.update(json.loads(line))
+def main_files(
+    flat_path: str = "data/processed/flat_nlp_data.jsonl",
+    cleaned_path: str = "data/processed/texts_only_with_ids_cleaned.jsonl",
+    out_path: str = "data/processed/final_nlp_data.jsonl",
+) -> None:
+    with profiling.stage("create_nlp_data", [flat_path, cleaned_path], [out_path]) as record:
+        # Flat records go into a RecordTable (interned columns, one text buffer) instead of a dict of dicts
+        table = RecordTable.from_jsonl(flat_path)
+
+        cleaned_texts = {}
+        with open(cleaned_path, "r") as f:
+            for line in f:
+                item = json.loads(line)
+                if item.get("id"):
+                    cleaned_texts[item["id"]] = item.get("text")
+
+        # Same rows, order and last-wins flat record and cleaned text as main()
+        rows_out = 0
+        with open(out_path, "w", encoding="utf-8") as f:
+            for i in table.rows():
+                key = table.key(i)
+                if key in cleaned_texts:
+                    row = table.record(i)
+                    row["text"] = cleaned_texts[key]
+                    f.write(json.dumps({key: row}, ensure_ascii=False) + "\n")
+                    rows_out += 1
+        record.rows_in = len(table)
+        record.rows_out = rows_out
+
+# Streaming join ---------------------------------------------------------------
+
+Keyed = tuple[tuple, str]
+
+LINE_OVERHEAD = 120  # rough per-line bytes of a str plus its key tuple in a sort buffer
+
+def flat_key(line: str) -> Optional[str]:
+    # flat lines are {"<id>": {...}}; add_id keys never need escaping
+    return line[2:line.index('"', 2)]
+
+def cleaned_key(line: str) -> Optional[str]:
+    if line.startswith('{"id": "'):
+        return line[8:line.index('"', 8)]
+    return json.loads(line).get("id")
 
-    text_data = []
-    with open("data/processed/texts_only_with_ids_cleaned.jsonl", "r") as f:
+def id_order(key: str) -> tuple:
+    """
+    Sort key for add_id ids: issue, then the issue before its comments. Other ids sort after all of them.
+    """
+    try:
+        return (0, *parse_id(key), "")
+    except ValueError:
+        return (1, 0, 0, key)
+
+def keyed_lines(path: str, key_of: Callable[[str], Optional[str]]) -> Iterator[Keyed]:
+    """
+    (id_order(id), line) for every line with an id, in file order.
+    """
+    with open(path, "r", encoding="utf-8") as f:
         for line in f:
-            text_data.append(json.loads(line))
+            if not line.strip():
+                continue
+            key = key_of(line)
+            if key:
+                yield id_order(key), line if line.endswith("\n") else line + "\n"
+
+def is_sorted(path: str, key_of: Callable[[str], Optional[str]]) -> bool:
+    previous = None
+    for key, _ in keyed_lines(path, key_of):
+        if previous is not None and key < previous:
+            return False
+        previous = key
+    return True
+
+def _write_run(buffer: list[Keyed], tmp_dir: str, index: int) -> str:
+    buffer.sort(key=lambda item: item[0])
+    path = os.path.join(tmp_dir, f"run-{index:05d}.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(line for _, line in buffer)
+    return path
+
+def external_sort(
+    path: str,
+    key_of: Callable[[str], Optional[str]],
+    tmp_dir: str,
+    memory_bytes: int,
+) -> Iterator[Keyed]:
+    """
+    Lines of path in id_order, sorting runs of at most memory_bytes and merging them.
+    Ties keep file order, so a repeated id still resolves to its last line.
+    """
+    runs = []
+    buffer: list[Keyed] = []
+    used = 0
+    for item in keyed_lines(path, key_of):
+        buffer.append(item)
+        used += len(item[1]) + LINE_OVERHEAD
+        if used >= memory_bytes:
+            runs.append(_write_run(buffer, tmp_dir, len(runs)))
+            buffer, used = [], 0
+
+    if not runs:
+        buffer.sort(key=lambda item: item[0])
+        yield from buffer
+        return
+    if buffer:
+        runs.append(_write_run(buffer, tmp_dir, len(runs)))
+    del buffer
+    print(f"Sorted {path} in {len(runs)} runs")
+    # heapq.merge is stable across its inputs, which are in file order
+    yield from heapq.merge(*(keyed_lines(run, key_of) for run in runs), key=lambda item: item[0])
 
-    data = main(node_data, text_data)
+def merge_join(flat: Iterator[Keyed], cleaned: Iterator[Keyed]) -> Iterator[tuple[str, dict]]:
+    """
+    Flat rows that have a cleaned text, with that text, from two id-ordered streams. As in main(), a
+    repeated id takes the last flat row and the last cleaned text.
+    """
+    cleaned_item = next(cleaned, None)
+    flat_item = next(flat, None)
+    while flat_item is not None:
+        key, line = flat_item
+        # Last flat line of this id
+        flat_item = next(flat, None)
+        while flat_item is not None and flat_item[0] == key:
+            line = flat_item[1]
+            flat_item = next(flat, None)
 
-    with open("data/processed/final_nlp_data.jsonl", "w", encoding="utf-8") as f:
-        for key, row in data.items():
-            entry = {key: row}
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        while cleaned_item is not None and cleaned_item[0] < key:
+            cleaned_item = next(cleaned, None)
+        text_line = None
+        while cleaned_item is not None and cleaned_item[0] == key:
+            text_line = cleaned_item[1]
+            cleaned_item = next(cleaned, None)
+
+        if text_line is not None:
+            ((item_id, row),) = json.loads(line).items()
+            row["text"] = json.loads(text_line).get("text")
+            yield item_id, row
+
+def main_stream(
+    flat_path: str = "data/processed/flat_nlp_data.jsonl",
+    cleaned_path: str = "data/processed/texts_only_with_ids_cleaned.jsonl",
+    out_path: str = "data/processed/final_nlp_data.jsonl",
+    memory_mb: int = 256,
+) -> int:
+    """
+    Out-of-core create_nlp_data: one merge pass over both inputs in id order. Inputs the pipeline wrote in
+    id order are streamed as they are; otherwise each is externally sorted, with the sort buffers sharing
+    memory_mb. Output rows are in id order, which is flat file order for pipeline output.
+    """
+    memory_bytes = memory_mb * 2**20 // 2
+    count = 0
+    with profiling.stage("create_nlp_data", [flat_path, cleaned_path], [out_path]) as record, \
+            tempfile.TemporaryDirectory(dir=os.path.dirname(out_path) or ".") as tmp_dir:
+        streams = []
+        for path, key_of, name in ((flat_path, flat_key, "flat"), (cleaned_path, cleaned_key, "cleaned")):
+            if is_sorted(path, key_of):
+                streams.append(keyed_lines(path, key_of))
+            else:
+                os.makedirs(os.path.join(tmp_dir, name))
+                streams.append(external_sort(path, key_of, os.path.join(tmp_dir, name), memory_bytes))
+
+        with open(out_path + ".tmp", "w", encoding="utf-8") as f:
+            for key, row in merge_join(*streams):
+                f.write(json.dumps({key: row}, ensure_ascii=False) + "\n")
+                count += 1
+        os.replace(out_path + ".tmp", out_path)
+        record.rows_out = count
+    return count
+
+if __name__ == "__main__":
+    memory_mb = 256
+    for arg in sys.argv[1:]:
+        if arg.startswith("--memory-mb="):
+            memory_mb = int(arg.split("=", 1)[1])
+    if "--stream" in sys.argv:
+        print(f"Wrote {main_stream(memory_mb=memory_mb)} rows")
+    else:
+        main_files()
@@ -2,8 +2,24 @@ import requests
 import time
 import json
 import time
+import calendar
 import dotenv
 import os
+from typing import Optional
+
+import profiling
+
+def wait_for_rate_limit(rate_limit: dict, minimum: int = 100) -> None:
+    remaining = int(rate_limit["remaining"])
+    reset_at = rate_limit["resetAt"]
+
+    if remaining < minimum:
+        # resetAt is UTC, so timegm rather than mktime (which assumes local time)
+        reset_timestamp = calendar.timegm(time.strptime(reset_at, "%Y-%m-%dT%H:%M:%SZ"))
+        current_timestamp = time.time()
+        sleep_time = max(0, reset_timestamp - current_timestamp + 5)
+        print(f"Rate limit nearly exceeded. Sleeping for {sleep_time} seconds, until {reset_at}.")
+        time.sleep(sleep_time)
 
 def check_rate_limit(session: requests.Session, github_url: str) -> None:
     query = """
@@ -25,70 +41,99 @@ def check_rate_limit(session: requests.Session, github_url: str) -> None:
         if "errors" in j:
             raise Exception(f"Query failed to run with errors: {j['errors']}")
 
-        rate_limit = j["data"]["rateLimit"]
-        remaining = int(rate_limit["remaining"])
-        reset_at = rate_limit["resetAt"]
-
-        if remaining < 100:
-            reset_time = time.strptime(reset_at, "%Y-%m-%dT%H:%M:%SZ")
-            reset_timestamp = time.mktime(reset_time)
-            current_timestamp = time.time()
-            sleep_time = reset_timestamp - current_timestamp + 5  
-            print(f"Rate limit nearly exceeded. Sleeping for {sleep_time} seconds, until {reset_at}.")
-            time.sleep(sleep_time)
+        wait_for_rate_limit(j["data"]["rateLimit"])
     else:
         raise Exception(
             f"Query failed to run by returning code of {response.status_code}. {query}"
         )
 
 def main(session: requests.Session, github_url: str, max_nodes: int) -> None:
-    all_nodes = fetch_issues_paginated(session, github_url, max_nodes=max_nodes)
+    out_path = "data/raw/issues_data_10k.json"
+    with profiling.stage("datascrape", outputs=[out_path]) as record:
+        all_nodes = fetch_issues_paginated(session, github_url, max_nodes=max_nodes)
+        try:
+            fetch_remaining_comments(session, github_url, all_nodes)
+        except IncompleteCommentsError as e:
+            # Keep the issues; the incomplete threads still say hasNextPage, so they are not passed off as complete
+            print(e)
+
+        # "w" rather than "a": appending a second array would leave the file as invalid JSON
+        with open(out_path, "w") as f:
+            json.dump(all_nodes, f, indent=2)
+        record.rows_out = len(all_nodes)
+
+# node_id/updatedAt are aliased/extra fields used for incremental sync; "id" is left for add_id
+COMMENT_FIELDS = """
+        node_id: id
+        bodyText
+        createdAt
+        author { ... on User { login location } }
+"""
+
+ISSUE_FIELDS = """
+    node_id: id
+    title
+    bodyText
+    createdAt
+    updatedAt
 
-    with open("data/raw/issues_data_10k.json", "a") as f:
-        json.dump(all_nodes, f, indent=2)
+    labels(first: 5) {
+      nodes {
+        name
+      }
+    }
+
+    author { ... on User { login location } }
+
+    comments(first: 25) {
+      nodes {
+        %s
+      }
+      pageInfo {
+        endCursor
+        hasNextPage
+      }
+    }
+""" % COMMENT_FIELDS
 
-def fetch_issues_paginated(session: requests.Session, github_url: str, max_nodes: int=10000) -> list:
+ISSUES_QUERY = """
+query($owner: String!, $name: String!, $cursor: String, $since: DateTime, $orderBy: IssueOrder) {
+  repository(owner: $owner, name: $name) {
+    issues(first: 100, after: $cursor, filterBy: {since: $since}, orderBy: $orderBy) {
+      nodes {
+        %s
+      }
+      pageInfo {
+        endCursor
+        hasNextPage
+      }
+    }
+  }
+}
+""" % ISSUE_FIELDS
+
+def fetch_issues_paginated(
+    session: requests.Session,
+    github_url: str,
+    max_nodes: int=10000,
+    owner: str = "huggingface",
+    name: str = "transformers",
+    since: Optional[str] = None,
+) -> list:
+    """
+    With `since`, only issues updated at or after that time are fetched, oldest update first,
+    so the last node's updatedAt is a valid high-water mark even if the run stops early.
+    """
     nodes = []
     rate_counter = 0
     cursor = None
+    order_by = {"field": "UPDATED_AT" if since else "CREATED_AT", "direction": "ASC"}
     
     while len(nodes) < max_nodes:
-        query = """
-        {
-          repository(owner: "huggingface", name: "transformers") {
-            issues(first: 100, after: %s) {
-              nodes {
-                title
-                bodyText
-                createdAt
-
-                labels(first: 5) {
-                  nodes {
-                    name
-                  }
-                }
-
-                author { ... on User { login location } }
-
-                comments(first: 25) {
-                  nodes {
-                    bodyText
-                    createdAt
-                    author { ... on User { login location } }
-                  }
-                }
-              }
-              pageInfo {
-                endCursor
-                hasNextPage
-              }
-            }
-          }
-        }
-        """ % (f'"{cursor}"' if cursor else "null")
+        variables = {"owner": owner, "name": name, "cursor": cursor, "since": since, "orderBy": order_by}
         
         try:
-            response = session.post(github_url, json={"query": query})
+            response = session.post(github_url, json={"query": ISSUES_QUERY, "variables": variables})
         except (requests.exceptions.RequestException) as e:
             print(f"Request error: {e}. Retrying in 10 seconds...")
             time.sleep(10)
@@ -129,6 +174,126 @@ def fetch_issues_paginated(session: requests.Session, github_url: str, max_nodes
     
     return nodes[:max_nodes]
 
+def build_comments_query(count: int) -> str:
+    """
+    One request that continues the comment pagination of `count` issues, each looked up by node id under its own alias.
+    """
+    params = ", ".join(f"$id{i}: ID!, $after{i}: String" for i in range(count))
+    lookups = "\n".join(
+        f"""
+  i{i}: node(id: $id{i}) {{
+    ... on Issue {{
+      comments(first: 100, after: $after{i}) {{
+        nodes {{
+          {COMMENT_FIELDS}
+        }}
+        pageInfo {{
+          endCursor
+          hasNextPage
+        }}
+      }}
+    }}
+  }}"""
+        for i in range(count)
+    )
+    return f"query({params}) {{\n  rateLimit {{ cost remaining resetAt }}{lookups}\n}}"
+
+class IncompleteCommentsError(Exception):
+    """
+    The follow-up phase stopped on a GraphQL error. The issues in node_ids still have comments to fetch; their
+    comments.pageInfo is left as it was (hasNextPage true), so a later run continues from where this one stopped.
+    """
+
+    def __init__(self, errors: list, node_ids: list, added: int):
+        super().__init__(f"GraphQL errors: {errors}; comments of {len(node_ids)} issues left incomplete: {node_ids}")
+        self.errors = errors
+        self.node_ids = node_ids
+        self.added = added
+
+def fetch_remaining_comments(session: requests.Session, github_url: str, issues: list, batch_size: int = 20) -> int:
+    """
+    Follow-up phase for issues whose comments did not fit in the first page: their remaining comments are
+    fetched in batches of `batch_size` issues per request. Issues are extended in place; returns the number
+    of comments added.
+    """
+    pending = [
+        issue for issue in issues
+        if issue and issue.get("node_id") and (issue.get("comments") or {}).get("pageInfo", {}).get("hasNextPage")
+    ]
+    print(f"{len(pending)} issues have more comments to fetch")
+    added = 0
+
+    while pending:
+        batch = pending[:batch_size]
+        variables = {}
+        for i, issue in enumerate(batch):
+            variables[f"id{i}"] = issue["node_id"]
+            variables[f"after{i}"] = issue["comments"]["pageInfo"]["endCursor"]
+
+        try:
+            response = session.post(github_url, json={"query": build_comments_query(len(batch)), "variables": variables})
+        except (requests.exceptions.RequestException) as e:
+            print(f"Request error: {e}. Retrying in 10 seconds...")
+            time.sleep(10)
+            continue
+
+        if response.status_code != 200:
+            print(f"Error: Received status code {response.status_code}. Retrying in 10 seconds...")
+            time.sleep(10)
+            continue
+
+        try:
+            json_response = response.json()
+        except json.JSONDecodeError:
+            print("Error: Invalid JSON response. Retrying in 10 seconds...")
+            time.sleep(10)
+            continue
+
+        if "errors" in json_response and not json_response.get("data"):
+            raise IncompleteCommentsError(json_response["errors"], [issue["node_id"] for issue in pending], added)
+
+        data = json_response["data"]
+        # Partial data: errors name the alias they belong to in their path
+        alias_errors = {e["path"][0]: e for e in json_response.get("errors", []) if e.get("path")}
+        finished = set()
+        failed, failed_errors = [], []
+        for i, issue in enumerate(batch):
+            node = data.get(f"i{i}")
+            if not node:
+                error = alias_errors.get(f"i{i}")
+                if error and error.get("type") == "NOT_FOUND":
+                    # Deleted issue: keep what we have
+                    finished.add(id(issue))
+                else:
+                    failed.append(issue)
+                    failed_errors.append(error)
+                continue
+            if "comments" not in node:
+                # The id is no longer an issue (e.g. converted to a discussion): keep what we have
+                finished.add(id(issue))
+                continue
+            comments = node["comments"]
+            issue["comments"]["nodes"].extend(comments["nodes"])
+            issue["comments"]["pageInfo"] = comments["pageInfo"]
+            added += len(comments["nodes"])
+            if not comments["pageInfo"]["hasNextPage"]:
+                finished.add(id(issue))
+
+        # Issues with yet more pages go to the back of the queue
+        pending = pending[batch_size:] + [issue for issue in batch if id(issue) not in finished]
+        if failed:
+            # The failed threads are in pending too; they are listed first
+            failed_ids = {id(issue) for issue in failed}
+            node_ids = [issue["node_id"] for issue in failed] + [i["node_id"] for i in pending if id(i) not in failed_ids]
+            raise IncompleteCommentsError(failed_errors, node_ids, added)
+        print(f"Fetched {added} extra comments. {len(pending)} issues remaining")
+
+        if data.get("rateLimit"):
+            wait_for_rate_limit(data["rateLimit"])
+        time.sleep(1)
+
+    return added
+
 
 if __name__ == "__main__":
     dotenv.load_dotenv()
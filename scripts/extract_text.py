@@ -1,4 +1,9 @@
 import json
+import sys
+from typing import Iterable, Iterator
+
+import profiling
+from json_stream import read_issues
 
 def get_text_from_nodes(issue: dict) -> str:
     titles = []
@@ -19,6 +24,29 @@ def get_text_from_nodes(issue: dict) -> str:
     
     return (titles, texts, ids)
 
+def stream(node_data: Iterable[dict]) -> Iterator[tuple[list[str], list[dict]]]:
+    for issue in node_data:
+        title, text, id_list = get_text_from_nodes(issue)
+        titles = [title_string for title_string in title if title_string.strip() != ""]
+        texts = [{"id": id, "text": comment} for comment, id in zip(text, id_list) if comment.strip() != ""]
+        yield titles, texts
+
+def main_stream(
+    in_path: str = "data/processed/issues_data_10k_processed_id.jsonl",
+    titles_path: str = "data/processed/titles_only.jsonl",
+    texts_path: str = "data/processed/texts_only_with_ids.jsonl",
+) -> None:
+    with profiling.stage("extract_text", [in_path], [titles_path, texts_path]) as record, \
+            open(titles_path, 'w') as titles_f, open(texts_path, 'w') as texts_f:
+        rows_out = 0
+        for titles, texts in stream(profiling.counted(read_issues(in_path), record)):
+            for title in titles:
+                titles_f.write(json.dumps(title) + "\n")
+            for text in texts:
+                texts_f.write(json.dumps(text) + "\n")
+            rows_out += len(texts)
+        record.rows_out = rows_out
+
 def main(node_data: list) -> None:
     titles = []
     texts = []
@@ -45,7 +73,10 @@ def main(node_data: list) -> None:
             f.write(json.dumps(text) + "\n")
 
 if __name__ == "__main__":
-    with open("data/processed/issues_data_10k_processed_id.json", "r") as f:
-        node_data = json.load(f)
+    if "--stream" in sys.argv:
+        main_stream()
+    else:
+        with open("data/processed/issues_data_10k_processed_id.json", "r") as f:
+            node_data = json.load(f)
 
-    main(node_data)
\ No newline at end of file
+        main(node_data)
@@ -0,0 +1,29 @@
+import hashlib
+import os
+from typing import Optional
+
+
+def sha256_file(path: str) -> str:
+    """
+    Content hash of a file, read in 1 MiB blocks. A missing file raises FileNotFoundError naming it.
+    """
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"No such file: {path}")
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_fingerprint(path: str, previous: Optional[dict] = None) -> Optional[dict]:
+    """
+    Size/mtime are checked first so unchanged files are never re-hashed; the content hash decides otherwise.
+    None if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    if previous and previous.get("size") == st.st_size and previous.get("mtime_ns") == st.st_mtime_ns:
+        return previous
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256_file(path)}
@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import re
+import sys
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+SENTIMENT_MODEL = "cardiffnlp/twitter-roberta-base-sentiment-latest"
+EMOTION_MODEL = "j-hartmann/emotion-english-distilroberta-base"
+
+# Output column prefix per model, as in nlp.ipynb
+COLUMNS = {SENTIMENT_MODEL: "sentiment", EMOTION_MODEL: "emotion"}
+
+
+class Backend(ABC):
+    """
+    A classifier the engine can drive. Tokenization is separate from prediction so texts are tokenized once
+    per tokenizer (backends with the same tokenizer_key share it) and batches can be formed by token length.
+    """
+
+    model_id: str
+    tokenizer_key: str
+    max_length: int = 512
+
+    @abstractmethod
+    def tokenize(self, texts: Sequence[str]) -> list[list[int]]:
+        """
+        Token ids per text, truncated to max_length and not padded.
+        """
+
+    @abstractmethod
+    def predict(self, batch: Sequence[list[int]]) -> list[dict]:
+        """
+        {"label": ..., "score": ...} per sequence; the backend pads the batch itself.
+        """
+
+
+class HFBackend(Backend):
+    """
+    transformers sequence classifier on CPU, equivalent to pipeline(...)(texts, truncation=True, max_length=512).
+    transformers and torch are imported on first use so the rest of the module works without them.
+    """
+
+    def __init__(self, model_id: str, max_length: int = 512, num_threads: Optional[int] = None):
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.torch = torch
+        self.model_id = model_id
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_id).eval()
+        self.id2label = self.model.config.id2label
+
+        # Models fine-tuned from the same base share a vocabulary; their tokenization is reused
+        vocab = json.dumps(sorted(self.tokenizer.get_vocab().items()), ensure_ascii=False)
+        self.tokenizer_key = hashlib.sha256(
+            f"{type(self.tokenizer).__name__}\x00{max_length}\x00{vocab}".encode("utf-8")
+        ).hexdigest()
+
+    def tokenize(self, texts: Sequence[str]) -> list[list[int]]:
+        encoded = self.tokenizer(list(texts), truncation=True, max_length=self.max_length, padding=False)
+        return encoded["input_ids"]
+
+    def predict(self, batch: Sequence[list[int]]) -> list[dict]:
+        inputs = self.tokenizer.pad({"input_ids": list(batch)}, return_tensors="pt")
+        with self.torch.inference_mode():
+            logits = self.model(**inputs).logits
+        probs = self.torch.softmax(logits.float(), dim=-1)
+        scores, labels = probs.max(dim=-1)
+        return [
+            {"label": self.id2label[int(label)], "score": float(score)}
+            for label, score in zip(labels.tolist(), scores.tolist())
+        ]
+
+
+WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class LexiconBackend(Backend):
+    """
+    Tiny deterministic classifier (word-list scoring over a hashed vocabulary) for exercising the engine
+    without downloading a model.
+    """
+
+    POSITIVE = {"thanks", "thank", "great", "works", "good", "awesome", "love", "fixed", "nice", "helpful"}
+    NEGATIVE = {"error", "fails", "bug", "broken", "crash", "wrong", "issue", "problem", "slow", "cannot"}
+
+    def __init__(self, model_id: str = "lexicon", max_length: int = 512, vocab_size: int = 1 << 16):
+        self.model_id = model_id
+        self.max_length = max_length
+        self.vocab_size = vocab_size
+        self.tokenizer_key = f"lexicon-{vocab_size}-{max_length}"
+        self.positive_ids = {self._id(w) for w in self.POSITIVE}
+        self.negative_ids = {self._id(w) for w in self.NEGATIVE}
+
+    def _id(self, word: str) -> int:
+        return int.from_bytes(hashlib.blake2b(word.lower().encode("utf-8"), digest_size=4).digest(), "little") % self.vocab_size + 1
+
+    def tokenize(self, texts: Sequence[str]) -> list[list[int]]:
+        return [[self._id(w) for w in WORD_RE.findall(text)][: self.max_length] for text in texts]
+
+    def predict(self, batch: Sequence[list[int]]) -> list[dict]:
+        width = max((len(ids) for ids in batch), default=0)
+        padded = np.zeros((len(batch), width), dtype=np.int64)
+        for row, ids in enumerate(batch):
+            padded[row, : len(ids)] = ids
+        positive = np.isin(padded, list(self.positive_ids)).sum(axis=1)
+        negative = np.isin(padded, list(self.negative_ids)).sum(axis=1)
+        logits = np.stack([negative, np.zeros_like(negative) + 0.5, positive], axis=1).astype(np.float64)
+        probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probs /= probs.sum(axis=1, keepdims=True)
+        labels = np.array(["negative", "neutral", "positive"])
+        return [{"label": str(labels[i]), "score": float(p[i])} for p, i in zip(probs, probs.argmax(axis=1))]
+
+
+def length_batches(lengths: Sequence[int], token_budget: int = 8192, max_batch_size: int = 64) -> list[np.ndarray]:
+    """
+    Indices grouped longest first so each batch holds sequences of similar length, sized so that
+    (batch size x longest sequence) stays within token_budget: short texts get large batches, long ones small.
+    """
+    order = np.argsort(-np.asarray(lengths, dtype=np.int64), kind="stable")
+    batches = []
+    start = 0
+    while start < len(order):
+        width = max(int(lengths[order[start]]), 1)  # longest in the batch, since sorted
+        size = max(1, min(max_batch_size, token_budget // width))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+
+def padding_stats(lengths: Sequence[int], batches: Iterable[np.ndarray]) -> dict:
+    lengths = np.asarray(lengths)
+    real = int(lengths.sum())
+    padded = sum(int(lengths[b].max()) * len(b) for b in batches if len(b))
+    return {"tokens": real, "padded_tokens": padded, "padding_ratio": (padded - real) / padded if padded else 0.0}
+
+
+def score_texts(
+    texts: Sequence[str],
+    backends: Sequence[Backend],
+    token_budget: int = 8192,
+    max_batch_size: int = 64,
+    concurrency: int = 1,
+) -> dict[str, list[dict]]:
+    """
+    Scores every text with every backend; returns {model_id: [{"label", "score"}, ...]} in input order.
+
+    Identical texts are scored once. Texts are tokenized once per tokenizer, then batched by token length
+    (see length_batches). With concurrency > 1, batches run on a thread pool; torch releases the GIL in its
+    kernels, so this helps when intra-op threads alone do not fill the cores. A missing text (None or NaN) is
+    scored as the empty string.
+    """
+    texts = [text if isinstance(text, str) else "" for text in texts]
+    unique = list(dict.fromkeys(texts))
+    position = {text: i for i, text in enumerate(unique)}
+    results: dict[str, list[dict]] = {}
+
+    groups: dict[str, list[Backend]] = {}
+    for backend in backends:
+        groups.setdefault(backend.tokenizer_key, []).append(backend)
+
+    for group in groups.values():
+        token_ids = group[0].tokenize(unique)
+        lengths = [len(ids) for ids in token_ids]
+        batches = length_batches(lengths, token_budget, max_batch_size)
+        stats = padding_stats(lengths, batches)
+        print(
+            f"Tokenized {len(unique)} unique texts once for {[b.model_id for b in group]}: {len(batches)} batches, "
+            f"padding {stats['padding_ratio']:.1%} of {stats['padded_tokens']} tokens"
+        )
+
+        for backend in group:
+            scored: list[Optional[dict]] = [None] * len(unique)
+
+            def run(batch: np.ndarray) -> tuple[np.ndarray, list[dict]]:
+                return batch, backend.predict([token_ids[i] for i in batch])
+
+            if concurrency > 1:
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    outputs = list(pool.map(run, batches))
+            else:
+                outputs = map(run, batches)
+            for batch, predictions in outputs:
+                for i, prediction in zip(batch, predictions):
+                    scored[i] = prediction
+
+            results[backend.model_id] = [scored[position[text]] for text in texts]
+
+    return results
+
+
+def score_frame(df: pd.DataFrame, backends: Sequence[Backend], text_col: str = "text", **kwargs) -> pd.DataFrame:
+    """
+    Adds <prefix>_label / <prefix>_score columns per backend, as nlp.ipynb does for sentiment and emotion.
+    """
+    results = score_texts(df[text_col].tolist(), backends, **kwargs)
+    for backend in backends:
+        prefix = COLUMNS.get(backend.model_id, backend.model_id)
+        df[f"{prefix}_label"] = [o["label"] for o in results[backend.model_id]]
+        df[f"{prefix}_score"] = [o["score"] for o in results[backend.model_id]]
+    return df
+
+
+def load_final_frame(path: str = "data/processed/final_nlp_data.jsonl") -> pd.DataFrame:
+    node_data = {}
+    with open(path, "r") as f:
+        for line in f:
+            node_data.update(json.loads(line))
+    return pd.DataFrame.from_dict(node_data, orient="index")
+
+
+def main(
+    in_path: str = "data/processed/final_nlp_data.jsonl",
+    out_path: str = "data/processed/nlp_sentiment_analysis_with_emotion.csv",
+    num_threads: Optional[int] = None,
+    concurrency: int = 1,
+    token_budget: int = 8192,
+) -> None:
+    df = load_final_frame(in_path)
+    backends = [HFBackend(model_id, num_threads=num_threads) for model_id in (SENTIMENT_MODEL, EMOTION_MODEL)]
+    score_frame(df, backends, token_budget=token_budget, concurrency=concurrency)
+    df.to_csv(out_path)
+    print(f"Scored {len(df)} texts. Output: {out_path}")
+
+
+if __name__ == "__main__":
+    num_threads = None
+    concurrency = 1
+    token_budget = 8192
+    for arg in sys.argv[1:]:
+        if arg.startswith("--threads="):
+            num_threads = int(arg.split("=", 1)[1])
+        elif arg.startswith("--concurrency="):
+            concurrency = int(arg.split("=", 1)[1])
+        elif arg.startswith("--token-budget="):
+            token_budget = int(arg.split("=", 1)[1])
+    main(num_threads=num_threads or os.cpu_count(), concurrency=concurrency, token_budget=token_budget)
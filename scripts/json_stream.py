@@ -0,0 +1,119 @@
+import json
+import textwrap
+from typing import Iterable, Iterator
+
+_WHITESPACE = " \t\r\n"
+
+
+def iter_json_array(path: str, chunk_size: int = 1 << 16, max_element_size: int = 1 << 28) -> Iterator[dict]:
+    """
+    Yields the elements of a top-level JSON array one at a time without loading the whole file.
+    Back-to-back arrays (e.g. "[...][...]" left behind by append-mode dumps) are read as one stream.
+    An element that still does not decode once max_element_size characters of it are buffered is taken
+    to be malformed and raises ValueError.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    in_array = False
+    eof = False
+
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+
+            if pos >= len(buf):
+                if eof:
+                    break
+                chunk = f.read(chunk_size)
+                buf = buf[pos:] + chunk
+                pos = 0
+                eof = not chunk
+                continue
+
+            ch = buf[pos]
+            if not in_array:
+                if ch != "[":
+                    raise ValueError(f"Expected '[' at top level of {path}, found {ch!r}")
+                in_array = True
+                pos += 1
+            elif ch == "]":
+                in_array = False
+                pos += 1
+            elif ch == ",":
+                pos += 1
+            else:
+                try:
+                    obj, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    pending = len(buf) - pos
+                    if pending >= max_element_size:
+                        raise ValueError(
+                            f"JSON element in {path} does not decode after {pending} characters; "
+                            f"malformed, or larger than max_element_size={max_element_size}"
+                        )
+                    # Element is split across chunks: at least double what is buffered of it, so a large
+                    # element is decoded O(log size) times rather than once per chunk
+                    chunk = f.read(max(chunk_size, pending))
+                    buf = buf[pos:] + chunk
+                    pos = 0
+                    eof = not chunk
+                    continue
+                yield obj
+                pos = end
+                if pos > chunk_size:
+                    buf = buf[pos:]
+                    pos = 0
+
+    if in_array:
+        raise ValueError(f"Unterminated JSON array in {path}")
+
+
+def iter_jsonl(path: str) -> Iterator[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            yield json.loads(line)
+
+
+def read_issues(path: str) -> Iterator[dict]:
+    """
+    Streams issues from either a JSON array dump or a one-issue-per-line JSONL file.
+    """
+    if path.endswith(".jsonl"):
+        return iter_jsonl(path)
+    return iter_json_array(path)
+
+
+def write_json_array(path: str, items: Iterable, indent: int = 2) -> int:
+    """
+    Writes items as a JSON array one element at a time; output matches json.dump(list(items), f, indent=indent).
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for item in items:
+            f.write("[\n" if count == 0 else ",\n")
+            f.write(textwrap.indent(json.dumps(item, indent=indent), " " * indent))
+            count += 1
+        f.write("\n]" if count else "[]")
+    return count
+
+
+def write_jsonl(path: str, items: Iterable) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def write_issues(path: str, issues: Iterable[dict]) -> int:
+    if path.endswith(".jsonl"):
+        return write_jsonl(path, issues)
+    return write_json_array(path, issues)
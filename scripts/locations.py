@@ -0,0 +1,338 @@
+import json
+import os
+import re
+import sys
+import unicodedata
+from functools import lru_cache
+from typing import Optional
+
+import pandas as pd
+
+GAZETTEER_PATH = "data/processed/gazetteer.json"
+GAZETTEER_VERSION = "1"
+
+# A city name shared by several countries is only kept when its largest match is this many times bigger
+# than the runner-up ("paris" is FR, "barcelona" is ES); otherwise it stays ambiguous ("cambridge")
+CITY_DOMINANCE = 2
+MIN_ALTERNATE_NAME_LEN = 3
+
+EMOJI_RE = re.compile(
+    "["
+    "\U0001F300-\U0001FAFF"
+    "\U00002600-\U000027BF"
+    "\U0001F1E0-\U0001F1FF"
+    "]+",
+    flags=re.UNICODE
+)
+
+SEP_RE = re.compile(r"[|;/•·]+")
+MULTISPACE_RE = re.compile(r"\s+")
+TRAILING_PUNCT_RE = re.compile(r"^[,\.\-\s]+|[,\.\-\s]+$")
+COMMA_SPLIT_RE = re.compile(r"\s*,\s*")
+
+MISSING_SET = {
+    "", "none", "null", "nan", "n/a", "na", "unknown", "unspecified", "undefined", "-"
+}
+
+# Patterns that usually indicate not-a-location
+NONGEO_PATTERNS = [
+    r"\bremote\b",
+    r"\bearth\b",
+    r"\bmars\b",
+    r"\bmilky way\b",
+    r"\bthe cloud\b",
+    r"\binternet\b",
+    r"\bgithub\b",
+    r"\bonline\b",
+    r"\bhome\b",
+    r"\bbasement\b",
+    r"\bworldwide\b",
+    r"\beverywhere\b",
+    r"\banywhere\b",
+    r"\bunder your bed\b",
+]
+
+NONGEO_RE = re.compile("|".join(NONGEO_PATTERNS), flags=re.IGNORECASE)
+
+COUNTRY_ALIASES = {
+    "uk": "GB", "u.k.": "GB", "united kingdom": "GB", "great britain": "GB", "britain": "GB",
+    "usa": "US", "u.s.a.": "US", "u.s.": "US", "united states": "US", "united states of america": "US",
+    "russia": "RU", "south korea": "KR", "korea": "KR", "north korea": "KP",
+    "iran": "IR", "viet nam": "VN",
+    "taiwan": "TW",
+}
+
+US_STATE_CODES = {
+    "al","ak","az","ar","ca","co","ct","de","fl","ga","hi","ia","id","il","in","ks","ky","la","ma","md",
+    "me","mi","mn","mo","ms","mt","nc","nd","ne","nh","nj","nm","nv","ny","oh","ok","or","pa","ri","sc",
+    "sd","tn","tx","ut","va","vt","wa","wi","wv","wy","dc"
+}
+
+CA_PROV_CODES = {"on","qc","bc","ab","mb","sk","ns","nb","nl","pe","nt","nu","yt"}
+
+US_STATE_NAMES = {
+    "alabama", "alaska", "arizona", "arkansas", "california", "colorado", "connecticut", "delaware",
+    "florida", "georgia", "hawaii", "idaho", "illinois", "indiana", "iowa", "kansas", "kentucky",
+    "louisiana", "maine", "maryland", "massachusetts", "michigan", "minnesota", "mississippi",
+    "missouri", "montana", "nebraska", "nevada", "new hampshire", "new jersey", "new mexico",
+    "new york", "north carolina", "north dakota", "ohio", "oklahoma", "oregon", "pennsylvania",
+    "rhode island", "south carolina", "south dakota", "tennessee", "texas", "utah", "vermont",
+    "virginia", "washington", "west virginia", "wisconsin", "wyoming", "district of columbia"
+}
+
+CA_PROV_NAMES = {
+    "alberta", "british columbia", "manitoba", "new brunswick", "newfoundland and labrador",
+    "nova scotia", "ontario", "prince edward island", "quebec", "saskatchewan",
+    "northwest territories", "nunavut", "yukon"
+}
+
+
+def normalise_text(s: str) -> str:
+    """
+    Normalise Unicode, remove emojis, but keep non-latin script
+    """
+    if s is None or s == "":
+        return ""
+    s = str(s)
+    s = unicodedata.normalize("NFKC", s)
+    s = EMOJI_RE.sub(" ", s)
+    s = SEP_RE.sub(",", s)
+    s = s.replace("\n", " ").replace("\r", " ").replace("\t", " ")
+    s = s.replace('"', "").replace("'", "")
+    s = MULTISPACE_RE.sub(" ", s).strip()
+    s = TRAILING_PUNCT_RE.sub("", s).strip()
+    return s
+
+
+def classify_basic(s: str) -> str:
+    if s is None:
+        return "missing"
+    s = str(s).strip().lower()
+    if s in MISSING_SET:
+        return "missing"
+    if NONGEO_RE.search(s):
+        return "non-geographic"
+    return "candidate"
+
+
+# Gazetteer --------------------------------------------------------------------
+
+def build_gazetteer() -> dict:
+    """
+    Builds the lookup tables once from pycountry and geonamescache:
+    countries (names, official names and aliases), US states / Canadian provinces, and city names
+    (including alternate names) that map to a single country.
+    """
+    import geonamescache
+    import pycountry
+
+    countries = {}
+    for c in pycountry.countries:
+        countries[c.name.lower()] = c.alpha_2
+        if hasattr(c, "official_name"):
+            countries[c.official_name.lower()] = c.alpha_2
+    countries.update(COUNTRY_ALIASES)
+
+    regions = {}
+    for name in US_STATE_CODES | US_STATE_NAMES:
+        regions[name] = "US"
+    for name in CA_PROV_CODES | CA_PROV_NAMES:
+        regions[name] = "CA"
+
+    # name -> {country: largest population with that name}; primary names shadow alternate names,
+    # so "philadelphia" is the US city rather than Amman's historical name
+    primary: dict[str, dict[str, int]] = {}
+    alternate: dict[str, dict[str, int]] = {}
+    for city in geonamescache.GeonamesCache().get_cities().values():
+        names = [(city["name"], primary)]
+        names += [(n, alternate) for n in city["alternatenames"] if len(n) >= MIN_ALTERNATE_NAME_LEN]
+        for name, candidates in names:
+            key = normalise_text(name).lower()
+            if not key:
+                continue
+            by_country = candidates.setdefault(key, {})
+            by_country[city["countrycode"]] = max(by_country.get(city["countrycode"], 0), city["population"])
+
+    cities = {}
+    for name, by_country in {**alternate, **primary}.items():
+        ranked = sorted(by_country.items(), key=lambda kv: kv[1], reverse=True)
+        if len(ranked) == 1 or ranked[0][1] >= CITY_DOMINANCE * max(ranked[1][1], 1):
+            cities[name] = ranked[0][0]
+
+    names = {c.alpha_2: c.name for c in pycountry.countries}
+
+    return {
+        "version": GAZETTEER_VERSION,
+        "sources": {"pycountry": _version("pycountry"), "geonamescache": _version("geonamescache")},
+        "countries": countries,
+        "regions": regions,
+        "cities": cities,
+        "names": names,
+    }
+
+
+def _version(package: str) -> Optional[str]:
+    try:
+        from importlib.metadata import version
+        return version(package)
+    except Exception:
+        return None
+
+
+def save_gazetteer(gazetteer: dict, path: str = GAZETTEER_PATH) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(gazetteer, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def load_gazetteer(path: str = GAZETTEER_PATH, rebuild: bool = False) -> dict:
+    """
+    Loads the serialized index, building (and saving) it first if it is missing or from another version.
+    """
+    if not rebuild and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            gazetteer = json.load(f)
+        if gazetteer.get("version") == GAZETTEER_VERSION:
+            return gazetteer
+
+    print(f"Building gazetteer index at {path}")
+    gazetteer = build_gazetteer()
+    save_gazetteer(gazetteer, path)
+    return gazetteer
+
+
+# Resolution -------------------------------------------------------------------
+
+class LocationResolver:
+    """
+    Maps free-text GitHub locations to ISO alpha-2 country codes.
+    Per-string results are memoized; `overrides` (raw location -> code) take priority over the gazetteer.
+    """
+
+    def __init__(self, gazetteer: dict, overrides: Optional[dict] = None, cache_size: int = 1 << 16):
+        self.countries = gazetteer["countries"]
+        self.regions = gazetteer["regions"]
+        self.cities = gazetteer["cities"]
+        self.names = gazetteer["names"]
+        self.overrides = overrides or {}
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def get(self, raw: Optional[str], default=None) -> Optional[str]:
+        if raw is None:
+            return default
+        code = self.overrides.get(raw)
+        if code is None:
+            code = self.resolve(raw)
+        return code if code is not None else default
+
+    def country_name(self, code: Optional[str]) -> Optional[str]:
+        return self.names.get(code) if code else None
+
+    def _resolve(self, raw: str) -> Optional[str]:
+        s = normalise_text(raw).lower()
+        if classify_basic(s) != "candidate":
+            return None
+        code = self.extract_country_code(s)
+        if code is None:
+            code = self.city_to_country(s)
+        return code
+
+    def infer_country_from_tokens(self, tokens: list[str]) -> Optional[str]:
+        for token in tokens:
+            token = token.strip().lower()
+            if token in self.countries:
+                return self.countries[token]
+            if token in US_STATE_CODES or token in US_STATE_NAMES:
+                return "US"
+            if token in CA_PROV_CODES or token in CA_PROV_NAMES:
+                return "CA"
+        return None
+
+    def extract_country_code(self, s: str) -> Optional[str]:
+        """
+        Country names, then state/province tokens, as in the original location clean-up.
+        """
+        if not s:
+            return None
+        if s in self.countries:
+            return self.countries[s]
+
+        parts = [p.strip() for p in COMMA_SPLIT_RE.split(s) if p.strip()]
+        if not parts:
+            return None
+
+        if parts[-1] in self.countries:
+            return self.countries[parts[-1]]
+        for p in parts:
+            if p in self.countries:
+                return self.countries[p]
+
+        tokens = []
+        for part in parts:
+            tokens.extend(part.split())
+        return self.infer_country_from_tokens(tokens)
+
+    def city_to_country(self, s: str) -> Optional[str]:
+        """
+        Fallback for locations naming only a city or region ("tel aviv", "new york").
+        """
+        # Leftmost part first: it is the most specific ("bucaramanga, santander")
+        parts = [p.strip() for p in COMMA_SPLIT_RE.split(s) if p.strip()]
+        for p in parts:
+            if p in self.regions:
+                return self.regions[p]
+            if p in self.cities:
+                return self.cities[p]
+        return None
+
+
+def load_location_resolver(
+    csv_path: Optional[str] = "data/processed/author_locations_processed.csv",
+    gazetteer_path: str = GAZETTEER_PATH,
+) -> LocationResolver:
+    """
+    Resolver backed by the gazetteer, with the country codes already in the processed CSV as overrides.
+    """
+    return LocationResolver(load_gazetteer(gazetteer_path), load_overrides(csv_path))
+
+
+def load_overrides(csv_path: Optional[str]) -> dict:
+    """
+    raw location -> country code, for every row of a processed locations CSV that has one.
+    """
+    if not csv_path or not os.path.exists(csv_path):
+        return {}
+    df = pd.read_csv(csv_path)
+    df = df[df["country_code"].notna()]
+    return df.set_index("location_raw")["country_code"].to_dict()
+
+
+def main(
+    in_path: str = "data/raw/author_locations.csv",
+    out_path: str = "data/processed/author_locations_processed.csv",
+    rebuild: bool = False,
+) -> None:
+    """
+    Rebuilds author_locations_processed.csv from the raw author locations. Country codes already in out_path
+    are curated and kept; the gazetteer only fills in locations without one.
+    """
+    resolver = LocationResolver(load_gazetteer(rebuild=rebuild), load_overrides(out_path))
+
+    df = pd.read_csv(in_path)
+    df["location_raw"] = df["location"].astype(str)
+    df["location_norm"] = df["location_raw"].fillna("").apply(normalise_text).str.lower()
+    df["location_status"] = df["location_norm"].map(classify_basic)
+    df["country_code"] = df["location_raw"].map(resolver.get)
+
+    mask = df["location_status"].eq("candidate")
+    df.loc[mask & df["country_code"].notna(), "location_status"] = "valid"
+    df.loc[mask & df["country_code"].isna(), "location_status"] = "ambiguous"
+    df["country"] = df["country_code"].map(resolver.country_name)
+
+    df.to_csv(out_path, index=False)
+    print(f"Resolved {int(df['country_code'].notna().sum())}/{len(df)} locations. Output: {out_path}")
+
+
+if __name__ == "__main__":
+    main(rebuild="--rebuild" in sys.argv)
@@ -0,0 +1,190 @@
+import random
+import re
+import sys
+from typing import Optional, Sequence
+
+import numpy as np
+
+from inference import Backend, score_texts
+
+MERSENNE_31 = (1 << 31) - 1
+WS_RE = re.compile(r"\s+")
+
+
+def normalise(text: Optional[str]) -> str:
+    return WS_RE.sub(" ", (text or "").lower()).strip()
+
+
+def shingles(text: str, k: int = 5) -> np.ndarray:
+    """
+    Hashed character k-grams of the normalised text (texts shorter than k are one shingle).
+    """
+    data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+    if len(data) < k:
+        data = np.concatenate([data, np.zeros(k - len(data), dtype=np.uint8)])
+    windows = np.lib.stride_tricks.sliding_window_view(data, k).astype(np.uint64)
+    # Pack the k bytes, then fold into [0, 2^31 - 1) so the permutations below cannot overflow uint64
+    packed = np.zeros(len(windows), dtype=np.uint64)
+    for i in range(k):
+        packed = (packed << np.uint64(8)) | windows[:, i]
+    return np.unique(packed % np.uint64(MERSENNE_31))
+
+
+def lsh_params(threshold: float, num_perm: int) -> tuple[int, int]:
+    """
+    (bands, rows) with bands * rows == num_perm whose S-curve midpoint (1/bands)^(1/rows) is closest to threshold.
+    """
+    options = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(options, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+class UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+class NearDupIndex:
+    """
+    MinHash signatures with banded LSH over cleaned texts. Texts whose estimated Jaccard similarity
+    (over character shingles) reaches `threshold` are clustered with union-find.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE_31, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_31, num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        x = shingles(text, self.shingle_size)
+        return ((np.outer(self.a, x) + self.b[:, None]) % np.uint64(MERSENNE_31)).min(axis=1)
+
+    def cluster(self, texts: Sequence[Optional[str]]) -> np.ndarray:
+        """
+        Cluster id per text: the index of the cluster's first text. Identical texts (after whitespace and
+        case normalisation) share a cluster without being hashed twice.
+        """
+        normalised = [normalise(t) for t in texts]
+        unique = list(dict.fromkeys(normalised))
+        slot = {text: i for i, text in enumerate(unique)}
+
+        signatures = np.stack([self.signature(t) for t in unique]) if unique else np.zeros((0, self.num_perm), dtype=np.uint64)
+        uf = UnionFind(len(unique))
+        for band in range(self.bands):
+            rows = signatures[:, band * self.rows:(band + 1) * self.rows]
+            buckets: dict[bytes, int] = {}
+            for i, key in enumerate(map(bytes, rows)):
+                first = buckets.setdefault(key, i)
+                # Star-join each bucket on its first member after checking the full signature agreement
+                if first != i and uf.find(first) != uf.find(i):
+                    if np.mean(signatures[first] == signatures[i]) >= self.threshold:
+                        uf.union(first, i)
+
+        root_of_unique = np.array([uf.find(i) for i in range(len(unique))], dtype=np.int64)
+        first_row = {}
+        for row, text in enumerate(normalised):
+            first_row.setdefault(root_of_unique[slot[text]], row)
+        return np.array([first_row[root_of_unique[slot[text]]] for text in normalised], dtype=np.int64)
+
+
+def dedup_score(
+    texts: Sequence[str],
+    backends: Sequence[Backend],
+    index: Optional[NearDupIndex] = None,
+    sample_size: int = 200,
+    seed: int = 0,
+    **score_kwargs,
+) -> tuple[dict[str, list[dict]], dict]:
+    """
+    Scores one representative per near-duplicate cluster and propagates its outputs to the rest.
+
+    The report counts model invocations with and without clustering, and measures agreement drift: a sample of
+    rows that received a propagated label from another row of their cluster (whatever the difference, case and
+    whitespace included) is scored directly and compared.
+    """
+    index = index or NearDupIndex()
+    clusters = index.cluster(texts)
+    representatives = np.unique(clusters)
+    rep_results = score_texts([texts[i] for i in representatives], backends, **score_kwargs)
+    position = {int(r): i for i, r in enumerate(representatives)}
+
+    results = {
+        backend.model_id: [rep_results[backend.model_id][position[int(c)]] for c in clusters] for backend in backends
+    }
+
+    propagated = [i for i, c in enumerate(clusters) if i != c]
+    sample = random.Random(seed).sample(propagated, min(sample_size, len(propagated)))
+    agreement = {}
+    if sample:
+        direct = score_texts([texts[i] for i in sample], backends, **score_kwargs)
+        for backend in backends:
+            same = sum(direct[backend.model_id][j]["label"] == results[backend.model_id][i]["label"] for j, i in enumerate(sample))
+            agreement[backend.model_id] = same / len(sample)
+
+    report = {
+        "rows": len(texts),
+        "exact_unique": len({normalise(t) for t in texts}),
+        "clusters": len(representatives),
+        "propagated_rows": len(propagated),
+        "near_duplicate_rows": sum(normalise(texts[i]) != normalise(texts[clusters[i]]) for i in propagated),
+        "invocations_per_model": len(representatives),
+        "invocations_saved_per_model": len(texts) - len(representatives),
+        "agreement_sample": len(sample),
+        "agreement": agreement,
+        "threshold": index.threshold,
+        "bands": index.bands,
+        "rows_per_band": index.rows,
+    }
+    return results, report
+
+
+def print_report(report: dict) -> None:
+    print(
+        f"Rows={report['rows']}, exact-unique={report['exact_unique']}, clusters={report['clusters']} "
+        f"(threshold={report['threshold']}, {report['bands']} bands x {report['rows_per_band']} rows)"
+    )
+    print(
+        f"Model invocations per model: {report['invocations_per_model']} "
+        f"(saved {report['invocations_saved_per_model']} vs one per row)"
+    )
+    for model_id, rate in report["agreement"].items():
+        print(f"  {model_id}: label agreement on {report['agreement_sample']} propagated rows = {rate:.1%}")
+
+
+def main(threshold: float = 0.8, num_threads: Optional[int] = None) -> None:
+    from inference import COLUMNS, EMOTION_MODEL, SENTIMENT_MODEL, HFBackend, load_final_frame
+
+    df = load_final_frame()
+    backends = [HFBackend(model_id, num_threads=num_threads) for model_id in (SENTIMENT_MODEL, EMOTION_MODEL)]
+    results, report = dedup_score(df["text"].tolist(), backends, NearDupIndex(threshold))
+    for backend in backends:
+        prefix = COLUMNS[backend.model_id]
+        df[f"{prefix}_label"] = [o["label"] for o in results[backend.model_id]]
+        df[f"{prefix}_score"] = [o["score"] for o in results[backend.model_id]]
+    df.to_csv("data/processed/nlp_sentiment_analysis_with_emotion.csv")
+    print_report(report)
+
+
+if __name__ == "__main__":
+    threshold = 0.8
+    num_threads = None
+    for arg in sys.argv[1:]:
+        if arg.startswith("--threshold="):
+            threshold = float(arg.split("=", 1)[1])
+        elif arg.startswith("--threads="):
+            num_threads = int(arg.split("=", 1)[1])
+    main(threshold, num_threads)
@@ -0,0 +1,359 @@
+import ast
+import hashlib
+import json
+import os
+import sys
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, Optional
+
+import add_id
+import clean_nodes
+import clean_text
+import create_nlp_data
+import extract_text
+import flatten_data_for_nlp
+import locations
+from clean_text import CleanConfig
+from fingerprint import file_fingerprint
+from json_stream import read_issues
+
+RAW = "data/raw/issues_data_10k.json"
+LOCATIONS = "data/processed/author_locations_processed.csv"
+GAZETTEER = locations.GAZETTEER_PATH
+PROCESSED = "data/processed/issues_data_10k_processed.jsonl"
+WITH_IDS = "data/processed/issues_data_10k_processed_id.jsonl"
+TITLES = "data/processed/titles_only.jsonl"
+TEXTS = "data/processed/texts_only_with_ids.jsonl"
+TEXTS_CLEANED = "data/processed/texts_only_with_ids_cleaned.jsonl"
+TEXTS_META = TEXTS_CLEANED + ".meta.jsonl"
+FLAT = "data/processed/flat_nlp_data.jsonl"
+FINAL = "data/processed/final_nlp_data.jsonl"
+MANIFEST = "data/processed/.pipeline_manifest.json"
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@dataclass
+class Stage:
+    name: str
+    inputs: list[str]
+    outputs: list[str]
+    run: Callable[[], None]
+    code: list[str] = field(default_factory=list)  # modules whose source (and local imports') is fingerprinted
+
+
+def build_stages(
+    raw_path: str = RAW,
+    locations_path: str = LOCATIONS,
+    cfg: CleanConfig = CleanConfig(),
+) -> list[Stage]:
+    return [
+        Stage(
+            "gazetteer", [], [GAZETTEER],
+            lambda: locations.load_gazetteer(GAZETTEER, rebuild=True),
+            ["locations"],
+        ),
+        Stage(
+            "clean_nodes", [raw_path, locations_path, GAZETTEER], [PROCESSED],
+            lambda: clean_nodes.main_stream(locations.load_location_resolver(locations_path), raw_path, PROCESSED),
+            ["clean_nodes", "json_stream", "locations"],
+        ),
+        Stage(
+            "add_id", [PROCESSED], [WITH_IDS],
+            lambda: add_id.main_stream(PROCESSED, WITH_IDS),
+            ["add_id", "json_stream"],
+        ),
+        Stage(
+            "extract_text", [WITH_IDS], [TITLES, TEXTS],
+            lambda: extract_text.main_stream(WITH_IDS, TITLES, TEXTS),
+            ["extract_text", "json_stream"],
+        ),
+        Stage(
+            "clean_text", [TEXTS], [TEXTS_CLEANED, TEXTS_META],
+            lambda: clean_text.process_jsonl(TEXTS, TEXTS_CLEANED, cfg),
+            ["clean_text"],
+        ),
+        Stage(
+            "flatten_data_for_nlp", [WITH_IDS], [FLAT],
+            lambda: flatten_data_for_nlp.main_stream(WITH_IDS, FLAT),
+            ["flatten_data_for_nlp", "json_stream"],
+        ),
+        Stage(
+            "create_nlp_data", [FLAT, TEXTS_CLEANED], [FINAL],
+            lambda: create_nlp_data.main_stream(FLAT, TEXTS_CLEANED, FINAL),
+            ["create_nlp_data", "record_table"],
+        ),
+    ]
+
+
+# Fingerprinting ---------------------------------------------------------------
+
+def local_imports(name: str) -> set[str]:
+    """
+    Modules of this directory that name imports anywhere in its source, including imports inside functions.
+    """
+    with open(os.path.join(SCRIPTS_DIR, f"{name}.py"), "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    found = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            found.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            found.add(node.module.split(".")[0])
+    return {m for m in found if os.path.exists(os.path.join(SCRIPTS_DIR, f"{m}.py"))}
+
+
+def module_closure(modules: Iterable[str]) -> set[str]:
+    seen: set[str] = set()
+    todo = list(modules)
+    while todo:
+        name = todo.pop()
+        if name not in seen:
+            seen.add(name)
+            todo.extend(local_imports(name) - seen)
+    return seen
+
+
+def code_fingerprint(modules: list[str]) -> str:
+    """
+    Hash of the modules' source and of every local module they import, so editing a helper such as
+    profiling or record_table invalidates the stages that use it.
+    """
+    h = hashlib.sha256()
+    for name in sorted(module_closure(modules)):
+        with open(os.path.join(SCRIPTS_DIR, f"{name}.py"), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def load_manifest(path: str = MANIFEST) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict, path: str = MANIFEST) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _same_content(a: Optional[dict], b: Optional[dict]) -> bool:
+    return a is not None and b is not None and a["sha256"] == b["sha256"]
+
+
+def check_inputs(stage: Stage) -> None:
+    """
+    A missing input can never be fingerprinted, so the stage would look stale (and rerun) forever; fail instead.
+    """
+    missing = [p for p in stage.inputs if not os.path.exists(p)]
+    if missing:
+        raise FileNotFoundError(f"[{stage.name}] missing input(s): {', '.join(missing)}")
+
+
+def stage_is_stale(stage: Stage, entry: Optional[dict], extra: str = "") -> bool:
+    if entry is None:
+        return True
+    if entry.get("code") != code_fingerprint(stage.code) + extra:
+        return True
+    if any(not os.path.exists(p) for p in stage.outputs):
+        return True
+    for p in stage.inputs:
+        previous = entry["inputs"].get(p)
+        if not _same_content(file_fingerprint(p, previous), previous):
+            return True
+    return False
+
+
+def record_stage(manifest: dict, stage: Stage, extra: str = "") -> None:
+    previous = manifest.get(stage.name, {}).get("inputs", {})
+    manifest[stage.name] = {
+        "code": code_fingerprint(stage.code) + extra,
+        "inputs": {p: file_fingerprint(p, previous.get(p)) for p in stage.inputs},
+    }
+
+
+def _cfg_key(cfg: CleanConfig) -> str:
+    return json.dumps(cfg.__dict__, sort_keys=True)
+
+
+# Runners ----------------------------------------------------------------------
+
+def run_staged(stages: list[Stage], force: bool = False, cfg: CleanConfig = CleanConfig()) -> list[str]:
+    """
+    Runs each stage file-to-file, skipping stages whose inputs and code are unchanged since the last run.
+    """
+    manifest = load_manifest()
+    ran = []
+    for stage in stages:
+        check_inputs(stage)
+        extra = _cfg_key(cfg) if stage.name == "clean_text" else ""
+        if not force and not stage_is_stale(stage, manifest.get(stage.name), extra):
+            print(f"[{stage.name}] up to date, skipping")
+            continue
+        print(f"[{stage.name}] running")
+        stage.run()
+        record_stage(manifest, stage, extra)
+        save_manifest(manifest)
+        ran.append(stage.name)
+    return ran
+
+
+@dataclass
+class IssueResult:
+    issue: dict
+    processed: Optional[str]  # JSON of the issue before ids were added, if requested
+    titles: list[str]
+    texts: list[dict]
+    cleaned_rows: list[dict]
+    meta_rows: list[dict]
+    flat_entries: list[tuple[str, dict]]
+    final_entries: list[tuple[str, dict]]
+
+
+def fused_issue_stream(
+    issues: Iterable[dict],
+    location_lookup: dict,
+    cfg: CleanConfig,
+    keep_processed: bool = False,
+) -> Iterator[IssueResult]:
+    """
+    Pushes each issue through every stage in memory and yields everything derived from it.
+    """
+    for issue_id, issue in enumerate(issues):
+        clean_nodes.clean_issue(issue, location_lookup)
+        processed = json.dumps(issue, ensure_ascii=False) if keep_processed else None
+        add_id.add_id(issue, issue_id)
+
+        titles, texts = next(extract_text.stream([issue]))
+
+        cleaned_rows = []
+        meta_rows = []
+        cleaned_by_id = {}
+        for row in texts:
+            cleaned, meta = clean_text.clean_github_text(row["text"], cfg)
+            if cleaned is not None:
+                cleaned_rows.append({"id": row.get("id", ""), "text": cleaned})
+                if row.get("id"):
+                    cleaned_by_id[row["id"]] = cleaned
+            meta["text"] = row
+            meta_rows.append(meta)
+
+        flat_entries, _ = flatten_data_for_nlp.flatten_issue(issue)
+        final_entries = [
+            (key, {**row, "text": cleaned_by_id[key]}) for key, row in flat_entries if key in cleaned_by_id
+        ]
+
+        yield IssueResult(issue, processed, titles, texts, cleaned_rows, meta_rows, flat_entries, final_entries)
+
+
+def run_fused(
+    raw_path: str = RAW,
+    locations_path: str = LOCATIONS,
+    out_path: str = FINAL,
+    artifacts: Iterable[str] = (),
+    cfg: CleanConfig = CleanConfig(),
+    force: bool = False,
+) -> bool:
+    """
+    Single pass over the raw dump producing final_nlp_data.jsonl.
+    Intermediate files are only written when named in `artifacts` (any of ARTIFACTS).
+    Returns False if nothing needed to run.
+    """
+    artifacts = set(artifacts)
+    unknown = artifacts - set(ARTIFACTS)
+    if unknown:
+        raise ValueError(f"Unknown artifacts: {sorted(unknown)}; choose from {sorted(ARTIFACTS)}")
+
+    stages = build_stages(raw_path, locations_path, cfg)
+    fused = Stage(
+        "fused", [raw_path, locations_path, GAZETTEER], [out_path] + [ARTIFACTS[a] for a in sorted(artifacts)],
+        lambda: None, sorted({m for s in stages for m in s.code} | {"pipeline"}),
+    )
+    # The gazetteer is derived from the locations module, not from the raw data; build it first if needed
+    run_staged([s for s in stages if s.name == "gazetteer"])
+    check_inputs(fused)
+    manifest = load_manifest()
+    if not force and not stage_is_stale(fused, manifest.get("fused"), _cfg_key(cfg)):
+        print("[fused] up to date, skipping")
+        return False
+
+    location_lookup = locations.load_location_resolver(locations_path)
+    kept = dropped = issues_seen = 0
+
+    with ExitStack() as stack:
+        files = {name: stack.enter_context(open(ARTIFACTS[name], "w", encoding="utf-8")) for name in artifacts}
+        out = stack.enter_context(open(out_path, "w", encoding="utf-8"))
+
+        for result in fused_issue_stream(read_issues(raw_path), location_lookup, cfg, "processed" in files):
+            issues_seen += 1
+            kept += len(result.cleaned_rows)
+            dropped += len(result.meta_rows) - len(result.cleaned_rows)
+
+            if "processed" in files:
+                files["processed"].write(result.processed + "\n")
+            if "with_ids" in files:
+                files["with_ids"].write(json.dumps(result.issue, ensure_ascii=False) + "\n")
+            if "titles" in files:
+                for title in result.titles:
+                    files["titles"].write(json.dumps(title) + "\n")
+            if "texts" in files:
+                for row in result.texts:
+                    files["texts"].write(json.dumps(row) + "\n")
+            if "texts_cleaned" in files:
+                for row in result.cleaned_rows:
+                    files["texts_cleaned"].write(json.dumps(row, ensure_ascii=False) + "\n")
+            if "texts_meta" in files:
+                for meta in result.meta_rows:
+                    files["texts_meta"].write(json.dumps(meta, ensure_ascii=False) + "\n")
+            if "flat" in files:
+                for key, row in result.flat_entries:
+                    files["flat"].write(json.dumps({key: row}, ensure_ascii=False) + "\n")
+
+            for key, row in result.final_entries:
+                out.write(json.dumps({key: row}, ensure_ascii=False) + "\n")
+
+    print(f"Done. Issues={issues_seen}, Kept={kept}, Dropped={dropped}. Output: {out_path}")
+
+    record_stage(manifest, fused, _cfg_key(cfg))
+    # Stages whose outputs were all written in this pass are recorded too, so a later staged run can skip them
+    written = {ARTIFACTS[a] for a in artifacts} | {out_path}
+    for stage in stages:
+        if all(p in written for p in stage.outputs) and all(os.path.exists(p) for p in stage.inputs):
+            record_stage(manifest, stage, _cfg_key(cfg) if stage.name == "clean_text" else "")
+    save_manifest(manifest)
+    return True
+
+
+# The processed/with_ids artifacts are written as JSONL (one issue per line), as in the --stream modes
+ARTIFACTS = {
+    "processed": PROCESSED,
+    "with_ids": WITH_IDS,
+    "titles": TITLES,
+    "texts": TEXTS,
+    "texts_cleaned": TEXTS_CLEANED,
+    "texts_meta": TEXTS_META,
+    "flat": FLAT,
+}
+
+
+def main(argv: list[str]) -> None:
+    force = "--force" in argv
+    if "--staged" in argv:
+        run_staged(build_stages(), force=force)
+        return
+
+    artifacts: list[str] = []
+    for arg in argv:
+        if arg.startswith("--write="):
+            artifacts.extend(a for a in arg.split("=", 1)[1].split(",") if a)
+    if "--write-all" in argv:
+        artifacts = list(ARTIFACTS)
+    run_fused(artifacts=artifacts, force=force)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,319 @@
+import functools
+import importlib
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional, Sequence
+
+# Setting this to a file path turns tracing on for every script (and their worker processes)
+TRACE_ENV = "PIPELINE_TRACE"
+
+enabled = bool(os.environ.get(TRACE_ENV))
+_path: Optional[str] = os.environ.get(TRACE_ENV) or None
+_active: list["StageRecord"] = []
+
+
+def enable(path: str = "data/processed/trace.jsonl") -> None:
+    """
+    Turns tracing on for this process; records are appended to path as JSON lines.
+    """
+    global enabled, _path
+    enabled, _path = True, path
+    os.environ[TRACE_ENV] = path
+
+
+def disable() -> None:
+    global enabled, _path
+    enabled, _path = False, None
+    os.environ.pop(TRACE_ENV, None)
+
+
+def _peak_rss_bytes() -> int:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _size(path: str) -> int:
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+
+class RuleStats(dict):
+    """
+    rule name -> {"calls", "hits", "seconds"}, cumulative.
+    """
+
+    def add(self, name: str, hits: int, seconds: float, calls: int = 1) -> None:
+        entry = self.get(name)
+        if entry is None:
+            entry = self[name] = {"calls": 0, "hits": 0, "seconds": 0.0}
+        entry["calls"] += calls
+        entry["hits"] += hits
+        entry["seconds"] += seconds
+
+    def merge(self, other: dict) -> None:
+        for name, entry in other.items():
+            self.add(name, entry["hits"], entry["seconds"], entry["calls"])
+
+
+class StageRecord:
+    """
+    What one stage did. rows_in/rows_out are filled in by the stage (or through counted()).
+    """
+
+    def __init__(self, name: str, inputs: Sequence[str] = (), outputs: Sequence[str] = ()):
+        self.name = name
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.rows_in: Optional[int] = None
+        self.rows_out: Optional[int] = None
+        self.rules = RuleStats()
+
+    def to_dict(self) -> dict:
+        return {
+            "type": "stage",
+            "name": self.name,
+            "pid": os.getpid(),
+            "start": self.start,
+            "seconds": self.seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "bytes_read": sum(_size(p) for p in self.inputs),
+            "bytes_written": sum(_size(p) for p in self.outputs),
+            "peak_rss_bytes": self.peak_rss,
+            "rss_growth_bytes": self.peak_rss - self.start_rss,
+        }
+
+
+class _NullRecord:
+    """
+    Stand-in yielded while tracing is off, so stages can set counters unconditionally.
+    """
+
+    name = None
+    rows_in = None
+    rows_out = None
+    rules = RuleStats()
+
+    def __setattr__(self, name, value) -> None:
+        pass
+
+
+NULL_RECORD = _NullRecord()
+
+
+def write_records(records: Iterable[dict]) -> None:
+    with open(_path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+@contextmanager
+def stage(name: str, inputs: Sequence[str] = (), outputs: Sequence[str] = ()) -> Iterator[StageRecord]:
+    """
+    Times the block and appends a stage record (and one record per traced rule) to the trace. Bytes read and
+    written are the sizes of inputs/outputs; peak_rss_bytes is the process high-water mark when the stage ends.
+    A no-op when tracing is off.
+    """
+    if not enabled:
+        yield NULL_RECORD
+        return
+
+    record = StageRecord(name, inputs, outputs)
+    record.start = time.time()
+    record.start_rss = _peak_rss_bytes()
+    wall, cpu = time.perf_counter(), time.process_time()
+    _active.append(record)
+    try:
+        yield record
+    finally:
+        _active.pop()
+        record.seconds = time.perf_counter() - wall
+        record.cpu_seconds = time.process_time() - cpu
+        record.peak_rss = _peak_rss_bytes()
+        write_records([record.to_dict()] + [
+            {"type": "rule", "stage": name, "pid": os.getpid(), "rule": rule, **entry}
+            for rule, entry in sorted(record.rules.items(), key=lambda item: -item[1]["seconds"])
+        ])
+
+
+def counted(items: Iterable, record, attr: str = "rows_in") -> Iterable:
+    """
+    Passes items through, counting them into record.<attr>. Returns items untouched when tracing is off.
+    """
+    if record is NULL_RECORD:
+        return items
+
+    def count() -> Iterator:
+        setattr(record, attr, getattr(record, attr) or 0)
+        for item in items:
+            setattr(record, attr, getattr(record, attr) + 1)
+            yield item
+    return count()
+
+
+# Rule tracing --------------------------------------------------------------------
+
+class TracedPattern:
+    """
+    Wraps a compiled regex, adding time and match counts for sub/findall/search to a RuleStats.
+    """
+
+    __slots__ = ("pattern", "name", "stats")
+
+    def __init__(self, pattern, name: str, stats: RuleStats):
+        self.pattern = pattern
+        self.name = name
+        self.stats = stats
+
+    def sub(self, repl, string: str, count: int = 0) -> str:
+        start = time.perf_counter()
+        result, hits = self.pattern.subn(repl, string, count)
+        self.stats.add(self.name, hits, time.perf_counter() - start)
+        return result
+
+    def subn(self, repl, string: str, count: int = 0) -> tuple[str, int]:
+        start = time.perf_counter()
+        result = self.pattern.subn(repl, string, count)
+        self.stats.add(self.name, result[1], time.perf_counter() - start)
+        return result
+
+    def findall(self, string: str, *args) -> list:
+        start = time.perf_counter()
+        result = self.pattern.findall(string, *args)
+        self.stats.add(self.name, len(result), time.perf_counter() - start)
+        return result
+
+    def search(self, string: str, *args):
+        start = time.perf_counter()
+        result = self.pattern.search(string, *args)
+        self.stats.add(self.name, result is not None, time.perf_counter() - start)
+        return result
+
+    def __getattr__(self, attr):
+        return getattr(self.pattern, attr)
+
+
+def _traced_function(fn: Callable, name: str, stats: RuleStats) -> Callable:
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stats.add(name, 0, time.perf_counter() - start)
+    return wrapper
+
+
+@contextmanager
+def traced(namespace: dict, names: Sequence[str], stats: Optional[RuleStats] = None) -> Iterator[RuleStats]:
+    """
+    Swaps the named module-level regexes (and functions) in namespace for timed wrappers for the duration of
+    the block; code that looks them up as globals is traced without being changed. Stats go to the innermost
+    active stage unless given. Nothing is swapped while tracing is off.
+    """
+    if not enabled:
+        yield RuleStats()
+        return
+
+    if stats is None:
+        stats = _active[-1].rules if _active else RuleStats()
+    originals = {name: namespace[name] for name in names}
+    for name, value in originals.items():
+        # Forked workers inherit the parent's wrappers; trace the underlying rule, not the wrapper
+        if isinstance(value, TracedPattern):
+            value = value.pattern
+        value = getattr(value, "__wrapped__", value)
+        if hasattr(value, "subn"):
+            namespace[name] = TracedPattern(value, name, stats)
+        else:
+            namespace[name] = _traced_function(value, name, stats)
+    try:
+        yield stats
+    finally:
+        namespace.update(originals)
+
+
+def call_traced(module: str, names: Sequence[str], fn: Callable, *args):
+    """
+    Runs fn(*args) in a worker process with the module's rules traced; returns (result, stats) for
+    merge_worker in the parent.
+    """
+    namespace = vars(importlib.import_module(module))
+    with traced(namespace, names, RuleStats()) as stats:
+        result = fn(*args)
+    return result, dict(stats)
+
+
+def merge_worker(returned):
+    """
+    Folds a call_traced result's stats into the active stage and returns the plain result.
+    """
+    result, stats = returned
+    if _active:
+        _active[-1].rules.merge(stats)
+    return result
+
+
+# Reading traces ------------------------------------------------------------------
+
+def read_trace(path: str) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def to_chrome_trace(records: Sequence[dict]) -> dict:
+    """
+    Chrome trace (chrome://tracing, Perfetto): one complete event per stage, with its rules laid out
+    inside it as consecutive blocks of their cumulative time.
+    """
+    events = []
+    stages = {}
+    for record in records:
+        if record["type"] == "stage":
+            ts = record["start"] * 1e6
+            stages[(record["pid"], record["name"])] = [ts, ts]
+            args = {k: v for k, v in record.items() if k not in ("type", "name", "pid", "start", "seconds")}
+            events.append({
+                "name": record["name"], "cat": "stage", "ph": "X", "ts": ts, "dur": record["seconds"] * 1e6,
+                "pid": record["pid"], "tid": 0, "args": args,
+            })
+        elif record["type"] == "rule":
+            span = stages.get((record["pid"], record["stage"]))
+            if span is None:
+                continue
+            events.append({
+                "name": record["rule"], "cat": "rule", "ph": "X", "ts": span[1], "dur": record["seconds"] * 1e6,
+                "pid": record["pid"], "tid": 0, "args": {"calls": record["calls"], "hits": record["hits"]},
+            })
+            span[1] += record["seconds"] * 1e6
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def print_summary(records: Sequence[dict], top_rules: int = 10) -> None:
+    for record in records:
+        if record["type"] == "stage":
+            rows = f"{record['rows_in']} -> {record['rows_out']} rows" if record["rows_in"] is not None else f"{record['rows_out']} rows out"
+            print(
+                f"{record['name']:>22}: {record['seconds']:8.2f}s  {rows}  "
+                f"read {record['bytes_read'] / 2**20:.1f} MiB, wrote {record['bytes_written'] / 2**20:.1f} MiB, "
+                f"peak RSS {record['peak_rss_bytes'] / 2**20:.1f} MiB"
+            )
+            rules = [r for r in records if r["type"] == "rule" and r["stage"] == record["name"] and r["pid"] == record["pid"]]
+            for rule in rules[:top_rules]:
+                print(f"{'':>24}{rule['rule']:<22} {rule['seconds']:8.3f}s  calls={rule['calls']}  hits={rule['hits']}")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    options = dict(arg[2:].split("=", 1) for arg in sys.argv[1:] if arg.startswith("--") and "=" in arg)
+    records = read_trace(args[0] if args else "data/processed/trace.jsonl")
+    print_summary(records)
+    if "chrome" in options:
+        with open(options["chrome"], "w") as f:
+            json.dump(to_chrome_trace(records), f)
+        print(f"Chrome trace: {options['chrome']}")
@@ -0,0 +1,358 @@
+import json
+import math
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+GITHUB_TIME = "%Y-%m-%dT%H:%M:%SZ"
+COMMENT_BITS = 24  # bits for the comment index in a packed (issue, comment) key
+MISSING = -(1 << 63)  # created_at that did not parse; the original value is kept aside
+
+
+def parse_id(key: str) -> tuple[int, int]:
+    """
+    add_id keys: "123" is issue 123 -> (123, -1); "123_4" is its comment 4 -> (123, 4). Anything else,
+    including keys that would not format back identically ("007", "-1"), raises ValueError.
+    """
+    issue, sep, comment = key.partition("_")
+    if _is_index(issue) and (_is_index(comment) if sep else True):
+        comment = int(comment) if sep else -1
+        if comment < (1 << COMMENT_BITS) - 1:
+            return int(issue), comment
+    raise ValueError(f"not an add_id key: {key!r}")
+
+
+def _is_index(s: str) -> bool:
+    # Plain ASCII digits without a leading zero, as add_id writes them
+    return s.isascii() and s.isdigit() and (s[0] != "0" or s == "0")
+
+
+def format_id(issue: int, comment: int) -> str:
+    return f"{issue}" if comment < 0 else f"{issue}_{comment}"
+
+
+def pack_id(issue, comment):
+    return (np.asarray(issue, dtype=np.int64) << COMMENT_BITS) | (np.asarray(comment, dtype=np.int64) + 1)
+
+
+def _is_nan(value) -> bool:
+    return isinstance(value, float) and math.isnan(value)
+
+
+class Interner:
+    """
+    Value -> small int code; each distinct value is stored once. NaN (left by old location lookups)
+    is one value rather than a new one per row.
+    """
+
+    _NAN = object()
+
+    def __init__(self):
+        self.codes: dict = {}
+        self.values: list = []
+
+    def code(self, value) -> int:
+        key = self._NAN if _is_nan(value) else value
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def categorical(self, codes: np.ndarray) -> pd.Categorical:
+        # None/NaN cannot be categories, so they become code -1
+        present = [i for i, v in enumerate(self.values) if v is not None and not _is_nan(v)]
+        remap = np.full(len(self.values), -1, dtype=np.int64)
+        remap[present] = np.arange(len(present))
+        return pd.Categorical.from_codes(remap[codes], [self.values[i] for i in present])
+
+
+class RecordTable:
+    """
+    Column store for the flat NLP records ({id: {created_at, author, author_location, type, parent_issue_id, text}}).
+
+    Ids are integer (issue, comment) arrays, author/location/type are interned codes, created_at is epoch seconds
+    and all texts share one UTF-8 buffer with offsets. parent_issue_id is not stored: it is the comment's issue.
+    Records are looked up by their add_id string through a sorted array of packed ids; other ids are interned
+    and stored as negative issue numbers.
+
+    Like the dict it replaces, a repeated id holds one record: the last one appended, at the place the id was
+    first seen. Row numbers (key(i), record(i)) count every appended row; rows() gives the ones that hold.
+    """
+
+    def __init__(self):
+        self._issue = array("q")
+        self._comment = array("i")
+        self._created = array("q")
+        self._author = array("i")
+        self._location = array("i")
+        self._type = array("i")
+        self._text_offsets = array("q", [0])
+        self._text = bytearray()
+        self._text_null = bytearray()
+        self._odd_times: dict[int, object] = {}
+        self.authors = Interner()
+        self.locations = Interner()
+        self.types = Interner()
+        self.other_keys = Interner()
+        self._other_parents: dict[int, object] = {}
+        self._sorted_keys: Optional[np.ndarray] = None
+        self._order: Optional[np.ndarray] = None
+        self._live = None
+
+    def _add_time(self, created_at) -> None:
+        seconds = MISSING
+        # Only values that format back identically are stored as seconds (datetime.fromisoformat reads "Z")
+        if isinstance(created_at, str) and len(created_at) == 20 and created_at[10] == "T" and created_at[-1] == "Z":
+            try:
+                seconds = int(datetime.fromisoformat(created_at).timestamp())
+            except ValueError:
+                pass
+        if seconds == MISSING:
+            self._odd_times[len(self._created)] = created_at
+        self._created.append(seconds)
+
+    def _split_key(self, key: str, intern: bool) -> Optional[tuple[int, int]]:
+        try:
+            return parse_id(key)
+        except ValueError:
+            if intern:
+                return -1 - self.other_keys.code(key), -1
+            code = self.other_keys.codes.get(key)
+            return None if code is None else (-1 - code, -1)
+
+    def append(self, key: str, row: dict) -> None:
+        issue, comment = self._split_key(key, intern=True)
+        if issue < 0 and "parent_issue_id" in row:
+            self._other_parents[len(self._issue)] = row["parent_issue_id"]
+        self._issue.append(issue)
+        self._comment.append(comment)
+        self._add_time(row.get("created_at"))
+        self._author.append(self.authors.code(row.get("author")))
+        self._location.append(self.locations.code(row.get("author_location")))
+        self._type.append(self.types.code(row.get("type")))
+        text = row.get("text")
+        self._text_null.append(text is None)
+        self._text += (text or "").encode("utf-8", "surrogatepass")
+        self._text_offsets.append(len(self._text))
+        self._sorted_keys = None
+
+    def extend(self, items: Iterable[tuple[str, dict]]) -> "RecordTable":
+        for key, row in items:
+            self.append(key, row)
+        return self
+
+    @classmethod
+    def from_jsonl(cls, path: str) -> "RecordTable":
+        def items() -> Iterator[tuple[str, dict]]:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield from json.loads(line).items()
+        return cls().extend(items())
+
+    def _index(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._sorted_keys is None:
+            keys = pack_id(np.frombuffer(self._issue, dtype=np.int64), np.frombuffer(self._comment, dtype=np.int32))
+            self._order = np.argsort(keys, kind="stable")
+            self._sorted_keys = keys[self._order]
+            # Per distinct id: its last row, ordered by where the id first appeared
+            last = np.flatnonzero(np.append(self._sorted_keys[1:] != self._sorted_keys[:-1], True))
+            if len(last) == len(keys):
+                self._live = range(len(keys))
+            else:
+                first = np.concatenate(([0], last[:-1] + 1))
+                self._live = self._order[last][np.argsort(self._order[first], kind="stable")]
+        return self._sorted_keys, self._order
+
+    def position(self, key: str) -> int:
+        """
+        Row number holding an id's record (the last appended, if repeated), or -1.
+        """
+        split = self._split_key(key, intern=False)
+        if split is None:
+            return -1
+        packed = int(pack_id(*split))
+        keys, order = self._index()
+        i = int(np.searchsorted(keys, packed, side="right")) - 1
+        return int(order[i]) if i >= 0 and keys[i] == packed else -1
+
+    def rows(self) -> Sequence[int]:
+        """
+        Row numbers of the records the table holds, in the order their ids were first appended.
+        """
+        self._index()
+        return self._live
+
+    def __len__(self) -> int:
+        return len(self.rows())
+
+    def __contains__(self, key: str) -> bool:
+        return self.position(key) >= 0
+
+    def key(self, i: int) -> str:
+        issue = self._issue[i]
+        return self.other_keys.values[-1 - issue] if issue < 0 else format_id(issue, self._comment[i])
+
+    def text(self, i: int) -> Optional[str]:
+        if self._text_null[i]:
+            return None
+        return self._text[self._text_offsets[i]:self._text_offsets[i + 1]].decode("utf-8", "surrogatepass")
+
+    def created_at(self, i: int):
+        seconds = self._created[i]
+        return self._odd_times[i] if seconds == MISSING else time.strftime(GITHUB_TIME, time.gmtime(seconds))
+
+    def record(self, i: int) -> dict:
+        """
+        Row i as the dict flatten_data_for_nlp produced.
+        """
+        row = {
+            "created_at": self.created_at(i),
+            "author": self.authors.values[self._author[i]],
+            "author_location": self.locations.values[self._location[i]],
+            "type": self.types.values[self._type[i]],
+        }
+        if self._comment[i] >= 0:
+            row["parent_issue_id"] = f"{self._issue[i]}"
+        elif i in self._other_parents:
+            row["parent_issue_id"] = self._other_parents[i]
+        row["text"] = self.text(i)
+        return row
+
+    def get(self, key: str, default=None) -> Optional[dict]:
+        i = self.position(key)
+        return self.record(i) if i >= 0 else default
+
+    def __getitem__(self, key: str) -> dict:
+        i = self.position(key)
+        if i < 0:
+            raise KeyError(key)
+        return self.record(i)
+
+    def keys(self) -> Iterator[str]:
+        for i in self.rows():
+            yield self.key(i)
+
+    def items(self) -> Iterator[tuple[str, dict]]:
+        for i in self.rows():
+            yield self.key(i), self.record(i)
+
+    def to_frame(self) -> pd.DataFrame:
+        rows = np.asarray(self.rows(), dtype=np.int64)
+        created = pd.Series(np.frombuffer(self._created, dtype=np.int64)[rows])
+        comment = np.frombuffer(self._comment, dtype=np.int32)[rows]
+        issue = np.frombuffer(self._issue, dtype=np.int64)[rows]
+        parents = [
+            f"{p}" if c >= 0 else self._other_parents.get(i) if p < 0 else None for i, p, c in zip(rows, issue, comment)
+        ]
+        return pd.DataFrame({
+            "created_at": pd.to_datetime(created.where(created != MISSING), unit="s", utc=True),
+            "author": self.authors.categorical(np.frombuffer(self._author, dtype=np.int32)[rows]),
+            "author_location": self.locations.categorical(np.frombuffer(self._location, dtype=np.int32)[rows]),
+            "type": self.types.categorical(np.frombuffer(self._type, dtype=np.int32)[rows]),
+            "parent_issue_id": pd.array(parents, dtype="string"),
+            "text": pd.array([self.text(i) for i in rows], dtype="string"),
+        }, index=pd.Index(list(self.keys()), name="id"))
+
+    def nbytes(self) -> int:
+        columns = (self._issue, self._comment, self._created, self._author, self._location, self._type, self._text_offsets)
+        return sum(c.itemsize * len(c) for c in columns) + len(self._text) + len(self._text_null)
+
+
+def synthetic_rows(n_issues: int, comments_per_issue: int = 10, seed: int = 0) -> Iterator[tuple[str, dict]]:
+    rng = random.Random(seed)
+    logins = [f"user{i}" for i in range(max(n_issues // 2, 1))]
+    countries = ["US", "CN", "DE", "IN", "GB", "FR", ""]
+    words = "the model fails when loading weights thanks same issue here CODEBLOCK URL PATH".split()
+    for issue in range(n_issues):
+        stamp = 1_577_836_800 + issue * 3600
+        yield f"{issue}", {
+            "created_at": time.strftime(GITHUB_TIME, time.gmtime(stamp)),
+            "author": rng.choice(logins), "author_location": rng.choice(countries), "type": "issue",
+            "text": " ".join(rng.choice(words) for _ in range(rng.randint(5, 60))),
+        }
+        for comment in range(rng.randint(0, 2 * comments_per_issue)):
+            yield f"{issue}_{comment}", {
+                "created_at": time.strftime(GITHUB_TIME, time.gmtime(stamp + 60 * (comment + 1))),
+                "author": rng.choice(logins), "author_location": rng.choice(countries), "type": "comment",
+                "parent_issue_id": f"{issue}", "text": " ".join(rng.choice(words) for _ in range(rng.randint(2, 40))),
+            }
+
+
+def _traced(build) -> tuple[object, int, float]:
+    """
+    (result, bytes still allocated by build when it returns, seconds).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def benchmark(lines: list[str]) -> dict:
+    """
+    Memory of the dict-of-dicts create_nlp_data builds versus a RecordTable over the same JSONL lines,
+    checking that a sample of lookups by string id agree.
+    """
+    def build_dict() -> dict:
+        node_data = {}
+        for line in lines:
+            node_data.update(json.loads(line))
+        return node_data
+
+    def build_table() -> RecordTable:
+        table = RecordTable()
+        for line in lines:
+            table.extend(json.loads(line).items())
+        table._index()
+        return table
+
+    node_data, dict_bytes, dict_seconds = _traced(build_dict)
+    table, table_bytes, table_seconds = _traced(build_table)
+
+    for key in random.Random(0).sample(list(node_data), min(1000, len(node_data))):
+        expected = json.dumps(node_data[key], sort_keys=True)
+        if json.dumps(table[key], sort_keys=True) != expected:
+            raise AssertionError(f"RecordTable disagrees with the dict for {key}")
+
+    return {
+        "records": len(node_data),
+        "dict_bytes": dict_bytes,
+        "table_bytes": table_bytes,
+        "dict_seconds": dict_seconds,
+        "table_seconds": table_seconds,
+    }
+
+
+def main(path: Optional[str] = None, n_issues: int = 20000) -> None:
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [line for line in f if line.strip()]
+    else:
+        lines = [json.dumps({key: row}, ensure_ascii=False) for key, row in synthetic_rows(n_issues)]
+
+    result = benchmark(lines)
+    print(f"Records: {result['records']}")
+    print(f"  dict-of-dicts: {result['dict_bytes'] / 2**20:8.1f} MiB  {result['dict_seconds']:.2f}s")
+    print(f"  RecordTable:   {result['table_bytes'] / 2**20:8.1f} MiB  {result['table_seconds']:.2f}s")
+    print(f"  {result['dict_bytes'] / max(result['table_bytes'], 1):.1f}x less memory")
+
+
+if __name__ == "__main__":
+    n_issues = 20000
+    for arg in sys.argv[1:]:
+        if arg.startswith("--issues="):
+            n_issues = int(arg.split("=", 1)[1])
+    paths = [a for a in sys.argv[1:] if not a.startswith("--")]
+    main(paths[0] if paths else None, n_issues)
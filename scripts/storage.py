@@ -0,0 +1,138 @@
+import json
+import os
+import sys
+from typing import Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+# Column order and dtype of the NLP datasets; other columns are kept after these, as they are
+COLUMNS = {
+    "id": "string",
+    "created_at": "datetime64[ns, UTC]",
+    "author": "string",
+    "author_location": "category",
+    "type": "category",
+    "parent_issue_id": "string",
+    "text": "string",
+    "sentiment_label": "category",
+    "sentiment_score": "float32",
+    "emotion_label": "category",
+    "emotion_score": "float32",
+}
+
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc")
+
+
+def normalise_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Applies the fix-ups every notebook repeated after read_csv: the id column (from "Unnamed: 0" or the index),
+    parsed created_at, canonical column order, and compact dtypes.
+    """
+    df = df.copy()
+    if "Unnamed: 0" in df.columns:
+        df = df.rename(columns={"Unnamed: 0": "id"})
+    if "id" not in df.columns:
+        df = df.rename_axis("id").reset_index()
+
+    for column, dtype in COLUMNS.items():
+        if column not in df.columns:
+            continue
+        if dtype.startswith("datetime"):
+            df[column] = pd.to_datetime(df[column], utc=True, errors="coerce")
+        elif dtype == "string":
+            # Ids can come back from CSV as ints or floats (NaN for issues without a parent)
+            values = df[column]
+            if pd.api.types.is_float_dtype(values):
+                values = values.astype("Int64")
+            df[column] = values.astype("string")
+        else:
+            df[column] = df[column].astype(dtype)
+
+    ordered = [c for c in COLUMNS if c in df.columns]
+    return df[ordered + [c for c in df.columns if c not in COLUMNS]].reset_index(drop=True)
+
+
+def read_nlp_jsonl(path: str) -> pd.DataFrame:
+    """
+    final_nlp_data.jsonl style input ({id: row} per line) as a normalised frame.
+    """
+    ids = []
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for key, row in json.loads(line).items():
+                ids.append(key)
+                rows.append(row)
+    df = pd.DataFrame.from_records(rows)
+    df.insert(0, "id", ids)
+    return normalise_frame(df)
+
+
+def read_any(path: str) -> pd.DataFrame:
+    if path.endswith(".jsonl"):
+        return read_nlp_jsonl(path)
+    if path.endswith(".csv"):
+        return normalise_frame(pd.read_csv(path))
+    return read_table(path)
+
+
+def write_table(df: pd.DataFrame, path: str, normalise: bool = True) -> None:
+    """
+    Parquet (.parquet, zstd-compressed) or Arrow IPC (.arrow/.feather, uncompressed so it can be memory-mapped).
+    """
+    if normalise:
+        df = normalise_frame(df)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp = path + ".tmp"
+    if path.endswith(PARQUET_EXTENSIONS):
+        pq.write_table(table, tmp, compression="zstd")
+    elif path.endswith(ARROW_EXTENSIONS):
+        feather.write_feather(table, tmp, compression="uncompressed")
+    else:
+        raise ValueError(f"Unknown columnar format for {path}; use one of {PARQUET_EXTENSIONS + ARROW_EXTENSIONS}")
+    os.replace(tmp, path)
+
+
+def read_arrow(path: str, columns: Optional[Sequence[str]] = None, memory_map: bool = True) -> pa.Table:
+    """
+    Loads only `columns`. Arrow IPC files are memory-mapped, so untouched pages are never read;
+    Parquet decodes just the requested column chunks.
+    """
+    columns = list(columns) if columns is not None else None
+    if path.endswith(PARQUET_EXTENSIONS):
+        return pq.read_table(path, columns=columns, memory_map=memory_map)
+    if path.endswith(ARROW_EXTENSIONS):
+        return feather.read_table(path, columns=columns, memory_map=memory_map)
+    raise ValueError(f"Unknown columnar format for {path}")
+
+
+def read_table(path: str, columns: Optional[Sequence[str]] = None, memory_map: bool = True) -> pd.DataFrame:
+    # Dictionary columns come back as pandas categoricals and timestamps keep their UTC zone
+    return read_arrow(path, columns, memory_map).to_pandas()
+
+
+def convert(in_path: str, out_path: Optional[str] = None) -> str:
+    out_path = out_path or os.path.splitext(in_path)[0] + ".parquet"
+    df = read_any(in_path)
+    write_table(df, out_path, normalise=False)
+    print(f"Wrote {len(df)} rows, {len(df.columns)} columns: {in_path} -> {out_path}")
+    return out_path
+
+
+DATASETS = [
+    "data/processed/final_nlp_data.jsonl",
+    "data/processed/nlp_sentiment_analysis.csv",
+    "data/processed/nlp_sentiment_analysis_with_emotion.csv",
+]
+
+
+if __name__ == "__main__":
+    paths = [a for a in sys.argv[1:] if not a.startswith("--")] or [p for p in DATASETS if os.path.exists(p)]
+    for path in paths:
+        convert(path)
@@ -0,0 +1,231 @@
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from fingerprint import sha256_file
+from inference import COLUMNS, EMOTION_MODEL, SENTIMENT_MODEL, Backend, HFBackend, score_texts
+
+FINAL = "data/processed/final_nlp_data.jsonl"
+SHARD_DIR = "data/processed/nlp_shards"
+OUT = "data/processed/nlp_sentiment_analysis_with_emotion.csv"
+
+
+def text_hash(text: Optional[str]) -> str:
+    return hashlib.sha256(("\x01None" if text is None else text).encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class ScoreCache:
+    """
+    Persistent model outputs keyed by (model id, sha256 of the cleaned text).
+    """
+
+    def __init__(self, path: str = "data/processed/.score_cache.sqlite"):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            " model_id TEXT NOT NULL, text_hash TEXT NOT NULL, label TEXT NOT NULL, score REAL NOT NULL,"
+            " PRIMARY KEY (model_id, text_hash))"
+        )
+
+    def __enter__(self) -> "ScoreCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def get_many(self, model_id: str, hashes: List[str]) -> Dict[str, dict]:
+        found: Dict[str, dict] = {}
+        unique = list(dict.fromkeys(hashes))
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.conn.execute(
+                f"SELECT text_hash, label, score FROM scores WHERE model_id = ? AND text_hash IN ({placeholders})",
+                [model_id, *batch],
+            )
+            for h, label, score in rows:
+                found[h] = {"label": label, "score": score}
+        hits = sum(1 for h in hashes if h in found)
+        self.hits += hits
+        self.misses += len(hashes) - hits
+        return found
+
+    def put_many(self, model_id: str, items: Sequence[Tuple[str, dict]]) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?)",
+            [(model_id, h, out["label"], out["score"]) for h, out in items],
+        )
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+
+def iter_rows(path: str) -> Iterator[Tuple[str, dict]]:
+    """
+    (id, row) pairs from final_nlp_data.jsonl, one {id: row} object per line.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield from json.loads(line).items()
+
+
+def shard_path(shard_dir: str, index: int) -> str:
+    return os.path.join(shard_dir, f"shard-{index:05d}.jsonl")
+
+
+def _prepare_shard_dir(shard_dir: str, state: dict) -> None:
+    """
+    Completed shards are only reused if they came from the same input, shard size and models.
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    state_path = os.path.join(shard_dir, "state.json")
+    previous = None
+    if os.path.exists(state_path):
+        with open(state_path, "r") as f:
+            previous = json.load(f)
+    if previous != state:
+        for path in glob.glob(os.path.join(shard_dir, "shard-*.jsonl")):
+            os.remove(path)
+        with open(state_path + ".tmp", "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(state_path + ".tmp", state_path)
+
+
+def score_shard(
+    rows: List[Tuple[str, dict]],
+    model_ids: Sequence[str],
+    get_backend: Callable[[str], Backend],
+    cache: ScoreCache,
+    **score_kwargs,
+) -> int:
+    """
+    Adds <prefix>_label/_score to each row in place, scoring only texts missing from the cache.
+    Returns how many texts were sent to a model.
+    """
+    texts = [row.get("text") for _, row in rows]
+    hashes = [text_hash(t) for t in texts]
+    by_hash = dict(zip(hashes, texts))
+
+    cached = {model_id: cache.get_many(model_id, hashes) for model_id in model_ids}
+    missing = {model_id: [h for h in by_hash if h not in cached[model_id]] for model_id in model_ids}
+    needed = [model_id for model_id in model_ids if missing[model_id]]
+
+    scored = 0
+    if needed:
+        miss_hashes = list(dict.fromkeys(h for model_id in needed for h in missing[model_id]))
+        results = score_texts([by_hash[h] or "" for h in miss_hashes], [get_backend(m) for m in needed], **score_kwargs)
+        for model_id in needed:
+            fresh = list(zip(miss_hashes, results[model_id]))
+            cache.put_many(model_id, fresh)
+            cached[model_id].update(fresh)
+        scored = len(miss_hashes)
+
+    for (_, row), h in zip(rows, hashes):
+        for model_id in model_ids:
+            prefix = COLUMNS.get(model_id, model_id)
+            row[f"{prefix}_label"] = cached[model_id][h]["label"]
+            row[f"{prefix}_score"] = cached[model_id][h]["score"]
+    return scored
+
+
+def run_sharded(
+    in_path: str = FINAL,
+    shard_dir: str = SHARD_DIR,
+    model_ids: Sequence[str] = (SENTIMENT_MODEL, EMOTION_MODEL),
+    make_backend: Callable[[str], Backend] = HFBackend,
+    shard_size: int = 5000,
+    cache_path: str = "data/processed/.score_cache.sqlite",
+    **score_kwargs,
+) -> int:
+    """
+    Scores in_path shard by shard, writing each finished shard atomically. A rerun skips shards already
+    written for the same input; backends are only loaded once a shard has texts the cache cannot answer.
+    Returns the number of shards.
+    """
+    _prepare_shard_dir(shard_dir, {
+        "input": in_path, "sha256": sha256_file(in_path), "shard_size": shard_size, "models": list(model_ids),
+    })
+
+    backends: Dict[str, Backend] = {}
+
+    def get_backend(model_id: str) -> Backend:
+        if model_id not in backends:
+            backends[model_id] = make_backend(model_id)
+        return backends[model_id]
+
+    rows_iter = iter_rows(in_path)
+    index = 0
+    with ScoreCache(cache_path) as cache:
+        while True:
+            rows = list(islice(rows_iter, shard_size))
+            if not rows:
+                break
+            path = shard_path(shard_dir, index)
+            if os.path.exists(path):
+                print(f"[shard {index}] done, skipping")
+                index += 1
+                continue
+
+            scored = score_shard(rows, model_ids, get_backend, cache, **score_kwargs)
+            # Cache first: if the shard write is interrupted, the rerun finds every score cached
+            cache.commit()
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                for key, row in rows:
+                    f.write(json.dumps({key: row}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+            print(f"[shard {index}] {len(rows)} rows, {scored} texts scored by a model (cache hits so far: {cache.hits})")
+            index += 1
+    return index
+
+
+def merge_shards(shard_dir: str = SHARD_DIR, out_path: str = OUT) -> int:
+    """
+    Concatenates the shards into the CSV nlp.ipynb produced (index = row id).
+    """
+    node_data = {}
+    for path in sorted(glob.glob(os.path.join(shard_dir, "shard-*.jsonl"))):
+        node_data.update(iter_rows(path))
+    df = pd.DataFrame.from_dict(node_data, orient="index")
+    df.to_csv(out_path)
+    return len(df)
+
+
+def main(shard_size: int = 5000, num_threads: Optional[int] = None) -> None:
+    # Imported here as aggregate_cube and term_index read shards through this module
+    import aggregate_cube
+    import term_index
+
+    shards = run_sharded(shard_size=shard_size, make_backend=lambda m: HFBackend(m, num_threads=num_threads))
+    count = merge_shards()
+    print(f"Scored {count} rows in {shards} shards. Output: {OUT}")
+    # Only shards the cube and the term index have not seen yet are read
+    aggregate_cube.main()
+    term_index.main()
+
+
+if __name__ == "__main__":
+    shard_size = 5000
+    num_threads = None
+    for arg in sys.argv[1:]:
+        if arg.startswith("--shard-size="):
+            shard_size = int(arg.split("=", 1)[1])
+        elif arg.startswith("--threads="):
+            num_threads = int(arg.split("=", 1)[1])
+    main(shard_size, num_threads or os.cpu_count())
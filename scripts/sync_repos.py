@@ -0,0 +1,138 @@
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+import dotenv
+import requests
+
+from datascrape import fetch_issues_paginated, fetch_remaining_comments
+from json_stream import iter_jsonl
+
+STORE_DIR = "data/raw/store"
+STATE_PATH = "data/raw/sync_state.json"
+EPOCH = "1970-01-01T00:00:00Z"
+
+
+def store_path(owner: str, name: str, store_dir: str = STORE_DIR) -> str:
+    return os.path.join(store_dir, f"{owner}__{name}.jsonl")
+
+
+def load_state(path: str = STATE_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_state(state: dict, path: str = STATE_PATH) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def merge_comments(old: list[dict], new: list[dict]) -> list[dict]:
+    """
+    Union of both comment lists by node id (the fresher copy wins), ordered by creation time.
+    Keeps comments the store already has beyond the page a new fetch returned.
+    """
+    merged = {c.get("node_id"): c for c in old}
+    merged.update({c.get("node_id"): c for c in new})
+    return sorted(merged.values(), key=lambda c: c.get("createdAt") or "")
+
+
+def merge_issue(old: dict, new: dict) -> dict:
+    merged = dict(new)
+    old_comments = (old.get("comments") or {}).get("nodes", [])
+    new_comments = (new.get("comments") or {}).get("nodes", [])
+    merged["comments"] = {**(new.get("comments") or {}), "nodes": merge_comments(old_comments, new_comments)}
+    return merged
+
+
+def merge_into_store(path: str, updates: Iterable[dict]) -> tuple[int, int]:
+    """
+    Streams the existing store once, replacing issues that were updated and appending new ones.
+    Issues are deduplicated by GitHub node id. Returns (updated, added).
+    """
+    pending = {}
+    for issue in updates:
+        node_id = issue["node_id"]
+        pending[node_id] = merge_issue(pending[node_id], issue) if node_id in pending else issue
+
+    updated = 0
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        if os.path.exists(path):
+            for issue in iter_jsonl(path):
+                fresh = pending.pop(issue.get("node_id"), None)
+                if fresh is not None:
+                    issue = merge_issue(issue, fresh)
+                    updated += 1
+                f.write(json.dumps(issue, ensure_ascii=False) + "\n")
+        for issue in pending.values():
+            f.write(json.dumps(issue, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+    return updated, len(pending)
+
+
+def sync_repo(
+    session: requests.Session,
+    github_url: str,
+    owner: str,
+    name: str,
+    state: dict,
+    store_dir: str = STORE_DIR,
+    max_nodes: int = 10**9,
+) -> dict:
+    """
+    Fetches issues of owner/name updated since the stored high-water mark and merges them into the store.
+    An issue's updatedAt moves when comments are added, so new comments arrive with their issue.
+    """
+    key = f"{owner}/{name}"
+    repo_state = state.get(key, {})
+    # The mark itself is refetched (filterBy.since is inclusive); the merge deduplicates it
+    since = repo_state.get("high_water_mark", EPOCH)
+
+    nodes = fetch_issues_paginated(session, github_url, max_nodes=max_nodes, owner=owner, name=name, since=since)
+    nodes = [node for node in nodes if node and node.get("node_id")]
+    fetch_remaining_comments(session, github_url, nodes)
+
+    os.makedirs(store_dir, exist_ok=True)
+    updated, added = merge_into_store(store_path(owner, name, store_dir), nodes)
+
+    high_water_mark = max([since] + [node["updatedAt"] for node in nodes if node.get("updatedAt")])
+    state[key] = {
+        "high_water_mark": high_water_mark,
+        "last_sync": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "issues": repo_state.get("issues", 0) + added,
+    }
+    print(f"{key}: fetched={len(nodes)}, updated={updated}, added={added}, high_water_mark={high_water_mark}")
+    return state[key]
+
+
+def main(session: requests.Session, github_url: str, repos: list[str], state_path: str = STATE_PATH) -> None:
+    state = load_state(state_path)
+    for repo in repos:
+        owner, name = repo.split("/", 1)
+        sync_repo(session, github_url, owner, name, state)
+        save_state(state, state_path)
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+    if not GITHUB_TOKEN:
+        raise RuntimeError("GITHUB_TOKEN is not set; create a .env with GITHUB_TOKEN=<token>")
+    github_url = "https://api.github.com/graphql"
+
+    session = requests.Session()
+    session.headers.update(
+        {
+            "Authorization": f"Bearer {GITHUB_TOKEN}",
+            "Content-Type": "application/json"
+        }
+    )
+
+    main(session, github_url, sys.argv[1:] or ["huggingface/transformers"])
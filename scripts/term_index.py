@@ -0,0 +1,254 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, Optional, Sequence
+
+import pandas as pd
+
+from clean_text import PLACEHOLDER_TOKENS
+from fingerprint import sha256_file
+
+INDEX_DIR = "data/processed/term_index"
+FACETS = {"sentiment": "sentiment_label", "emotion": "emotion_label", "country": "author_location"}
+ALL = "all"  # group holding every row
+UNSPECIFIED = "unspecified"
+
+# WordCloud's tokenization: words of two or more characters, a trailing "'s" dropped
+TOKEN_RE = re.compile(r"\w[\w']+")
+
+try:
+    from wordcloud import STOPWORDS
+except ImportError:
+    STOPWORDS = frozenset(
+        "a about above after again against all am an and any are as at be because been before being below "
+        "between both but by can could did do does doing down during each few for from further had has have "
+        "having he her here hers herself him himself his how i if in into is it its itself just let me more most "
+        "my myself no nor not of off on once only or other ought our ours ourselves out over own same she should "
+        "so some such than that the their theirs them themselves then there these they this those through to too "
+        "under until up very was we were what when where which while who whom why with would you your yours "
+        "yourself yourselves also however ever get like otherwise shall since therefore www com http https".split()
+    )
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    """
+    Lowercased terms of a cleaned text, without clean_github_text's placeholders or bare numbers.
+    Stopwords are kept here and dropped at query time, so the index serves any stopword list.
+    """
+    terms = []
+    for token in TOKEN_RE.findall(text or ""):
+        if token in PLACEHOLDER_TOKENS or token.isdigit():
+            continue
+        token = token.lower()
+        if token.endswith("'s"):
+            token = token[:-2]
+        terms.append(token)
+    return terms
+
+
+def group_key(facet: str, value) -> str:
+    if value is None or (isinstance(value, float) and value != value) or value == "":
+        value = UNSPECIFIED
+    return f"{facet}={value}"
+
+
+class TermIndex:
+    """
+    Term counts per group ("all", "sentiment=positive", "emotion=joy", "country=DE", ...) plus the number of
+    rows in each group. Indexes of disjoint inputs merge by adding counts.
+    """
+
+    def __init__(self, terms: Optional[dict[str, Counter]] = None, rows: Optional[Counter] = None):
+        self.terms: dict[str, Counter] = terms or {}
+        self.rows: Counter = rows or Counter()
+
+    def add(self, text: Optional[str], labels: dict[str, object]) -> None:
+        counts = Counter(tokenize(text))
+        for key in [ALL] + [group_key(facet, value) for facet, value in labels.items()]:
+            self.terms.setdefault(key, Counter()).update(counts)
+            self.rows[key] += 1
+
+    def merge(self, other: "TermIndex") -> "TermIndex":
+        for key, counts in other.terms.items():
+            self.terms.setdefault(key, Counter()).update(counts)
+        self.rows.update(other.rows)
+        return self
+
+    def groups(self, facet: Optional[str] = None) -> list[str]:
+        return sorted(k for k in self.terms if facet is None or k.startswith(facet + "="))
+
+    def frequencies(self, group: str = ALL, stopwords: Iterable[str] = STOPWORDS) -> dict[str, int]:
+        """
+        Term -> count for a group, ready for WordCloud(...).generate_from_frequencies.
+        """
+        stop = {w.lower() for w in stopwords}
+        return {term: n for term, n in self.terms.get(group, Counter()).items() if term not in stop}
+
+    def top(self, group: str = ALL, n: int = 20, stopwords: Iterable[str] = STOPWORDS) -> list[tuple[str, int]]:
+        return Counter(self.frequencies(group, stopwords)).most_common(n)
+
+    def top_table(self, facet: str, n: int = 20, stopwords: Iterable[str] = STOPWORDS) -> pd.DataFrame:
+        """
+        Top n terms of every group of a facet side by side (one column per group value).
+        """
+        return pd.DataFrame({
+            group.split("=", 1)[1]: pd.Series(dict(self.top(group, n, stopwords)), dtype="int64")
+            for group in self.groups(facet)
+        }).fillna(0).astype("int64")
+
+    def to_dict(self) -> dict:
+        return {"version": 1, "rows": dict(self.rows), "terms": {k: dict(v) for k, v in self.terms.items()}}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TermIndex":
+        return cls({k: Counter(v) for k, v in data["terms"].items()}, Counter(data["rows"]))
+
+    def save(self, path: str) -> None:
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "TermIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def iter_labelled(path: str) -> Iterator[tuple[Optional[str], dict]]:
+    """
+    (cleaned text, {facet: value}) per scored row, streamed from a stream_inference shard / final_nlp_data
+    style JSONL file or read in chunks from the scored CSV.
+    """
+    if path.endswith(".csv"):
+        for chunk in pd.read_csv(path, chunksize=50_000):
+            columns = [c for c in FACETS.values() if c in chunk]
+            for row in chunk[["text"] + columns].astype(object).itertuples(index=False):
+                yield row[0] if isinstance(row[0], str) else None, {
+                    facet: getattr(row, column, None) for facet, column in FACETS.items() if column in columns
+                }
+        return
+
+    from stream_inference import iter_rows
+    for _, row in iter_rows(path):
+        yield row.get("text"), {facet: row.get(column) for facet, column in FACETS.items() if column in row}
+
+
+def _index_chunk(rows: list[tuple[Optional[str], dict]]) -> TermIndex:
+    index = TermIndex()
+    for text, labels in rows:
+        index.add(text, labels)
+    return index
+
+
+def build_index(rows: Iterable[tuple[Optional[str], dict]], workers: int = 1, chunk_size: int = 5000) -> TermIndex:
+    """
+    One pass over rows. With workers > 1, chunks are counted in a process pool (at most 2 * workers in flight)
+    and the partial indexes merged.
+    """
+    rows = iter(rows)
+    chunks = iter(lambda: list(islice(rows, chunk_size)), [])
+    index = TermIndex()
+    if workers <= 1:
+        for chunk in chunks:
+            index.merge(_index_chunk(chunk))
+        return index
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for chunk in chunks:
+            pending.append(pool.submit(_index_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                index.merge(pending.pop(0).result())
+        for future in pending:
+            index.merge(future.result())
+    return index
+
+
+def _part_path(index_dir: str, source: str) -> str:
+    # Keyed by the full path, so equally named shards of different directories get their own parts
+    digest = hashlib.sha256(os.path.abspath(source).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(index_dir, "parts", f"{digest}.terms.json")
+
+
+def _save_state(state_path: str, state: dict) -> None:
+    with open(state_path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(state_path + ".tmp", state_path)
+
+
+def update_index(paths: Sequence[str], index_dir: str = INDEX_DIR, workers: int = 1) -> TermIndex:
+    """
+    Keeps one part per source, rebuilt only when the source's content changed, and index_dir/index.json as the
+    sum of the parts. A source is recorded in the state only once its part is written, so an interrupted run
+    leaves nothing half-counted; the next run rebuilds what is missing.
+    """
+    os.makedirs(os.path.join(index_dir, "parts"), exist_ok=True)
+    state_path = os.path.join(index_dir, "state.json")
+    index_path = os.path.join(index_dir, "index.json")
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path, "r") as f:
+            state = json.load(f)
+
+    updated = 0
+    for path in paths:
+        sha = sha256_file(path)
+        if state.get(path) == sha and os.path.exists(_part_path(index_dir, path)):
+            continue
+        state.pop(path, None)
+        _save_state(state_path, state)
+        build_index(iter_labelled(path), workers).save(_part_path(index_dir, path))
+        state[path] = sha
+        _save_state(state_path, state)
+        updated += 1
+    # Shards that no longer exist (e.g. the shard directory was reset) stop counting
+    for source in [s for s in state if not os.path.exists(s)]:
+        del state[source]
+        _save_state(state_path, state)
+        if os.path.exists(_part_path(index_dir, source)):
+            os.remove(_part_path(index_dir, source))
+
+    index = TermIndex()
+    for source in state:
+        index.merge(TermIndex.load(_part_path(index_dir, source)))
+    index.save(index_path)
+    print(f"Indexed {updated} new or changed of {len(paths)} sources; {len(index.terms.get(ALL, {}))} terms, {index.rows[ALL]} rows. Output: {index_path}")
+    return index
+
+
+def plot_wordcloud(index: TermIndex, group: str, title: Optional[str] = None, stopwords: Iterable[str] = STOPWORDS):
+    """
+    nlp_visualisation.ipynb's word cloud drawn from the frequency table instead of the joined texts.
+    """
+    import matplotlib.pyplot as plt
+    from wordcloud import WordCloud
+
+    wc = WordCloud(width=800, height=400, background_color="white").generate_from_frequencies(index.frequencies(group, stopwords))
+    plt.imshow(wc, interpolation="bilinear")
+    plt.axis("off")
+    plt.title(title or f"Common terms in {group}")
+    plt.show()
+
+
+def main(paths: Optional[list[str]] = None, workers: int = 1) -> TermIndex:
+    from stream_inference import SHARD_DIR
+
+    paths = paths or sorted(glob.glob(os.path.join(SHARD_DIR, "shard-*.jsonl")))
+    index = update_index(paths, workers=workers)
+    for label in ("positive", "negative", "neutral"):
+        print(f"sentiment={label}: {', '.join(term for term, _ in index.top(f'sentiment={label}', 10))}")
+    return index
+
+
+if __name__ == "__main__":
+    workers = 1
+    for arg in sys.argv[1:]:
+        if arg.startswith("--workers="):
+            workers = int(arg.split("=", 1)[1]) or os.cpu_count()
+    main([a for a in sys.argv[1:] if not a.startswith("--")] or None, workers)
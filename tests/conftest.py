@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scripts are flat modules imported by bare name, as when run from scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
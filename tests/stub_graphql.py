@@ -0,0 +1,122 @@
+import json
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+CREATED_RE = re.compile(r"created:(\S+)\.\.(\S+)")
+
+
+def make_issues(count: int, start: str = "2024-01-01T00:00:00Z", step_minutes: int = 517) -> list[dict]:
+    t = datetime.strptime(start, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+    return [
+        {
+            "node_id": f"I_{i}",
+            "title": f"issue {i}",
+            "bodyText": "body",
+            "createdAt": (t + timedelta(minutes=step_minutes * i)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "comments": {"nodes": [], "pageInfo": {"endCursor": None, "hasNextPage": False}},
+        }
+        for i in range(count)
+    ]
+
+
+class StubGraphQL:
+    """
+    Local stand-in for the GitHub GraphQL endpoint, enough for async_scrape: the repository createdAt lookup and
+    issue search filtered by the created:A..B qualifier, paged page_size at a time, and comment continuation
+    lookups. Comments are served from `comments` (node id -> comment list, 100 per page); ids in `node_errors`
+    (node id -> GraphQL error type) come back null with that error, next to the data of the others. Without
+    `comments`, lookups get an error response with no data at all. The first `rate_limited`
+    requests are answered with a RATE_LIMITED error and the given headers.
+    """
+
+    def __init__(self, issues: list[dict], created_at: str = "2024-01-01T00:00:00Z", page_size: int = 100):
+        self.issues = sorted(issues, key=lambda issue: issue["createdAt"])
+        self.created_at = created_at
+        self.page_size = page_size
+        self.rate_limited = 0
+        self.rate_limited_headers: dict[str, str] = {"Retry-After": "0"}
+        self.comments: Optional[dict[str, list]] = None
+        self.node_errors: dict[str, str] = {}
+        self.requests: list[dict] = []
+        self.lock = threading.Lock()
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/graphql"
+
+    def __enter__(self) -> "StubGraphQL":
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status, headers, payload = stub.answer(body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                for name, value in {"Content-Type": "application/json", **headers}.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def answer(self, body: dict) -> tuple[int, dict, dict]:
+        with self.lock:
+            self.requests.append(body)
+            if self.rate_limited > 0:
+                self.rate_limited -= 1
+                return 200, self.rate_limited_headers, {"errors": [{"type": "RATE_LIMITED", "message": "API rate limit exceeded"}]}
+
+        reset = (datetime.now(timezone.utc) + timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        data = {"rateLimit": {"cost": 1, "remaining": 1_000_000, "resetAt": reset}}
+        query, variables = body["query"], body.get("variables") or {}
+        if "search(" in query:
+            since, last = CREATED_RE.search(variables["q"]).groups()
+            matches = [issue for issue in self.issues if since <= issue["createdAt"] <= last]
+            start = int(variables.get("cursor") or 0)
+            end = start + self.page_size
+            data["search"] = {
+                "issueCount": len(matches),
+                "nodes": matches[start:end],
+                "pageInfo": {"endCursor": str(min(end, len(matches))), "hasNextPage": end < len(matches)},
+            }
+        elif "node(id:" in query:
+            if self.comments is None:
+                # Refused outright, as GitHub does for a query it cannot run
+                return 200, {}, {"errors": [{"type": "FORBIDDEN", "message": "comment lookups are not served"}]}
+            errors = []
+            i = 0
+            while f"id{i}" in variables:
+                node_id, after = variables[f"id{i}"], variables.get(f"after{i}")
+                if node_id in self.node_errors:
+                    data[f"i{i}"] = None
+                    errors.append({"type": self.node_errors[node_id], "path": [f"i{i}"], "message": node_id})
+                else:
+                    thread = self.comments.get(node_id, [])
+                    start = int(after[1:]) if after else 0
+                    end = start + 100
+                    data[f"i{i}"] = {"comments": {
+                        "nodes": thread[start:end],
+                        "pageInfo": {"endCursor": f"c{min(end, len(thread))}", "hasNextPage": end < len(thread)},
+                    }}
+                i += 1
+            return 200, {}, {"data": data, **({"errors": errors} if errors else {})}
+        elif "repository(" in query:
+            data["repository"] = {"createdAt": self.created_at}
+        else:
+            return 400, {}, {"message": "unsupported query"}
+        return 200, {}, {"data": data}
@@ -0,0 +1,153 @@
+import json
+import time
+
+import pytest
+import requests
+
+import async_scrape
+from async_scrape import ConcurrentFetcher, Checkpoint, assemble, complete_comments, fetch_issues_concurrent, retry_delay
+import datascrape
+from datascrape import IncompleteCommentsError
+from stub_graphql import StubGraphQL, make_issues
+
+UNTIL = "2025-01-01T00:00:00Z"
+
+
+def fetched_ids(tmp_path) -> list[str]:
+    out = tmp_path / "issues.jsonl"
+    assemble(str(tmp_path / "checkpoint"), str(out))
+    return [json.loads(line)["node_id"] for line in out.read_text().splitlines()]
+
+
+def test_fetches_every_issue_once(tmp_path, monkeypatch):
+    # A small cap makes the fetcher split windows, as it must for busy months on the real API
+    monkeypatch.setattr(async_scrape, "SEARCH_RESULT_CAP", 40)
+    issues = make_issues(300)
+    with StubGraphQL(issues, page_size=15) as stub:
+        fetch_issues_concurrent(
+            requests.Session(), stub.url, checkpoint_dir=str(tmp_path / "checkpoint"), until=UNTIL, window_days=60,
+            concurrency=3,
+        )
+    assert sorted(fetched_ids(tmp_path)) == sorted(issue["node_id"] for issue in issues)
+
+
+def test_resumes_after_interruption(tmp_path):
+    issues = make_issues(200)
+    checkpoint_dir = str(tmp_path / "checkpoint")
+    with StubGraphQL(issues, page_size=10) as stub:
+        fetch_issues_concurrent(requests.Session(), stub.url, checkpoint_dir=checkpoint_dir, until=UNTIL, max_nodes=30)
+        first_run = len(stub.requests)
+        assert len(set(fetched_ids(tmp_path))) < len(issues)
+
+        fetch_issues_concurrent(requests.Session(), stub.url, checkpoint_dir=checkpoint_dir)
+    assert sorted(fetched_ids(tmp_path)) == sorted(issue["node_id"] for issue in issues)
+    # The second run continued from the saved cursors instead of starting over
+    assert len(stub.requests) - first_run < 200 // 10 + 20
+
+
+def test_rate_limited_error_backs_off(tmp_path, monkeypatch):
+    delays = []
+
+    async def backoff(self, attempt, seconds=None):
+        delays.append(seconds)
+
+    monkeypatch.setattr(ConcurrentFetcher, "backoff", backoff)
+    with StubGraphQL(make_issues(20)) as stub:
+        stub.rate_limited = 2
+        stub.rate_limited_headers = {"Retry-After": "7"}
+        fetch_issues_concurrent(
+            requests.Session(), stub.url, checkpoint_dir=str(tmp_path / "checkpoint"), since="2024-01-01T00:00:00Z",
+            until=UNTIL, window_days=400, concurrency=1,
+        )
+    assert delays == [7.0, 7.0]
+    assert len(fetched_ids(tmp_path)) == 20
+
+
+def test_rate_limited_error_gives_up(tmp_path, monkeypatch):
+    async def backoff(self, attempt, seconds=None):
+        pass
+
+    monkeypatch.setattr(ConcurrentFetcher, "backoff", backoff)
+    with StubGraphQL(make_issues(5)) as stub:
+        stub.rate_limited = 100
+        with pytest.raises(async_scrape.GraphQLError, match="Giving up"):
+            fetch_issues_concurrent(
+                requests.Session(), stub.url, checkpoint_dir=str(tmp_path / "checkpoint"),
+                since="2024-01-01T00:00:00Z", until=UNTIL, window_days=400, concurrency=1,
+            )
+        assert len(stub.requests) == 6
+
+
+def test_retry_delay_headers():
+    response = requests.Response()
+    assert retry_delay(response) is None
+    response.headers["X-RateLimit-Reset"] = str(int(time.time()) + 30)
+    assert 29 <= retry_delay(response) <= 32
+    response.headers["Retry-After"] = "3"
+    assert retry_delay(response) == 3.0
+
+
+def test_caller_session_is_left_alone(tmp_path):
+    session = requests.Session()
+    session.headers["Authorization"] = "Bearer token"
+    adapters = dict(session.adapters)
+    checkpoint = Checkpoint(str(tmp_path))
+    fetcher = ConcurrentFetcher(session, "http://127.0.0.1:1/graphql", "o", "n", checkpoint, concurrency=8)
+    assert session.adapters == adapters
+    assert fetcher.session is not session
+    assert fetcher.session.headers["Authorization"] == "Bearer token"
+    fetcher.close()
+    checkpoint.close()
+
+
+def test_failed_comment_lookups_are_reported(tmp_path):
+    issues = make_issues(3)
+    issues[1]["comments"]["pageInfo"] = {"endCursor": "c25", "hasNextPage": True}
+    path = tmp_path / "issues.jsonl"
+    path.write_text("".join(json.dumps(issue) + "\n" for issue in issues))
+    before = path.read_text()
+    with StubGraphQL(issues) as stub:
+        with pytest.raises(IncompleteCommentsError) as e:
+            complete_comments(requests.Session(), stub.url, str(path))
+    assert e.value.node_ids == ["I_1"]
+    # Nothing is written as if the thread were complete
+    assert path.read_text() == before
+    assert not (tmp_path / "issues.jsonl.tmp").exists()
+
+
+def thread_issues(count: int) -> tuple[list[dict], dict]:
+    """
+    Issues whose first 25 comments are in hand, and their whole threads (250 comments) on the server.
+    """
+    issues = make_issues(count)
+    threads = {}
+    for issue in issues:
+        thread = [{"body": f"{issue['node_id']} comment {n}"} for n in range(250)]
+        issue["comments"] = {"nodes": thread[:25], "pageInfo": {"endCursor": "c25", "hasNextPage": True}}
+        threads[issue["node_id"]] = thread
+    return issues, threads
+
+
+def test_remaining_comments_are_fetched(tmp_path, monkeypatch):
+    monkeypatch.setattr(datascrape.time, "sleep", lambda seconds: None)
+    issues, threads = thread_issues(3)
+    with StubGraphQL(issues) as stub:
+        stub.comments = threads
+        added = datascrape.fetch_remaining_comments(requests.Session(), stub.url, issues)
+    assert added == 3 * 225
+    assert all(len(issue["comments"]["nodes"]) == 250 for issue in issues)
+    assert not any(issue["comments"]["pageInfo"]["hasNextPage"] for issue in issues)
+
+
+def test_partial_data_reports_failed_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(datascrape.time, "sleep", lambda seconds: None)
+    issues, threads = thread_issues(4)
+    with StubGraphQL(issues) as stub:
+        stub.comments = threads
+        # I_1 was deleted; I_2 failed for another reason and must not pass for complete
+        stub.node_errors = {"I_1": "NOT_FOUND", "I_2": "FORBIDDEN"}
+        with pytest.raises(IncompleteCommentsError) as e:
+            datascrape.fetch_remaining_comments(requests.Session(), stub.url, issues)
+    assert e.value.node_ids[0] == "I_2"
+    assert "I_1" not in e.value.node_ids
+    assert issues[2]["comments"]["pageInfo"]["hasNextPage"]
@@ -0,0 +1,34 @@
+import random
+
+import pytest
+
+from clean_text import ENGINES, CleanConfig, clean_github_text, clean_github_text_guarded, clean_texts
+from compare_clean_engines import FRAGMENTS, configs, random_text
+
+EDGE_CASES = [None, "", "    ", "abcd", "hello world"] + FRAGMENTS
+
+
+def fuzz_texts(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [random_text(rng) for _ in range(n)] + EDGE_CASES
+
+
+@pytest.mark.parametrize("cfg", configs(), ids=lambda cfg: repr(cfg)[12:60])
+def test_guarded_engine_matches_reference(cfg):
+    for text in fuzz_texts(300):
+        assert clean_github_text_guarded(text, cfg) == clean_github_text(text, cfg), repr(text)
+
+
+def test_guarded_engine_matches_reference_on_long_bodies():
+    rng = random.Random(1)
+    cfg = CleanConfig()
+    for _ in range(20):
+        text = random_text(rng, max_fragments=4000)
+        assert clean_github_text_guarded(text, cfg) == clean_github_text(text, cfg)
+
+
+@pytest.mark.parametrize("engine", sorted(ENGINES))
+def test_batch_noise_scoring_matches_per_text(engine):
+    texts = fuzz_texts(200, seed=2)
+    cfg = CleanConfig()
+    assert clean_texts(texts, cfg, engine, batch_noise=True) == [clean_github_text(t, cfg) for t in texts]
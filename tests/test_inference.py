@@ -0,0 +1,72 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from inference import LexiconBackend, length_batches, score_frame, score_texts
+
+WORDS = "thanks great works error fails bug the model when loading it a fix please".split()
+
+
+def random_texts(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 80))) for _ in range(n)]
+
+
+def one_by_one(texts: list, backend: LexiconBackend) -> list:
+    return [backend.predict(backend.tokenize([text]))[0] for text in texts]
+
+
+def test_length_batches_cover_every_index_within_budget():
+    rng = random.Random(0)
+    lengths = [rng.randint(0, 300) for _ in range(500)]
+    batches = length_batches(lengths, token_budget=1024, max_batch_size=16)
+
+    assert sorted(int(i) for b in batches for i in b) == list(range(len(lengths)))
+    widths = [max(lengths[i] for i in b) for b in batches]
+    assert widths == sorted(widths, reverse=True)
+    for batch, width in zip(batches, widths):
+        assert len(batch) <= 16
+        assert len(batch) == 1 or len(batch) * width <= 1024
+
+
+def test_length_batches_of_empty_texts():
+    batches = length_batches([0, 0, 0], token_budget=8, max_batch_size=2)
+    assert [list(b) for b in batches] == [[0, 1], [2]]
+    assert length_batches([]) == []
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_score_texts_keeps_input_order_across_length_buckets(concurrency):
+    backend = LexiconBackend()
+    texts = random_texts(300) + random_texts(50)  # repeats are scored once
+    results = score_texts(texts, [backend], token_budget=256, max_batch_size=8, concurrency=concurrency)
+
+    assert len(length_batches([len(ids) for ids in backend.tokenize(texts)], 256, 8)) > 1
+    assert results["lexicon"] == one_by_one(texts, backend)
+
+
+def test_score_texts_with_empty_and_missing_texts():
+    backend = LexiconBackend()
+    texts = [None, "", "thanks, great fix", "   ", None, "it fails with an error"]
+    results = score_texts(texts, [backend, LexiconBackend("other")])
+
+    expected = one_by_one([t or "" for t in texts], backend)
+    assert results["lexicon"] == expected
+    assert results["other"] == expected
+    assert results["lexicon"][2]["label"] == "positive"
+    assert results["lexicon"][5]["label"] == "negative"
+    assert score_texts([], [backend]) == {"lexicon": []}
+
+
+def test_score_frame_adds_columns_in_row_order():
+    backend = LexiconBackend()
+    texts = random_texts(40, seed=1) + [None, np.nan, ""]
+    df = pd.DataFrame({"text": texts}, index=range(100, 100 + len(texts)))
+    out = score_frame(df, [backend], token_budget=128, max_batch_size=4)
+
+    expected = one_by_one([t if isinstance(t, str) else "" for t in texts], backend)
+    assert list(out.index) == list(range(100, 100 + len(texts)))
+    assert out["lexicon_label"].tolist() == [e["label"] for e in expected]
+    assert out["lexicon_score"].tolist() == [e["score"] for e in expected]